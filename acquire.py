@@ -0,0 +1,80 @@
+# Burst and timer-paced ADC acquisition.
+#
+# BurstSampler takes 4**k back-to-back samples and averages them, which
+# adds k bits of effective resolution to the RP2040's 12-bit ADC while
+# keeping the usual 0-65535 read_u16 scale. TimedSampler runs bursts from
+# a periodic machine.Timer into a preallocated ring (and optionally a
+# filters.Pipeline), so the network loop only reads the latest value and
+# never waits on the ADC.
+#
+# The stock MicroPython ADC class does not expose the RP2040 ADC FIFO or
+# its DMA request line, so capture is timer paced rather than DMA driven.
+
+from array import array
+from machine import Timer
+
+
+class BurstSampler:
+    def __init__(self, adc, extra_bits=2):
+        if not 0 <= extra_bits <= 4:
+            raise ValueError("extra_bits must be between 0 and 4")
+        self._read = adc.read_u16
+        self._count = 1 << (2 * extra_bits)
+        self._shift = 2 * extra_bits
+        self.extra_bits = extra_bits
+
+    def read(self):
+        read = self._read
+        total = 0
+        for _ in range(self._count):
+            total += read()
+        return total >> self._shift
+
+
+class TimedSampler:
+    def __init__(self, adc, rate_hz=20, extra_bits=2, size=16, pipeline=None):
+        self._burst = BurstSampler(adc, extra_bits)
+        self._ring = array('H', [0] * size)
+        self._size = size
+        self._index = 0
+        self._pipeline = pipeline
+        self._rate_hz = rate_hz
+        self._timer = None
+        self._tick_cb = self._tick
+        self.count = 0
+
+    def start(self):
+        if self._timer is None:
+            self._timer = Timer()
+        self._timer.init(freq=self._rate_hz, mode=Timer.PERIODIC, callback=self._tick_cb)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _tick(self, timer=None):
+        value = self._burst.read()
+        self._ring[self._index] = value
+        self._index = (self._index + 1) % self._size
+        self.count += 1
+        if self._pipeline is not None:
+            self._pipeline.update(value)
+
+    def sample(self):
+        # Take one burst now, e.g. before the timer has fired
+        self._tick()
+        return self.latest
+
+    @property
+    def latest(self):
+        # Most recent decimated sample, or None before the first one
+        if not self.count:
+            return None
+        return self._ring[(self._index - 1) % self._size]
+
+    def history(self):
+        # Samples in the ring, oldest first (allocates, not for hot paths)
+        n = min(self.count, self._size)
+        start = (self._index - n) % self._size
+        return [self._ring[(start + i) % self._size] for i in range(n)]
@@ -0,0 +1,162 @@
+# Output drivers for the relays and compressors behind the actuator boards.
+#
+# An Actuator wraps a picozero output and keeps its own switching schedule
+# instead of switching the moment a command arrives:
+#
+#   request(on)   ask for a state; rapid flips collapse into the last one
+#                 and a flip back before anything switched cancels it
+#   update()      switch if the schedule allows; call it once per main loop
+#                 pass, it never blocks. Returns True when it switched.
+#   state         what the output is actually doing
+#   target        the last requested state
+#   transitions() the last switches as (applied_ms, requested_ms, state),
+#                 oldest first, in ticks_ms
+#
+# The schedule enforces:
+#
+#   min_on_ms / min_off_ms   lockouts after switching on / off (compressor
+#                            short-cycle protection); they also run from
+#                            boot, so a power blip cannot restart a
+#                            compressor straight away
+#   start_delay_ms           fixed delay before switching on; give each
+#                            board a different one so that boards switched
+#                            by the same master decision do not all start
+#                            at once
+#   gate                     a StaggerGate shared by the actuators of a
+#                            board: no two of them switch on within its
+#                            spacing_ms
+#   soft_start_ms            PWM outputs ramp from 0 to full over this time
+#                            instead of switching on hard
+#
+# Actuators are described in config.json and built with make_actuator():
+#
+#   {"pin": 15, "min_on_ms": 60000, "min_off_ms": 60000}
+#   {"pin": 16, "pwm": true, "soft_start_ms": 2000, "active_high": false}
+
+import utime
+from array import array
+from picozero import DigitalOutputDevice, PWMOutputDevice
+
+
+class StaggerGate:
+    # Spaces out switch-on events of the actuators that share it
+    def __init__(self, spacing_ms=2000):
+        self.spacing_ms = spacing_ms
+        self._last = None
+
+    def claim(self, now):
+        if self._last is not None and utime.ticks_diff(now, self._last) < self.spacing_ms:
+            return False
+        self._last = now
+        return True
+
+
+class Actuator:
+    def __init__(self, device, min_on_ms=0, min_off_ms=0, start_delay_ms=0,
+                 soft_start_ms=0, gate=None, log_size=32):
+        self.device = device
+        self.min_on_ms = min_on_ms
+        self.min_off_ms = min_off_ms
+        self.start_delay_ms = start_delay_ms
+        # only PWM outputs can ramp
+        self.soft_start_ms = soft_start_ms if isinstance(device, PWMOutputDevice) else 0
+        self.gate = gate
+        self.requests = 0
+        self.coalesced = 0
+        now = utime.ticks_ms()
+        device.off()
+        self.state = False
+        self.target = False
+        self._changed = now
+        self._requested = now
+        self._ramp_start = None
+        # transition ring: ticks_ms stay below 2**30, so they fit in 'i'
+        self._applied_log = array('i', bytes(4 * log_size))
+        self._requested_log = array('i', bytes(4 * log_size))
+        self._state_log = bytearray(log_size)
+        self._log_next = 0
+        self._log_count = 0
+
+    def request(self, on, now=None):
+        on = bool(on)
+        self.requests += 1
+        if on == self.target:
+            return
+        if self.target != self.state:
+            # an earlier request has not been applied yet: it is replaced
+            # (or cancelled if this goes back to the current state)
+            self.coalesced += 1
+        self.target = on
+        self._requested = utime.ticks_ms() if now is None else now
+
+    @property
+    def pending(self):
+        return self.target != self.state
+
+    def update(self, now=None):
+        if now is None:
+            now = utime.ticks_ms()
+        if self._ramp_start is not None:
+            self._ramp(now)
+        if self.target == self.state:
+            return False
+        held = utime.ticks_diff(now, self._changed)
+        if held < (self.min_on_ms if self.state else self.min_off_ms):
+            return False
+        if self.target:
+            if utime.ticks_diff(now, self._requested) < self.start_delay_ms:
+                return False
+            if self.gate is not None and not self.gate.claim(now):
+                return False
+        self._switch(self.target, now)
+        return True
+
+    def _switch(self, on, now):
+        self.state = on
+        self._changed = now
+        if on and self.soft_start_ms:
+            self._ramp_start = now
+            self.device.value = 0
+        elif on:
+            self.device.on()
+        else:
+            self._ramp_start = None
+            self.device.off()
+
+        i = self._log_next
+        self._applied_log[i] = now
+        self._requested_log[i] = self._requested
+        self._state_log[i] = on
+        self._log_next = (i + 1) % len(self._state_log)
+        self._log_count = min(self._log_count + 1, len(self._state_log))
+
+    def _ramp(self, now):
+        elapsed = utime.ticks_diff(now, self._ramp_start)
+        if elapsed >= self.soft_start_ms:
+            self._ramp_start = None
+            self.device.on()
+        else:
+            self.device.value = elapsed / self.soft_start_ms
+
+    def transitions(self):
+        size = len(self._state_log)
+        start = (self._log_next - self._log_count) % size
+        out = []
+        for k in range(self._log_count):
+            i = (start + k) % size
+            out.append((self._applied_log[i], self._requested_log[i], bool(self._state_log[i])))
+        return out
+
+    def close(self):
+        self.device.close()
+
+
+def make_actuator(spec, gate=None):
+    spec = dict(spec)
+    pin = spec.pop('pin')
+    active_high = spec.pop('active_high', True)
+    if spec.pop('pwm', False):
+        device = PWMOutputDevice(pin, freq=spec.pop('freq', 100), active_high=active_high)
+    else:
+        device = DigitalOutputDevice(pin, active_high=active_high)
+    return Actuator(device, gate=gate, **spec)
@@ -1,9 +1,14 @@
 import network
-from machine import ADC, Pin
 from picozero import LED
 import utime
 import json
 from umqtt.simple import MQTTClient
+from sensors import make_sensor
+from telemetry import TelemetryStream
+from fallback import FallbackController, COOL
+from actuators import make_actuator
+from tracing import Tracer, RECEIVE, CALLBACK, ACTUATE
+from metrics import Registry, counting
 
 # Load configuration from file
 def load_config():
@@ -14,33 +19,62 @@ config = load_config()
 ssid = config['ssid']
 password = config['password']
 broker = config['broker_ip']
+# The master's address when it may host the broker (host_broker 'fallback')
+fallback_broker = config.get('fallback_broker_ip')
 
 client_id = 'pico_ac_board'
 topic_control = b'ac_control'
 topic_temperature = b'room_temperature'
+topic_master_status = b'master_status'
 
-green = LED(15)
+# Compressor relay (see actuators.py), with longer lockouts than the
+# boiler and a start delay so it never starts together with the heating
+# board. The red LED shows it is off.
+compressor = make_actuator(config.get('ac_relay', {
+    'pin': 15, 'min_on_ms': 120000, 'min_off_ms': 180000, 'start_delay_ms': 5000}))
 red = LED(14)
-potentiometer = ADC(Pin(26))
 
-num_samples = 10
-adc_buffer = [0] * num_samples
-buffer_index = 0
+# Room temperature source, configurable in config.json (see sensors.py).
+# Defaults to the potentiometer on GP26 mapped to 15-40 °C.
+room_sensor = make_sensor(config.get('room_sensor', {
+    'type': 'potentiometer', 'pin': 26, 'calibration': config.get('calibration')}))
 
-alpha = 0.3
-ema_value = 0
+# Local thermostat on the room sensor while the master is unreachable
+fallback = FallbackController(
+    COOL,
+    timeout_ms=config.get('fallback_timeout_ms', 60000),
+    hysteresis=config.get('fallback_hysteresis', 0.5))
+reconnect_interval = 5000
 
-def read_potentiometer():
-    global buffer_index, ema_value
-    adc_value = potentiometer.read_u16()
-    adc_buffer[buffer_index] = adc_value
-    buffer_index = (buffer_index + 1) % num_samples
-    moving_average = sum(adc_buffer) / num_samples
-    ema_value = (alpha * moving_average) + ((1 - alpha) * ema_value)
-    return ema_value
+# Optional high-rate raw ADC stream (telemetry_rate_hz > 0) for control loop tuning
+topic_telemetry = ('telemetry/' + client_id).encode()
+telemetry_rate_hz = config.get('telemetry_rate_hz', 0)
+telemetry = None
+if telemetry_rate_hz and hasattr(room_sensor, 'adc'):
+    telemetry = TelemetryStream(room_sensor.adc, rate_hz=telemetry_rate_hz,
+                                samples=config.get('telemetry_samples', 128))
 
-def map_value(value, from_low, from_high, to_low, to_high):
-    return to_low + ((value - from_low) / (from_high - from_low)) * (to_high - to_low)
+# Optional latency tracing of the master's commands (see tracing.py): a
+# ring of trace_size spans, published on trace/<client_id> on request
+topic_trace_dump = b'trace/dump'
+topic_trace = ('trace/' + client_id).encode()
+trace_size = config.get('trace_size', 0)
+tracer = Tracer(trace_size) if trace_size else None
+poll_start = 0
+
+# Runtime metrics (see metrics.py), published every metrics_interval_ms on
+# $metrics/<client_id> (0 turns that off)
+topic_metrics = ('$metrics/' + client_id).encode()
+metrics_interval = config.get('metrics_interval_ms', 60000)
+registry = Registry()
+loop_time = registry.histogram('loop_us')
+publishes = registry.counter('publishes')
+messages = registry.counter('messages')
+connects = registry.counter('connects')
+connect_failures = registry.counter('connect_failures')
+
+# Per-message prints, which cost real time over USB serial
+debug = config.get('debug', False)
 
 def connect_to_wifi():
     wlan = network.WLAN(network.STA_IF)
@@ -52,54 +86,141 @@ def connect_to_wifi():
     print('Connected to Wi-Fi:', wlan.ifconfig())
     return wlan.isconnected()
 
+def set_cooling(on):
+    compressor.request(on)
+
+def show_cooling():
+    red.value = not compressor.state
+    print('Cooling', 'on' if compressor.state else 'off')
+
 def message_callback(topic, msg):
+    received = utime.ticks_us()
+    messages.inc()
+    if topic == topic_trace_dump:
+        client.publish(topic_trace, tracer.dump())
+        return
     data = json.loads(msg)
+    if topic == topic_master_status:
+        if data.get('status') == 'offline':
+            fallback.master_lost()
+            print('Master offline, using local thermostat')
+        elif fallback.heard():
+            print('Master is back, handing control back')
+        return
+    if fallback.heard():
+        print('Master is back, handing control back')
     if 'command' in data:
         command = data['command']
+        trace_id = data.get('trace') if tracer is not None else None
+        if trace_id is not None:
+            tracer.record(trace_id, RECEIVE, poll_start, received)
         if command == 'start_cooling':
-            print('Received start cooling command')
-            green.on()
-            red.off()
+            if debug:
+                print('Received start cooling command')
+            fallback.command(True, data.get('target'))
+            set_cooling(True)
         elif command == 'stop_cooling':
-            print('Received stop cooling command')
-            green.off()
-            red.on()
+            if debug:
+                print('Received stop cooling command')
+            fallback.command(False, data.get('target'))
+            set_cooling(False)
+        if trace_id is not None:
+            tracer.record(trace_id, CALLBACK, received)
+            tracer.begin(trace_id, ACTUATE, received)
+            if not compressor.pending:
+                # already in that state, nothing to switch
+                tracer.end(ACTUATE)
+
+def connect_to_broker():
+    connects.inc()
+    try:
+        if client.sock is not None:
+            client.sock.close()
+        client.connect()
+        client.subscribe(topic_control)
+        client.subscribe(topic_master_status)
+        if tracer is not None:
+            client.subscribe(topic_trace_dump)
+        print('Connected to MQTT broker and subscribed to topic')
+        return True
+    except Exception as e:
+        print(f'Failed to connect to MQTT broker: {e}')
+        connect_failures.inc()
+        # try the other broker next time
+        if fallback_broker is not None:
+            client.server = fallback_broker if client.server == broker else broker
+        return False
+
 def main():
+    set_cooling(False)
     red.on()
-    green.off()
     
+    global client, poll_start
     client = MQTTClient(client_id, broker)
+    client.publish = counting(client.publish, publishes)
     client.set_callback(message_callback)
     
     if not connect_to_wifi():
         return
     
-    try:
-        client.connect()
-        client.subscribe(topic_control)
-        print('Connected to MQTT broker and subscribed to topic')
-    except Exception as e:
-        print(f'Failed to connect to MQTT broker: {e}')
-        return
+    # Keep running without a broker: the fallback thermostat takes over
+    connected = connect_to_broker()
+    last_connect_time = utime.ticks_ms()
     
+    room_sensor.start()
+    if telemetry is not None:
+        telemetry.start()
     last_publish_time = utime.ticks_ms()
     publish_interval = 5000  # Send temperature updates every 5 seconds
     
+    last_metrics_time = utime.ticks_ms()
     while True:
-        client.check_msg()
-        
-        filtered_adc_value = read_potentiometer()
-        min_adc = 0
-        max_adc = 65535
-        temperature = map_value(filtered_adc_value, min_adc, max_adc, 15, 40)
-        
-        # Send current temperature at periodic interval of times
+        loop_start = utime.ticks_us()
         current_time = utime.ticks_ms()
-        if utime.ticks_diff(current_time, last_publish_time) >= publish_interval:
-            client.publish(topic_temperature, json.dumps({'room_temperature': temperature}))
-            print(f"Set temperature: {temperature:.2f} °C")
-            last_publish_time = current_time
+        room_sensor.update(current_time)
+        temperature = room_sensor.read()
+
+        if connected:
+            try:
+                poll_start = utime.ticks_us()
+                client.check_msg()
+
+                # Full telemetry frames are published straight from their buffer
+                if telemetry is not None and telemetry.ready() is not None:
+                    client.publish(topic_telemetry, telemetry.ready())
+                    telemetry.release()
+
+                if metrics_interval and utime.ticks_diff(current_time, last_metrics_time) >= metrics_interval:
+                    client.publish(topic_metrics, registry.snapshot())
+                    last_metrics_time = current_time
+
+                # Send current temperature at periodic interval of times
+                if temperature is not None and utime.ticks_diff(current_time, last_publish_time) >= publish_interval:
+                    client.publish(topic_temperature, json.dumps({'room_temperature': temperature}))
+                    if debug:
+                        print(f"Set temperature: {temperature:.2f} °C")
+                    last_publish_time = current_time
+            except OSError as e:
+                print(f'Lost connection to MQTT broker: {e}')
+                connected = False
+        elif utime.ticks_diff(current_time, last_connect_time) >= reconnect_interval:
+            connected = connect_to_broker()
+            last_connect_time = current_time
+
+        was_active = fallback.active
+        demand = fallback.update(temperature, current_time)
+        if demand is not None:
+            if not was_active:
+                print('No word from the master, using local thermostat')
+            if demand != compressor.target:
+                set_cooling(demand)
+
+        if compressor.update(current_time):
+            show_cooling()
+            if tracer is not None:
+                tracer.end(ACTUATE)
 
+        loop_time.observe(utime.ticks_diff(utime.ticks_us(), loop_start))
         utime.sleep_ms(100)
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+# Host-side throughput benchmark of umqtt/broker.py over TCP on localhost:
+#   python benchmarks/bench_broker.py
+#
+# N clients connect to the broker and subscribe to house/+/temperature;
+# each publishes messages_per_client messages to house/<n>/temperature at
+# the given QoS, keeping at most `window` of its own messages in flight
+# (sent but not yet delivered back to it). Every message reaches all N
+# clients.
+# Reported per run: messages published and delivered per second, and the
+# publish-to-delivery latency (p50, p99, max) stamped into each payload.
+# Clients and broker share one asyncio loop, so the figures are a lower
+# bound for the broker alone.
+import asyncio
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from umqtt.broker import Broker, packet, publish_packet
+
+port = 18831
+messages_per_client = 2000
+window = 4
+runs = [(1, 0), (4, 0), (16, 0), (32, 0), (4, 1), (16, 1)]   # (clients, qos)
+
+
+def connect_packet(client_id):
+    body = b"\x00\x04MQTT\x04\x02\x00\x00" + struct.pack("!H", len(client_id)) + client_id
+    return packet(0x10, body)
+
+
+def subscribe_packet(topic, qos):
+    return packet(0x82, struct.pack("!HH", 1, len(topic)) + topic + bytes((qos,)))
+
+
+async def read_packet(reader):
+    first = (await reader.readexactly(1))[0]
+    n = shift = 0
+    while True:
+        b = (await reader.readexactly(1))[0]
+        n |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            break
+    return first, await reader.readexactly(n)
+
+
+async def client(index, clients, qos, latencies, ready, go):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(connect_packet(b"bench%d" % index))
+    writer.write(subscribe_packet(b"house/+/temperature", qos))
+    await read_packet(reader)   # CONNACK
+    await read_packet(reader)   # SUBACK
+    expected = clients * messages_per_client
+    in_flight = asyncio.Semaphore(window)
+    topic = b"house/%d/temperature" % index
+
+    async def receive():
+        received = 0
+        while received < expected:
+            first, body = await read_packet(reader)
+            kind = first >> 4
+            if kind == 4:   # PUBACK
+                continue
+            i = 2 + (body[0] << 8 | body[1])
+            if body[2:i] == topic:
+                in_flight.release()
+            if first & 6:
+                writer.write(b"\x40\x02" + body[i:i + 2])
+                i += 2
+            latencies.append(time.perf_counter_ns() - struct.unpack_from("!q", body, i)[0])
+            received += 1
+
+    receiving = asyncio.ensure_future(receive())
+    ready.release()
+    await go.wait()
+    for n in range(messages_per_client):
+        await in_flight.acquire()
+        stamp = struct.pack("!q", time.perf_counter_ns())
+        writer.write(publish_packet(topic, stamp + b'{"t": 21.5}', qos, False, n % 65535 + 1))
+    await receiving
+    writer.write(b"\xe0\x00")
+    writer.close()
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+async def run(clients, qos):
+    broker = Broker()
+    server = asyncio.ensure_future(broker.serve("127.0.0.1", port))
+    await asyncio.sleep(0.05)
+    latencies = []
+    ready = asyncio.Semaphore(0)
+    go = asyncio.Event()
+    tasks = [asyncio.ensure_future(client(i, clients, qos, latencies, ready, go)) for i in range(clients)]
+    for _ in range(clients):
+        await ready.acquire()
+    start = time.perf_counter()
+    go.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    server.cancel()
+    latencies.sort()
+    return (broker.published / elapsed, broker.delivered / elapsed,
+            percentile(latencies, 50) / 1e6, percentile(latencies, 99) / 1e6, latencies[-1] / 1e6)
+
+
+def main():
+    print("{:>7} {:>3} {:>12} {:>12} {:>8} {:>8} {:>8}".format(
+        "clients", "qos", "published/s", "delivered/s", "p50 ms", "p99 ms", "max ms"))
+    for clients, qos in runs:
+        result = asyncio.run(run(clients, qos))
+        print("{:>7} {:>3} {:>12.0f} {:>12.0f} {:>8.2f} {:>8.2f} {:>8.2f}".format(clients, qos, *result))
+
+
+if __name__ == "__main__":
+    main()
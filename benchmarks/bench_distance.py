@@ -0,0 +1,64 @@
+# Host-side check of the background DistanceSensor against the HC-SR04
+# simulator in sim/hcsr04.py, on the virtual clock from hal/:
+#   python benchmarks/bench_distance.py
+#
+# For each scenario the sensor runs for 3 virtual seconds. Reported: pings
+# sent, the distance read at the end against the true one, and the host
+# time of one .distance read (served from the cached median; the old
+# implementation blocked for the whole echo, up to 100 ms, on every read).
+# The last scenario starts just before ticks_us wraps around.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+import utime
+from sim.hcsr04 import HCSR04
+from picozero import DistanceSensor
+
+ECHO = 2
+TRIGGER = 3
+reads = 10000
+
+
+def run(name, distance, outliers=0.0, max_distance=2, start_us=None):
+    if start_us is not None:
+        utime.advance_us(start_us - utime.now_us())
+    sim = HCSR04(TRIGGER, ECHO, distance=distance, outliers=outliers)
+    sensor = DistanceSensor(ECHO, TRIGGER, max_distance=max_distance)
+    utime.sleep_ms(3000)
+
+    t0 = time.perf_counter_ns()
+    for _ in range(reads):
+        measured = sensor.distance
+    read_us = (time.perf_counter_ns() - t0) / reads / 1000
+    sensor.close()
+    sim.close()
+
+    expected = None if distance is None or distance > 4 else min(distance, max_distance)
+    if measured is None or expected is None:
+        ok = measured is expected
+        error = "-"
+    else:
+        ok = abs(measured - expected) < 0.005
+        error = "{:.4f}".format(abs(measured - expected))
+    print("{:<34} {:>6} {:>10} {:>10} {:>8} {:>9.2f}  {}".format(
+        name, sim.pings, str(expected), "None" if measured is None else "{:.4f}".format(measured),
+        error, read_us, "ok" if ok else "FAIL"))
+    return ok
+
+
+print("{:<34} {:>6} {:>10} {:>10} {:>8} {:>9}".format(
+    "scenario", "pings", "true m", "read m", "error", "read us"))
+results = [
+    run("0.5 m", 0.5),
+    run("1.2 m", 1.2),
+    run("beyond max_distance (3 m of 2 m)", 3.0),
+    run("no echo", None),
+    run("0.8 m, 30% spurious echoes", 0.8, outliers=0.3),
+    run("0.8 m across ticks_us wraparound", 0.8, start_us=(1 << 30) - 1500000),
+]
+sys.exit(0 if all(results) else 1)
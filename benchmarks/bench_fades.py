@@ -0,0 +1,91 @@
+# Host-side benchmark of picozero fades: the original float generator
+# against the precomputed duty cycle tables played by FadeChange, on the
+# virtual clock from hal/:
+#   python benchmarks/bench_fades.py
+#
+# Reports CC register writes (counted by the fake PWM block in hal/, so
+# duty_u16 calls and grouped writes are counted alike), host time per
+# write and heap growth per write (tracemalloc) for a pulsing PWMLED and a
+# cycling RGBLED.
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+import utime
+from machine import _pwm_block
+from picozero import PWMLED, RGBLED
+from picozero.base import ValueChange
+
+duration_ms = 20000
+
+
+def legacy_pulse(led, fade_in_time=1, fade_out_time=None, n=None, fps=25):
+    # The original PWMOutputDevice.blink generator for a pulse
+    fade_out_time = fade_in_time if fade_out_time is None else fade_out_time
+
+    def blink_generator():
+        for s in [(i * (1 / fps) / fade_in_time, 1 / fps) for i in range(int(fps * fade_in_time))]:
+            yield s
+        for s in [(1 - (i * (1 / fps) / fade_out_time), 1 / fps) for i in range(int(fps * fade_out_time))]:
+            yield s
+
+    led._start_change(blink_generator, n, False)
+
+
+class PerLED:
+    # The original RGBLED._write: one duty_u16 call per colour
+    def __init__(self, rgb):
+        self.rgb = rgb
+
+    def _write(self, value):
+        for led, v in zip(self.rgb._leds, value):
+            led.value = v
+
+    def off(self):
+        self.rgb.off()
+
+
+def legacy_cycle(rgb, fade_times=1, colors=((1, 0, 0), (0, 1, 0), (0, 0, 1)), n=None, fps=25):
+    # The original RGBLED.blink generator for a colour cycle
+    def blink_generator():
+        lerp = lambda t, fade_in, color1, color2: tuple(
+            (1 - t) * off + t * on if fade_in else (1 - t) * on + t * off
+            for off, on in zip(color2, color1))
+        for c in range(len(colors)):
+            for i in range(int(fps * fade_times)):
+                yield (lerp(i * (1 / fps) / fade_times, True, colors[(c + 1) % len(colors)], colors[c]), 1 / fps)
+
+    rgb._value_changer = ValueChange(PerLED(rgb), blink_generator, n, False)
+
+
+def run(name, start, device):
+    start(device)
+    utime.sleep_ms(1000)  # let caches, generators and lists warm up
+    writes = _pwm_block.writes
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter_ns()
+    utime.sleep_ms(duration_ms)
+    host_ns = time.perf_counter_ns() - t0
+    grown = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    device.off()
+    frames = _pwm_block.writes - writes
+    print("{:<26} {:>8} {:>12.1f} {:>14.1f}".format(
+        name, frames, host_ns / max(frames, 1) / 1000, grown / max(frames, 1)))
+
+
+led = PWMLED(15)
+rgb = RGBLED(16, 17, 18)
+
+print("{:<26} {:>8} {:>12} {:>14}".format("fade", "writes", "host us", "peak B/write"))
+run("PWMLED pulse, generator", legacy_pulse, led)
+run("PWMLED pulse, table", lambda d: d.pulse(), led)
+run("PWMLED pulse, gamma table", lambda d: d.pulse(curve='gamma'), led)
+run("RGBLED cycle, generator", legacy_cycle, rgb)
+run("RGBLED cycle, tables", lambda d: d.cycle(), rgb)
@@ -0,0 +1,100 @@
+# Throughput and heap allocations per sample of the ADC filter pipeline,
+# compared with the float list/EMA code it replaced. Runs on the host
+#   python benchmarks/bench_filters.py
+# or on a board
+#   mpremote run benchmarks/bench_filters.py
+import os
+import sys
+
+try:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except AttributeError:
+    pass  # MicroPython: filters.py is in the board's root directory
+
+from filters import Pipeline, Median, MovingAverage, EMA
+
+try:
+    import tracemalloc
+
+    # CPython recycles floats and small ints through free lists, so this is
+    # only the peak heap growth; run on a board for real allocation counts
+    unit = "peak bytes/sample"
+
+    def allocations(fn):
+        tracemalloc.start()
+        fn()
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    from time import perf_counter_ns
+
+    def now_us():
+        return perf_counter_ns() // 1000
+
+    def elapsed_us(start):
+        return now_us() - start
+except ImportError:
+    import gc
+    import utime
+
+    unit = "heap bytes/sample"
+
+    def allocations(fn):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        fn()
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used
+
+    now_us = utime.ticks_us
+
+    def elapsed_us(start):
+        return utime.ticks_diff(utime.ticks_us(), start)
+
+samples = 5000
+readings = [(i * 7919) % 1024 + 30000 + (20000 if i % 97 == 0 else 0) for i in range(samples)]
+
+
+class LegacyFilter:
+    # The original read_potentiometer arithmetic from air_conditioner_board
+    def __init__(self, n=10, alpha=0.3):
+        self.buffer = [0] * n
+        self.index = 0
+        self.n = n
+        self.alpha = alpha
+        self.ema = 0
+
+    def update(self, x):
+        self.buffer[self.index] = x
+        self.index = (self.index + 1) % self.n
+        moving_average = sum(self.buffer) / self.n
+        self.ema = (self.alpha * moving_average) + ((1 - self.alpha) * self.ema)
+        return self.ema
+
+
+def run(name, make):
+    f = make()
+    start = now_us()
+    for x in readings:
+        f.update(x)
+    us = elapsed_us(start)
+
+    f = make()
+    f.update(readings[0])
+
+    def feed():
+        for x in readings:
+            f.update(x)
+    used = allocations(feed)
+    print("{:<36} {:>10.0f} samples/s {:>8.2f} {}".format(
+        name, samples * 1000000 / max(us, 1), used / samples, unit))
+
+
+run("legacy list + float EMA", lambda: LegacyFilter())
+run("MovingAverage(10)", lambda: Pipeline(MovingAverage(10)))
+run("MovingAverage(10) + EMA(0.3)", lambda: Pipeline(MovingAverage(10), EMA(0.3)))
+run("Median(3) + MovingAverage + EMA", lambda: Pipeline(Median(3), MovingAverage(10), EMA(0.3)))
+run("Median(5)", lambda: Pipeline(Median(5)))
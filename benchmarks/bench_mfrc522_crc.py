@@ -0,0 +1,62 @@
+# Latency of PcdSelect and read with the RC522 coprocessor CRC versus the
+# host-side CRC_A table. Run on the master board with a card on the reader:
+#   mpremote run benchmarks/bench_mfrc522_crc.py
+import utime
+from mfrc522 import MFRC522
+
+rounds = 50
+key = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+block = 4
+
+reader = MFRC522(spi_id=0, sck=18, mosi=19, miso=16, cs=17, rst=22)
+
+
+def select_card():
+    reader.init()
+    (stat, _) = reader.request(reader.REQIDL)
+    if stat != reader.OK:
+        return None
+    (stat, uid) = reader.anticoll(reader.PICC_ANTICOLL1)
+    if stat != reader.OK:
+        return None
+    return uid
+
+
+def bench(mode):
+    reader.crc_mode = mode
+    select_us = read_us = crc_us = 0
+    done = 0
+    for _ in range(rounds):
+        uid = select_card()
+        if uid is None:
+            continue
+        t0 = utime.ticks_us()
+        ok = reader.PcdSelect(uid, reader.PICC_ANTICOLL1)
+        t1 = utime.ticks_us()
+        if not ok or reader.auth(reader.AUTHENT1A, block, key, uid) != reader.OK:
+            continue
+        t2 = utime.ticks_us()
+        (stat, _) = reader.read(block)
+        t3 = utime.ticks_us()
+        reader.stop_crypto1()
+        if stat != reader.OK:
+            continue
+        t4 = utime.ticks_us()
+        reader._crc([0x30, block])
+        t5 = utime.ticks_us()
+        select_us += utime.ticks_diff(t1, t0)
+        read_us += utime.ticks_diff(t3, t2)
+        crc_us += utime.ticks_diff(t5, t4)
+        done += 1
+    if not done:
+        print("no card on the reader")
+        return
+    print("{}: {} rounds, PcdSelect {} us, read {} us, _crc {} us".format(
+        "chip" if mode == reader.CRC_CHIP else "soft",
+        done, select_us // done, read_us // done, crc_us // done))
+
+
+if reader.set_crc_mode(reader.CRC_SOFT):
+    print("software CRC_A matches the chip")
+bench(reader.CRC_CHIP)
+bench(reader.CRC_SOFT)
@@ -0,0 +1,67 @@
+# Import cost of picozero on the host, through the hal/ stand-ins:
+#   python benchmarks/bench_picozero_import.py
+#
+# Each import runs in a fresh interpreter with an empty bytecode cache, so
+# the source is compiled every time as it is on a board without .mpy
+# files. "everything" (import picozero.picozero) is what every board paid
+# before picozero was split into submodules. Reported: wall time of the
+# import, objects tracked by the garbage collector, bytes allocated and
+# picozero modules loaded.
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+rounds = 5
+
+CHILD = """
+import gc, json, sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+import hal
+hal.install()
+import machine, micropython, utime
+gc.collect()
+objects = len(gc.get_objects())
+tracemalloc.start()
+t0 = time.perf_counter_ns()
+{statement}
+ns = time.perf_counter_ns() - t0
+allocated = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+gc.collect()
+print(json.dumps({{
+    'us': ns / 1000,
+    'objects': len(gc.get_objects()) - objects,
+    'bytes': allocated,
+    'modules': len([m for m in sys.modules if m.startswith('picozero')]),
+}}))
+"""
+
+CASES = [
+    ("everything (picozero.picozero)", "import picozero.picozero"),
+    ("from picozero import LED", "from picozero import LED"),
+    ("from picozero import LED, Button", "from picozero import LED, Button"),
+    ("from picozero import RGBLED", "from picozero import RGBLED"),
+]
+
+
+def measure(statement):
+    results = []
+    for _ in range(rounds):
+        with tempfile.TemporaryDirectory() as cache:
+            env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+            out = subprocess.run(
+                [sys.executable, '-c', CHILD.format(root=ROOT, statement=statement)],
+                env=env, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out))
+    results.sort(key=lambda r: r['us'])
+    return results[len(results) // 2]
+
+
+print("{:<34} {:>10} {:>10} {:>10} {:>8}".format("import", "time us", "objects", "bytes", "modules"))
+for name, statement in CASES:
+    r = measure(statement)
+    print("{:<34} {:>10.0f} {:>10} {:>10} {:>8}".format(
+        name, r['us'], r['objects'], r['bytes'], r['modules']))
@@ -0,0 +1,102 @@
+# Host-side benchmark of multi-channel PWM updates: one duty_u16 call per
+# channel (how RGBLED, Motor and Robot used to write) against one
+# PWMGroup.set, on the fake PWM registers from hal/:
+#   python benchmarks/bench_pwm.py
+#
+# Each update moves a device between two states. Reported per update: CC
+# register writes, torn states (register states after a write in which the
+# device shows neither the old nor the new values on all its channels) and
+# host time. Channels on one slice share a CC register and change in the
+# same PWM period when written together; across slices PWMGroup writes
+# back to back with interrupts off, so the remaining torn state lasts a
+# few cycles instead of the time between two Python calls. On the host,
+# mem32 is itself emulated in Python, so host times favour duty_u16.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+from array import array
+from machine import _pwm_block
+from picozero import RGBLED, Motor, Robot
+from picozero.pwm import pwm_manager, pwm_channel
+
+updates = 20000
+
+
+def levels(pins):
+    return tuple((_pwm_block.regs[s][3] >> (16 * c)) & 0xFFFF
+                 for s, c in (pwm_channel(pin) for pin in pins))
+
+
+def run(name, pins, write):
+    # `write(i)` moves the device to states[i % 2]
+    write(1)
+    before = levels(pins)
+    write(0)
+    after = levels(pins)
+    torn = [0]
+
+    def watch(slice, cc):
+        now = levels(pins)
+        if now != before and now != after:
+            torn[0] += 1
+    _pwm_block.on_cc.append(watch)
+    write(1)
+    write(0)
+    _pwm_block.on_cc.remove(watch)
+
+    writes = _pwm_block.writes
+    t0 = time.perf_counter_ns()
+    for i in range(updates):
+        write(i)
+    host_ns = time.perf_counter_ns() - t0
+    print("{:<34} {:>10.1f} {:>8.1f} {:>10.2f}".format(
+        name, (_pwm_block.writes - writes) / updates, torn[0] / 2, host_ns / updates / 1000))
+
+
+def per_channel(devices, states):
+    def write(i):
+        duties = states[i % 2]
+        for device, duty in zip(devices, duties):
+            device._pwm.duty_u16(duty)
+    return write
+
+
+def grouped(group, states):
+    duties = [array('H', s) for s in states]
+
+    def write(i):
+        group.set(duties[i % 2])
+    return write
+
+
+print("{:<34} {:>10} {:>8} {:>10}".format("update", "CC writes", "torn", "host us"))
+
+# RGBLED on GP16-18: red and green share slice 0, blue is on slice 1
+rgb = RGBLED(16, 17, 18)
+colours = ((65535, 0, 0), (0, 0, 65535))
+run("RGBLED red <-> blue, per channel", rgb.pins, per_channel(rgb._leds, colours))
+run("RGBLED red <-> blue, group", rgb.pins, grouped(rgb._group, colours))
+rgb.close()
+
+# Motor on GP12/13, one slice: reverse at half speed
+motor = Motor(12, 13)
+speeds = ((32767, 0), (0, 32767))
+run("Motor reverse, per channel", motor.pins, per_channel((motor._forward, motor._backward), speeds))
+run("Motor reverse, group", motor.pins, grouped(motor._group, speeds))
+motor.close()
+
+# Robot on GP8-11, two slices: turn left <-> turn right
+robot = Robot((8, 9), (10, 11))
+pins = (8, 9, 10, 11)
+turns = ((0, 65535, 65535, 0), (65535, 0, 0, 65535))
+outputs = (robot._left._forward, robot._left._backward, robot._right._forward, robot._right._backward)
+run("Robot left <-> right, per channel", pins, per_channel(outputs, turns))
+run("Robot left <-> right, group", pins, grouped(robot._group, turns))
+robot.close()
+
+print("\nchannels still allocated after close: {}".format(len(pwm_manager()._owners)))
@@ -0,0 +1,154 @@
+# Host-side benchmark of the MFRC522 driver against the register-level
+# simulator in sim/rc522.py:
+#   python benchmarks/bench_rc522.py
+#
+# Reports SPI transactions, SPI bytes and bus time (at the driver's 1 MHz
+# baud rate) per driver operation, the cost of one master_board.scan_rfid
+# poll with and without a tap, and anticollision with several cards.
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+import utime
+from machine import SPI
+from sim.rc522 import RC522, VirtualCard
+
+rounds = 200
+key = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+
+rc522 = RC522()
+SPI.attach(0, rc522, cs=17)
+
+from mfrc522 import MFRC522
+reader = MFRC522(spi_id=0, sck=18, mosi=19, miso=16, cs=17, rst=22)
+
+
+def report(name, fn, setup=None):
+    spi = nbytes = host_ns = 0
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        rc522.reset_counters()
+        t0 = time.perf_counter_ns()
+        fn()
+        host_ns += time.perf_counter_ns() - t0
+        spi += rc522.spi_transactions
+        nbytes += rc522.spi_bytes
+    print("{:<28} {:>8.1f} {:>10.1f} {:>10.0f} {:>10.1f}".format(
+        name, spi / rounds, nbytes / rounds,
+        nbytes * 8 / rounds, host_ns / rounds / 1000))
+
+
+def header(title):
+    print()
+    print(title)
+    print("{:<28} {:>8} {:>10} {:>10} {:>10}".format(
+        "operation", "spi txn", "spi bytes", "bus us", "host us"))
+
+
+def select(uid):
+    reader.init()
+    reader.request(reader.REQIDL)
+    reader.SelectTagSN()
+
+
+def bench_driver():
+    card = VirtualCard(b'\x12\x34\x56\x78')
+    rc522.clear()
+    rc522.place(card)
+    uid = list(card.uid)
+
+    for (mode, label) in ((reader.CRC_CHIP, "chip CRC"), (reader.CRC_SOFT, "software CRC_A")):
+        reader.crc_mode = mode
+        header("Driver operations, " + label)
+        report("init", reader.init)
+        report("request (no card)", lambda: reader.request(reader.REQIDL),
+               lambda: (rc522.remove(card), reader.init()))
+        rc522.place(card)
+        report("request", lambda: reader.request(reader.REQIDL), reader.init)
+        report("anticoll", lambda: reader.anticoll(reader.PICC_ANTICOLL1),
+               lambda: (reader.init(), reader.request(reader.REQIDL)))
+        report("PcdSelect", lambda: reader.PcdSelect(uid + [0x12 ^ 0x34 ^ 0x56 ^ 0x78], reader.PICC_ANTICOLL1),
+               lambda: (reader.init(), reader.request(reader.REQIDL), reader.anticoll(reader.PICC_ANTICOLL1)))
+        report("SelectTagSN", reader.SelectTagSN,
+               lambda: (reader.init(), reader.request(reader.REQIDL)))
+        report("auth", lambda: reader.auth(reader.AUTHENT1A, 7, key, uid), lambda: select(uid))
+        report("read", lambda: reader.read(4),
+               lambda: (select(uid), reader.auth(reader.AUTHENT1A, 7, key, uid)))
+        report("write", lambda: reader.write(5, bytes(16)),
+               lambda: (select(uid), reader.auth(reader.AUTHENT1A, 7, key, uid)))
+        report("readSectorBlock x3", lambda: [reader.readSectorBlock(uid, 1, b, keyA=key) for b in range(3)],
+               lambda: select(uid))
+        report("readSector", lambda: reader.readSector(uid, 1, keyA=key), lambda: select(uid))
+    reader.crc_mode = reader.CRC_SOFT
+
+
+def bench_scan_rfid():
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    card = VirtualCard(b'\x12\x34\x56\x78')
+    card_id = int.from_bytes(card.uid, "little")
+    with open('config.json', 'w') as f:
+        json.dump({'ssid': 'sim', 'password': 'sim', 'broker_ip': '127.0.0.1'}, f)
+    with open('users_card_id.json', 'w') as f:
+        json.dump({str(card_id): {'winter': 22, 'summer': 24}}, f)
+
+    class Publisher:
+        count = 0
+
+        def publish(self, topic, msg, retain=False, qos=0):
+            Publisher.count += 1
+
+    import master_board
+    master_board.client = Publisher()
+    master_board.print = lambda *args, **kwargs: None
+
+    rc522.clear()
+    header("master_board.scan_rfid, one call per 1 s poll")
+    report("idle poll", master_board.scan_rfid, lambda: utime.sleep_ms(1000))
+    rc522.place(card)
+    report("card held on reader", master_board.scan_rfid, lambda: utime.sleep_ms(1000))
+
+    def tap():
+        rc522.remove(card)
+        utime.sleep_ms(5000)
+        master_board.scan_rfid()
+        utime.sleep_ms(5000)
+        rc522.place(card)
+    report("tap (new card in field)", master_board.scan_rfid, tap)
+    print("presence publishes: {}".format(Publisher.count))
+
+
+def bench_anticollision():
+    print()
+    print("Anticollision (request + SelectTagSN) with several cards in the field")
+    print("{:<10} {:>10} {:>10} {:>10}".format("cards", "success", "spi txn", "host us"))
+    for n in range(1, 5):
+        rc522.clear()
+        for i in range(n):
+            rc522.place(VirtualCard(bytes((0x10 + i, 0x20, 0x30 + i, 0x40))))
+        ok = spi = host_ns = 0
+        for _ in range(rounds):
+            rc522.reset_counters()
+            t0 = time.perf_counter_ns()
+            reader.init()
+            (stat, _) = reader.request(reader.REQIDL)
+            if stat == reader.OK:
+                (stat, _) = reader.SelectTagSN()
+            host_ns += time.perf_counter_ns() - t0
+            spi += rc522.spi_transactions
+            ok += stat == reader.OK
+        print("{:<10} {:>9.0f}% {:>10.1f} {:>10.1f}".format(
+            n, 100 * ok / rounds, spi / rounds, host_ns / rounds / 1000))
+
+
+if __name__ == "__main__":
+    bench_driver()
+    bench_anticollision()
+    bench_scan_rfid()
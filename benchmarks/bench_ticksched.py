@@ -0,0 +1,135 @@
+# Host-side benchmark of picozero's ValueChange on the shared TickScheduler
+# against the original one-Timer-per-sequence implementation, using the
+# virtual clock and fake Timer from hal/:
+#   python benchmarks/bench_ticksched.py
+#
+# Every sequence steps at its own rate for 10 virtual seconds. Reported per
+# run: Timer objects created, Timer.init() calls, timer callbacks, how late
+# each step was against its ideal time (mean and worst, virtual ms) and the
+# host time spent per step. Each timer callback is charged callback_us of
+# virtual time for dispatch latency, as on a board.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+import utime
+from machine import Timer
+from picozero.base import ValueChange, tick_scheduler
+
+duration_ms = 10000
+callback_us = 200
+step_ms = [40, 33, 25, 100, 250, 50, 70, 500]
+
+
+class LegacyValueChange:
+    # The original ValueChange timer handling (wait=False path)
+    def __init__(self, output_device, generator, n, wait):
+        self._output_device = output_device
+        self._generator = generator
+        self._n = n
+        self._gen = self._generator()
+        self._timer = Timer()
+        self._running = True
+        self._set_value()
+
+    def _set_value(self, timer_obj=None):
+        next_seq = self._get_value()
+        if next_seq is not None:
+            value, seconds = next_seq
+            self._output_device._write(value)
+            self._timer.init(period=int(seconds * 1000), mode=Timer.ONE_SHOT, callback=self._set_value)
+        else:
+            self._output_device.off()
+            self._running = False
+
+    def _get_value(self):
+        try:
+            return next(self._gen)
+        except StopIteration:
+            self._n = self._n - 1 if self._n is not None else None
+            if self._n == 0:
+                return None
+            self._gen = self._generator()
+            return next(self._gen)
+
+    def stop(self):
+        self._running = False
+        self._timer.deinit()
+
+
+class Recorder:
+    # Output device that records when each step was written
+    def __init__(self):
+        self.times_us = []
+
+    def _write(self, value):
+        self.times_us.append(utime.now_us())
+
+    def off(self):
+        pass
+
+
+class CountingCallbacks:
+    # Wraps Timer.init so every callback is counted
+    count = 0
+
+    def __init__(self):
+        self._init = Timer.init
+
+        def init(timer, *args, callback=None, **kwargs):
+            def counted(t):
+                CountingCallbacks.count += 1
+                utime.advance_us(callback_us)
+                callback(t)
+            self._init(timer, *args, callback=counted, **kwargs)
+        Timer.init = init
+
+    def close(self):
+        Timer.init = self._init
+
+
+def run(name, cls, sequences):
+    counter = CountingCallbacks()
+    CountingCallbacks.count = 0
+    created = Timer.created
+    inits = Timer.inits
+    start_us = utime.now_us()
+    devices = []
+    changers = []
+    for i in range(sequences):
+        seconds = step_ms[i % len(step_ms)] / 1000
+        device = Recorder()
+        devices.append((device, step_ms[i % len(step_ms)]))
+        changers.append(cls(device, lambda s=seconds: iter([(1, s), (0, s)]), None, False))
+
+    t0 = time.perf_counter_ns()
+    utime.sleep_ms(duration_ms)
+    host_ns = time.perf_counter_ns() - t0
+    for changer in changers:
+        changer.stop()
+    counter.close()
+
+    steps = 0
+    late = []
+    for device, ms in devices:
+        for i, t in enumerate(device.times_us):
+            late.append((t - start_us - i * ms * 1000) / 1000)
+        steps += len(device.times_us) - 1
+    print("{:<10} {:>4} {:>8} {:>8} {:>10} {:>10.2f} {:>10.2f} {:>10.1f}".format(
+        name, sequences, Timer.created - created, Timer.inits - inits,
+        CountingCallbacks.count, sum(late) / len(late), max(late),
+        host_ns / max(steps, 1) / 1000))
+
+
+print("{:<10} {:>4} {:>8} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+    "impl", "seqs", "timers", "inits", "callbacks", "late ms", "worst ms", "host us"))
+for n in (1, 4, 16):
+    run("legacy", LegacyValueChange, n)
+    run("scheduler", ValueChange, n)
+print()
+print("scheduler resolution {} ms, timer stopped when idle: {}".format(
+    tick_scheduler().period_ms, not tick_scheduler()._running))
@@ -0,0 +1,266 @@
+# Host-side load benchmark of umqtt.simple.MQTTClient against the broker in
+# umqtt/broker.py, in-process through a fake socket:
+#   python benchmarks/bench_umqtt.py [--json results.json] [--baseline old.json]
+#
+# Cases: connect, reconnect (disconnect + connect with a last will),
+# subscribe to N topics, publish at QoS 0 and 1 and check_msg draining
+# published messages, over a range of payload sizes and topic counts.
+# Reported per operation: operations per second, host time in the client
+# (the broker's share is timed separately and left out), bytes on the
+# wire, socket write() and read() calls, and the peak memory allocated
+# while it ran (tracemalloc; this includes the broker's share). Writes,
+# reads and bytes are exact, so any change in them is a change in the
+# client's behaviour; times vary with the host.
+#
+# --json writes the results as a list of records; --baseline compares
+# against a previous --json file and exits 1 if a case got slower than
+# `slower` or moves more bytes or makes more socket calls.
+import collections
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+from umqtt import simple
+from umqtt.broker import Broker, Connection
+
+payload_sizes = [8, 64, 512, 4096]
+topic_counts = [1, 16, 128]
+operations = 2000
+repeats = 3
+slower = 1.25
+
+
+class Wire(Connection):
+    # The broker's end of a FakeSocket
+    def __init__(self):
+        super().__init__()
+        self.rx = collections.deque()
+
+    def send(self, data):
+        self.rx.append(data)
+
+    def take(self, n):
+        out = b''
+        while len(out) < n and self.rx:
+            chunk = self.rx.popleft()
+            k = n - len(out)
+            if len(chunk) > k:
+                self.rx.appendleft(chunk[k:])
+            out += chunk[:k]
+        return out
+
+
+class Counters:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.writes = 0
+        self.reads = 0
+        self.bytes = 0
+        self.broker_ns = 0
+
+
+class FakeSocket:
+    # usocket stream interface; what is written goes straight through the
+    # broker and its answers are ready to read
+    def __init__(self, broker, counters):
+        self.broker = broker
+        self.counters = counters
+        self.wire = None
+        self.blocking = True
+
+    def connect(self, address):
+        self.wire = Wire()
+
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def write(self, buf, length=None):
+        if length is not None:
+            buf = memoryview(buf)[:length]
+        c = self.counters
+        c.writes += 1
+        c.bytes += len(buf)
+        start = time.perf_counter_ns()
+        self.broker.received(self.wire, buf.encode() if isinstance(buf, str) else buf)
+        c.broker_ns += time.perf_counter_ns() - start
+        return len(buf)
+
+    def read(self, n):
+        if not self.wire.rx:
+            if not self.blocking:
+                return None
+            raise OSError("read would block forever")
+        data = self.wire.take(n)
+        self.counters.reads += 1
+        self.counters.bytes += len(data)
+        return data
+
+    def close(self):
+        self.broker.disconnected(self.wire)
+
+
+class FakeSocketModule:
+    def __init__(self, broker, counters):
+        self.broker = broker
+        self.counters = counters
+
+    def getaddrinfo(self, host, port, *args):
+        return [(2, 1, 0, '', (host, port))]
+
+    def socket(self, *args):
+        return FakeSocket(self.broker, self.counters)
+
+
+def topics(n):
+    return [b"house/room%d/temperature" % i for i in range(n)]
+
+
+def client(name, callback=None):
+    c = simple.MQTTClient(name, "broker")
+    c.set_callback(callback or (lambda topic, msg: None))
+    c.connect()
+    return c
+
+
+def measure(name, params, counters, op, n=operations, setup=None):
+    # Times n calls of op(i), best of `repeats`, then runs a few more under
+    # tracemalloc
+    best = None
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        counters.reset()
+        start = time.perf_counter_ns()
+        for i in range(n):
+            op(i)
+        elapsed = time.perf_counter_ns() - start
+        if best is None or elapsed - counters.broker_ns < best[0] - best[1]:
+            best = (elapsed, counters.broker_ns)
+    elapsed, broker_ns = best
+    record = {
+        'case': name,
+        'params': params,
+        'ops_per_s': round(n / (elapsed / 1e9)),
+        'client_us': round((elapsed - broker_ns) / n / 1000, 3),
+        'broker_us': round(broker_ns / n / 1000, 3),
+        'wire_bytes': round(counters.bytes / n, 2),
+        'writes': round(counters.writes / n, 2),
+        'reads': round(counters.reads / n, 2),
+    }
+    tracemalloc.start()
+    peak = 0
+    for i in range(n, n + 20):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op(i)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    record['peak_alloc_bytes'] = peak
+    return record
+
+
+def run_cases():
+    broker = Broker()
+    counters = Counters()
+    network = FakeSocketModule(broker, counters)
+    simple.socket = network
+    results = []
+
+    c = client("bench")
+    results.append(measure("connect", {}, counters, lambda i: c.connect()))
+
+    c.set_last_will(b"bench/status", b'{"status": "offline"}', retain=True)
+    def reconnect(i):
+        c.disconnect()
+        c.connect()
+    results.append(measure("reconnect", {'will': True}, counters, reconnect))
+    c.disconnect()
+
+    for count in topic_counts:
+        names = topics(count)
+        c = client("bench")
+        results.append(measure("subscribe", {'topics': count}, counters,
+                               lambda i: c.subscribe(names[i % count])))
+        c.disconnect()
+
+    for count in topic_counts:
+        names = topics(count)
+        listener = client("listener")
+        for topic in names:
+            listener.subscribe(topic)
+        for size in payload_sizes:
+            payload = b"x" * size
+            for qos in (0, 1):
+                c = client("bench")
+                results.append(measure("publish", {'qos': qos, 'payload': size, 'topics': count}, counters,
+                                       lambda i: c.publish(names[i % count], payload, qos=qos)))
+                c.disconnect()
+                listener.sock.wire.rx.clear()
+
+            # check_msg on the listener, with the messages already received
+            c = client("bench")
+            def fill():
+                for i in range(operations + 20):
+                    c.publish(names[i % count], payload)
+            results.append(measure("check_msg", {'payload': size, 'topics': count}, counters,
+                                   lambda i: listener.check_msg(), setup=fill))
+            c.disconnect()
+        listener.disconnect()
+    return results
+
+
+def key(record):
+    return record['case'] + json.dumps(record['params'], sort_keys=True)
+
+
+def compare(results, baseline):
+    # Returns the regressions against a previous run
+    old = {key(r): r for r in baseline}
+    problems = []
+    for r in results:
+        b = old.get(key(r))
+        if b is None:
+            continue
+        for field in ('wire_bytes', 'writes', 'reads'):
+            if r[field] > b[field]:
+                problems.append("{} {}: {} {} -> {}".format(r['case'], r['params'], field, b[field], r[field]))
+        if r['client_us'] > b['client_us'] * slower:
+            problems.append("{} {}: client_us {} -> {}".format(r['case'], r['params'], b['client_us'], r['client_us']))
+    return problems
+
+
+def main(argv):
+    out = argv[argv.index('--json') + 1] if '--json' in argv else None
+    baseline = argv[argv.index('--baseline') + 1] if '--baseline' in argv else None
+
+    results = run_cases()
+    print("{:<10} {:<36} {:>9} {:>9} {:>9} {:>8} {:>6} {:>6} {:>8}".format(
+        "case", "params", "ops/s", "client us", "broker us", "bytes", "writes", "reads", "peak B"))
+    for r in results:
+        params = " ".join("{}={}".format(k, v) for k, v in r['params'].items())
+        print("{:<10} {:<36} {:>9} {:>9.2f} {:>9.2f} {:>8} {:>6} {:>6} {:>8}".format(
+            r['case'], params, r['ops_per_s'], r['client_us'], r['broker_us'],
+            r['wire_bytes'], r['writes'], r['reads'], r['peak_alloc_bytes']))
+    if out is not None:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if baseline is not None:
+        with open(baseline) as f:
+            problems = compare(results, json.load(f))
+        for problem in problems:
+            print("REGRESSION", problem)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
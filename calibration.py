@@ -0,0 +1,133 @@
+# ADC-to-temperature calibration compiled to lookup tables.
+#
+# A curve maps a raw read_u16 value (0-65535) to degrees Celsius. At boot it
+# is evaluated once per ADC bucket (the top `bits` bits of the reading) and
+# stored as hundredths of a degree in an array('h'), so converting a
+# reading is a single table read. Curves are described in config.json:
+#
+#   {"type": "linear", "points": [[0, 15], [65535, 40]]}
+#       piecewise-linear through (adc, temperature) points
+#   {"type": "polynomial", "coefficients": [15, 25]}
+#       c0 + c1*x + c2*x**2 + ... with x = adc / 65535
+#   {"type": "steinhart_hart", "a": ..., "b": ..., "c": ..., "r_fixed": 10000}
+#       NTC thermistor in a voltage divider (picozero Thermistor conversion)
+#   {"type": "pico_temp"}
+#       the RP2040 on-chip sensor (picozero pico_temp_conversion)
+#
+# Any spec may also set "bits" (table size, default 10 = 1024 entries).
+
+import math
+from array import array
+
+ADC_MAX = 65535
+DEFAULT = {'type': 'linear', 'points': [[0, 15], [ADC_MAX, 40]]}
+
+
+def linear(points):
+    points = sorted((float(x), float(y)) for (x, y) in points)
+    if len(points) < 2:
+        raise ValueError("a linear curve needs at least two points")
+
+    def curve(adc):
+        for i in range(1, len(points)):
+            (x1, y1) = points[i]
+            if adc <= x1 or i == len(points) - 1:
+                (x0, y0) = points[i - 1]
+                return y0 + (adc - x0) * (y1 - y0) / (x1 - x0)
+    return curve
+
+
+def polynomial(coefficients):
+    coefficients = [float(c) for c in coefficients]
+
+    def curve(adc):
+        x = adc / ADC_MAX
+        y = 0.0
+        for c in reversed(coefficients):
+            y = y * x + c
+        return y
+    return curve
+
+
+def steinhart_hart_conversion(a, b, c, r_fixed=10000, vref=3.3, thermistor_low=True):
+    # Returns a voltage -> temperature function, usable as the `conversion`
+    # of a picozero.TemperatureSensor (Thermistor)
+    def conversion(voltage):
+        if thermistor_low:
+            r = r_fixed * voltage / (vref - voltage)
+        else:
+            r = r_fixed * (vref - voltage) / voltage
+        ln_r = math.log(r)
+        return 1 / (a + b * ln_r + c * ln_r ** 3) - 273.15
+    return conversion
+
+
+def from_voltage(conversion, vref=3.3):
+    # Turn a picozero-style voltage -> temperature conversion into a curve
+    def curve(adc):
+        return conversion(adc * vref / ADC_MAX)
+    return curve
+
+
+def curve_from_spec(spec):
+    kind = spec.get('type', 'linear')
+    if kind == 'linear':
+        return linear(spec['points'])
+    if kind == 'polynomial':
+        return polynomial(spec['coefficients'])
+    if kind == 'steinhart_hart':
+        vref = spec.get('vref', 3.3)
+        return from_voltage(steinhart_hart_conversion(
+            spec['a'], spec['b'], spec['c'], spec.get('r_fixed', 10000),
+            vref, spec.get('thermistor_low', True)), vref)
+    if kind == 'pico_temp':
+        from picozero.analog import pico_temp_conversion
+        return from_voltage(pico_temp_conversion, spec.get('vref', 3.3))
+    raise ValueError("unknown calibration type: {}".format(kind))
+
+
+class Calibration:
+    def __init__(self, curve, bits=10):
+        if not 1 <= bits <= 16:
+            raise ValueError("bits must be between 1 and 16")
+        self.curve = curve
+        self.bits = bits
+        self._shift = 16 - bits
+        size = 1 << bits
+        half = (1 << self._shift) >> 1
+        self._table = array('h', bytearray(2 * size))
+        last = 0
+        for i in range(size):
+            # each entry holds the curve at the centre of its bucket
+            try:
+                t = int(round(curve((i << self._shift) + half) * 100))
+            except (ValueError, ZeroDivisionError):
+                t = last
+            t = max(-32768, min(32767, t))
+            self._table[i] = t
+            last = t
+
+    def lookup(self, adc):
+        # Hundredths of a degree as an int (no float allocated)
+        return self._table[adc >> self._shift]
+
+    def temperature(self, adc):
+        return self._table[adc >> self._shift] / 100
+
+    def max_error(self, step=1):
+        # Largest difference between the table and the exact curve over
+        # the whole ADC range (host-side check, slow on a board)
+        worst = 0.0
+        for adc in range(0, ADC_MAX + 1, step):
+            try:
+                exact = self.curve(adc)
+            except (ValueError, ZeroDivisionError):
+                continue
+            worst = max(worst, abs(self.temperature(adc) - exact))
+        return worst
+
+
+def from_config(spec=None):
+    if spec is None:
+        spec = DEFAULT
+    return Calibration(curve_from_spec(spec), spec.get('bits', 10))
@@ -0,0 +1,61 @@
+# Local thermostat for the actuator boards, used while the master is silent.
+#
+# The board passes every master command to command() and calls heard() for
+# any message from the master. If nothing arrives for timeout_ms (or the
+# broker delivers the master's "offline" last will) the controller takes
+# over and regulates around the last setpoint with the board's own sensor.
+# The first message from the master hands control back; the output is left
+# as it was until the master sends its next command.
+
+import utime
+
+HEAT = 'heat'
+COOL = 'cool'
+
+
+class FallbackController:
+    def __init__(self, action, timeout_ms=60000, hysteresis=0.5):
+        self.action = action
+        self.timeout_ms = timeout_ms
+        self.hysteresis = hysteresis
+        self.active = False
+        self.setpoint = None
+        self.demand = False
+        self._last_heard = utime.ticks_ms()
+
+    def heard(self, now=None):
+        # Returns True if this hands control back to the master
+        self._last_heard = utime.ticks_ms() if now is None else now
+        if self.active:
+            self.active = False
+            return True
+        return False
+
+    def command(self, on, setpoint=None):
+        # Cache the master's decision. A command without a setpoint (nobody
+        # at home) means the local loop keeps the actuator off.
+        self.demand = bool(on)
+        self.setpoint = setpoint
+
+    def master_lost(self):
+        self.active = True
+
+    def update(self, temperature, now=None):
+        # Returns the local demand while active, otherwise None
+        if not self.active:
+            if now is None:
+                now = utime.ticks_ms()
+            if utime.ticks_diff(now, self._last_heard) < self.timeout_ms:
+                return None
+            self.active = True
+        if self.setpoint is None or temperature is None:
+            self.demand = False
+            return False
+        error = temperature - self.setpoint
+        if self.action == COOL:
+            error = -error
+        if error < -self.hysteresis:
+            self.demand = True
+        elif error > self.hysteresis:
+            self.demand = False
+        return self.demand
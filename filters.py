@@ -0,0 +1,126 @@
+# Integer-only filters for raw ADC readings (0-65535).
+#
+# Every stage keeps its state in preallocated arrays or small ints, so
+# update() does not allocate on the MicroPython heap. Stages are combined
+# with Pipeline, e.g.:
+#
+#     adc_filter = Pipeline(Median(3), MovingAverage(10), EMA(0.3))
+#     value = adc_filter.update(adc.read_u16())
+
+from array import array
+
+
+class MovingAverage:
+    # Average of the last n samples, kept as a running sum over a ring.
+    # The ring is filled with the first sample so the output does not
+    # start biased towards zero.
+    def __init__(self, n=10):
+        self._n = n
+        self._ring = array('H', [0] * n)
+        self.reset()
+
+    def reset(self):
+        self._index = 0
+        self._sum = 0
+        self._primed = False
+
+    def update(self, x):
+        if not self._primed:
+            for i in range(self._n):
+                self._ring[i] = x
+            self._sum = x * self._n
+            self._primed = True
+            return x
+        i = self._index
+        self._sum += x - self._ring[i]
+        self._ring[i] = x
+        i += 1
+        self._index = 0 if i == self._n else i
+        return self._sum // self._n
+
+
+class EMA:
+    # Exponential moving average y += alpha * (x - y) in fixed point.
+    # alpha is quantised to 1/256 steps and the state carries 4 extra
+    # fractional bits; all intermediate values stay below 2**30 so they
+    # remain small ints on MicroPython.
+    SHIFT = 8
+    FRAC = 4
+
+    def __init__(self, alpha=0.3):
+        self._alpha = max(1, min(1 << self.SHIFT, int(alpha * (1 << self.SHIFT) + 0.5)))
+        self.reset()
+
+    def reset(self):
+        self._y = -1
+
+    def update(self, x):
+        x <<= self.FRAC
+        if self._y < 0:
+            self._y = x
+        else:
+            self._y += ((x - self._y) * self._alpha) >> self.SHIFT
+        return self._y >> self.FRAC
+
+
+class Median:
+    # Median of the last n samples (n odd and small) to reject spikes
+    def __init__(self, n=3):
+        if n < 1 or not n & 1:
+            raise ValueError("n must be odd")
+        self._n = n
+        self._ring = array('H', [0] * n)
+        self._sorted = array('H', [0] * n)
+        self.reset()
+
+    def reset(self):
+        self._index = 0
+        self._primed = False
+
+    def update(self, x):
+        n = self._n
+        ring = self._ring
+        if not self._primed:
+            for i in range(n):
+                ring[i] = x
+            self._primed = True
+            return x
+        ring[self._index] = x
+        self._index = (self._index + 1) % n
+        if n == 3:
+            a = ring[0]
+            b = ring[1]
+            c = ring[2]
+            if a > b:
+                a, b = b, a
+            if b > c:
+                b = c
+            return a if a > b else b
+        s = self._sorted
+        for i in range(n):
+            v = ring[i]
+            j = i
+            while j > 0 and s[j - 1] > v:
+                s[j] = s[j - 1]
+                j -= 1
+            s[j] = v
+        return s[n >> 1]
+
+
+class Pipeline:
+    # Runs a sample through each stage in order. The last output is kept
+    # in value (None until the first sample).
+    def __init__(self, *stages):
+        self._stages = stages
+        self.value = None
+
+    def reset(self):
+        for stage in self._stages:
+            stage.reset()
+        self.value = None
+
+    def update(self, x):
+        for stage in self._stages:
+            x = stage.update(x)
+        self.value = x
+        return x
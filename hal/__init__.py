@@ -0,0 +1,34 @@
+"""
+CPython stand-ins for the MicroPython modules used by the boards
+(machine, network, utime, usocket, ...), so that the board scripts and
+drivers can run unmodified on a Linux host::
+
+    import hal
+    hal.install()
+
+    import master_board
+
+or run a board script as it runs on the board with ``python -m hal.run``
+(see hal/run.py).
+"""
+import os
+import sys
+
+PATH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(PATH)
+
+
+def install():
+    # Put the stand-ins first on the import path, followed by the project
+    # root and lib/ (the same layout as the board's filesystem)
+    for path in (os.path.join(ROOT, 'lib'), ROOT, PATH):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+
+    # `time` is built into CPython, so it cannot be shadowed from the path.
+    # Code imported from here on gets the virtual clock (ticks_ms, sleep,
+    # ...) for `import time`, which falls back to the host module for
+    # anything MicroPython does not have.
+    import utime
+    sys.modules['time'] = utime
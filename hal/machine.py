@@ -0,0 +1,310 @@
+# Host-side stand-in for the MicroPython machine module.
+#
+# Pin levels live in a table shared by all Pin objects with the same id, so
+# a simulated peripheral can watch a chip select line or drive an input.
+# SPI buses forward their traffic to a device attached with SPI.attach().
+# Timers run on the virtual clock in utime, ADC channels read from sources
+# set with ADC.feed() and PWM outputs live in a fake PWM register block that
+# is also reachable through mem32.
+
+import utime
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    ALT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    _levels = {}
+    _watchers = {}
+    _irqs = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if pull != -1:
+            self.pull = pull
+            if self.id not in Pin._levels:
+                Pin._levels[self.id] = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            return Pin._levels.get(self.id, 0)
+        Pin._set_level(self.id, 1 if v else 0)
+
+    __call__ = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self.value(not self.value())
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if handler is None:
+            Pin._irqs.pop(self.id, None)
+        else:
+            Pin._irqs[self.id] = (handler, trigger, self)
+
+    def __repr__(self):
+        return "Pin({})".format(self.id)
+
+    @classmethod
+    def _set_level(cls, id, level):
+        old = cls._levels.get(id, 0)
+        cls._levels[id] = level
+        if old != level:
+            for callback in cls._watchers.get(id, ()):
+                callback(level)
+            irq = cls._irqs.get(id)
+            if irq is not None and irq[1] & (cls.IRQ_RISING if level else cls.IRQ_FALLING):
+                irq[0](irq[2])
+
+    @classmethod
+    def watch(cls, id, callback):
+        # Simulation hook: call callback(level) whenever the pin changes
+        cls._watchers.setdefault(id, []).append(callback)
+
+
+class SPI:
+    MSB = 0
+    LSB = 1
+
+    _devices = {}
+
+    def __init__(self, id=0, baudrate=1000000, polarity=0, phase=0, bits=8,
+                 firstbit=MSB, sck=None, mosi=None, miso=None):
+        self.id = id
+        self.init(baudrate)
+
+    def init(self, baudrate=1000000, *args, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def _device(self):
+        return SPI._devices.get(self.id)
+
+    def write(self, buf):
+        device = self._device()
+        if device is not None:
+            device.spi_write(bytes(buf))
+
+    def read(self, nbytes, write=0x00):
+        device = self._device()
+        if device is None:
+            return bytes(nbytes)
+        return device.spi_read(nbytes)
+
+    def readinto(self, buf, write=0x00):
+        buf[:] = self.read(len(buf), write)
+
+    def write_readinto(self, write_buf, read_buf):
+        self.write(write_buf)
+        self.readinto(read_buf)
+
+    @classmethod
+    def attach(cls, id, device, cs=None):
+        # Simulation hook: route bus id to device. The device implements
+        # spi_write(data), spi_read(n) and, when cs is given, spi_select(active)
+        cls._devices[id] = device
+        if cs is not None:
+            Pin.watch(cs, lambda level: device.spi_select(not level))
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    _sources = {}
+
+    def __init__(self, pin):
+        if isinstance(pin, Pin):
+            pin = pin.id
+        # GP26-GP29 are channels 0-3, channel 4 is the temperature sensor
+        self.channel = pin - 26 if isinstance(pin, int) and pin >= 26 else pin
+
+    def read_u16(self):
+        source = ADC._sources.get(self.channel, 0)
+        value = source() if callable(source) else source
+        return max(0, min(65535, int(value)))
+
+    @classmethod
+    def feed(cls, channel, source):
+        # Simulation hook: channel reads return source (a value or a
+        # callable returning one)
+        cls._sources[channel] = source
+
+
+class _PWMBlock:
+    # The RP2040 PWM peripheral as seen through mem32: 8 slices, each with
+    # DIV, TOP and a CC register holding channel A (low half) and B (high
+    # half). Simulation counters: register writes and reads.
+    BASE = 0x40050000
+    STRIDE = 0x14
+    CSR, DIV, CTR, CC, TOP = 0x00, 0x04, 0x08, 0x0C, 0x10
+    SYS_HZ = 125000000
+
+    def __init__(self):
+        self.regs = [[0, 16, 0, 0, 0xFFFF] for _ in range(8)]
+        self.writes = 0
+        self.reads = 0
+        # called with (slice, cc) after every CC change
+        self.on_cc = []
+
+    def decode(self, addr):
+        offset = addr - self.BASE
+        if 0 <= offset < 8 * self.STRIDE and offset % 4 == 0:
+            return offset // self.STRIDE, (offset % self.STRIDE) // 4
+        return None
+
+    def read(self, slice, reg):
+        self.reads += 1
+        return self.regs[slice][reg]
+
+    def write(self, slice, reg, value):
+        self.writes += 1
+        self.regs[slice][reg] = value & 0xFFFFFFFF
+        if reg == 3:
+            for callback in self.on_cc:
+                callback(slice, self.regs[slice][3])
+
+
+class _Mem32:
+    # machine.mem32 stand-in: the PWM block is modelled, any other address
+    # is plain memory
+    def __init__(self):
+        self._memory = {}
+
+    def __getitem__(self, addr):
+        where = _pwm_block.decode(addr)
+        if where is not None:
+            return _pwm_block.read(*where)
+        return self._memory.get(addr, 0)
+
+    def __setitem__(self, addr, value):
+        where = _pwm_block.decode(addr)
+        if where is not None:
+            _pwm_block.write(where[0], where[1], value)
+        else:
+            self._memory[addr] = value & 0xFFFFFFFF
+
+
+_pwm_block = _PWMBlock()
+mem32 = _Mem32()
+
+
+class PWM:
+    # Backed by the fake PWM block, with the rp2 port's frequency and duty
+    # arithmetic, so that duty_u16() and direct CC register writes agree
+    def __init__(self, dest, *, freq=None, duty_u16=None, invert=False):
+        self.pin = dest
+        pin = dest.id if isinstance(dest, Pin) else dest
+        self._slice = (pin >> 1) & 7
+        self._channel = pin & 1
+        self.invert = invert
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def _reg(self, reg):
+        return _pwm_block.regs[self._slice][reg]
+
+    def freq(self, value=None):
+        if value is None:
+            return _PWMBlock.SYS_HZ * 16 // (self._reg(1) * (self._reg(4) + 1))
+        # the smallest divider that keeps TOP within 16 bits
+        div16 = max(16, -(-_PWMBlock.SYS_HZ * 16 // (value * 65535)))
+        top = min(65534, _PWMBlock.SYS_HZ * 16 // (div16 * value) - 1)
+        _pwm_block.write(self._slice, 1, div16)
+        _pwm_block.write(self._slice, 4, top)
+
+    def duty_u16(self, value=None):
+        top = self._reg(4)
+        cc = self._reg(3)
+        shift = 16 * self._channel
+        if value is None:
+            return ((cc >> shift) & 0xFFFF) * 65535 // (top + 1)
+        value = max(0, min(65535, int(value)))
+        level = (value * (top + 1) + 65535 // 2) // 65535
+        _pwm_block.write(self._slice, 3, (cc & ~(0xFFFF << shift)) | (level << shift))
+
+    def duty_ns(self, value=None):
+        period_ns = 1000000000 // self.freq()
+        if value is None:
+            return self.duty_u16() * period_ns // 65535
+        self.duty_u16(value * 65535 // period_ns)
+
+    def deinit(self):
+        self.duty_u16(0)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    # Simulation counters: Timer objects created and init() calls
+    created = 0
+    inits = 0
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, freq=-1, callback=None, tick_hz=1000):
+        Timer.created += 1
+        self._due_us = None
+        if callback is not None:
+            self.init(mode=mode, period=period, freq=freq, callback=callback, tick_hz=tick_hz)
+
+    def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None, tick_hz=1000):
+        Timer.inits += 1
+        if freq > 0:
+            self._period_us = 1000000 // freq
+        else:
+            self._period_us = max(period, 0) * 1000000 // tick_hz
+        self._mode = mode
+        self._callback = callback
+        self._due_us = utime.now_us() + max(self._period_us, 1)
+        if self not in utime._timers:
+            utime._timers.append(self)
+
+    def deinit(self):
+        if self in utime._timers:
+            utime._timers.remove(self)
+
+    def _fire(self):
+        if self._mode == Timer.PERIODIC:
+            self._due_us += max(self._period_us, 1)
+        else:
+            self.deinit()
+        if self._callback is not None:
+            self._callback(self)
+
+
+def idle():
+    # Wait for the next "interrupt": jump to the next timer deadline
+    due = utime.next_due_us()
+    utime.sleep_us(1000 if due is None else max(due - utime.now_us(), 1))
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
@@ -0,0 +1,14 @@
+# Host-side stand-in for the MicroPython micropython module. There is no
+# interrupt context on the host, so scheduled functions run straight away.
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def const(expr):
+    return expr
+
+
+def alloc_emergency_exception_buf(size):
+    pass
@@ -0,0 +1,87 @@
+"""
+Runs a board script unmodified on the host, on the stand-ins from hal::
+
+    python -m hal.run master_board --broker 127.0.0.1 --speed 1
+    python -m hal.run heating_system_board --seconds 3600 --set fallback_timeout_ms=5000
+
+The script runs as ``__main__`` in a scratch directory holding its
+config.json (the project's, or --config, with --broker/--set applied), so
+it finds its files as on the board's filesystem while the project and
+lib/ stay importable. Time is virtual: --speed 1 paces it to the host
+clock (use it next to a real MQTT broker), otherwise it runs as fast as
+the host allows. --seconds stops the script after that much virtual time.
+"""
+import argparse
+import json
+import os
+import runpy
+import sys
+import tempfile
+
+from . import ROOT, install
+
+
+class Stop(BaseException):
+    # Raised from a timer to end the run; a BaseException so that the
+    # boards' `except Exception` handlers let it through
+    pass
+
+
+def load_config(path=None, broker=None, settings=()):
+    with open(path or os.path.join(ROOT, 'config.json')) as f:
+        config = json.load(f)
+    if broker is not None:
+        config['broker_ip'] = broker
+    for setting in settings:
+        key, _, value = setting.partition('=')
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def run(board, config, seconds=None, speed=None):
+    # Returns the script's globals (or None if it was stopped mid-run)
+    install()
+    import utime
+    from machine import Timer
+
+    utime.set_speed(speed)
+    stopper = None
+    if seconds is not None:
+        def stop(timer):
+            raise Stop
+        stopper = Timer(mode=Timer.ONE_SHOT, period=int(seconds * 1000), callback=stop)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.path.join(scratch, 'config.json'), 'w') as f:
+            json.dump(config, f)
+        os.chdir(scratch)
+        try:
+            return runpy.run_module(board, run_name='__main__')
+        except Stop:
+            return None
+        finally:
+            os.chdir(cwd)
+            if stopper is not None:
+                stopper.deinit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('board', help="module name, e.g. master_board")
+    parser.add_argument('--config', help="config.json to use (default: the project's)")
+    parser.add_argument('--broker', help="override broker_ip")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="override a config key (VALUE is JSON, or a plain string)")
+    parser.add_argument('--seconds', type=float, help="stop after this much virtual time")
+    parser.add_argument('--speed', type=float, help="virtual seconds per host second")
+    args = parser.parse_args(argv)
+    config = load_config(args.config, args.broker, args.set)
+    run(args.board, config, args.seconds, args.speed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Host-side alias of the MicroPython ubinascii module
+from binascii import *
@@ -0,0 +1,109 @@
+# Host-side stand-in for the MicroPython usocket module.
+#
+# MicroPython sockets are also streams: read(n) blocks until n bytes or the
+# end of the stream, write() takes an optional length and a non-blocking
+# read with no data returns None instead of raising; strings are written
+# as UTF-8. umqtt relies on all of that, so socket wraps a host socket with
+# that interface.
+import socket as _socket
+
+AF_INET = _socket.AF_INET
+AF_INET6 = _socket.AF_INET6
+SOCK_STREAM = _socket.SOCK_STREAM
+SOCK_DGRAM = _socket.SOCK_DGRAM
+SOL_SOCKET = _socket.SOL_SOCKET
+SO_REUSEADDR = _socket.SO_REUSEADDR
+IPPROTO_TCP = _socket.IPPROTO_TCP
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    return _socket.getaddrinfo(host, port, af, type or SOCK_STREAM, proto, flags)
+
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0, _sock=None):
+        self._sock = _sock if _sock is not None else _socket.socket(af, type, proto)
+
+    def connect(self, address):
+        self._sock.connect(address)
+
+    def bind(self, address):
+        self._sock.bind(address)
+
+    def listen(self, backlog=5):
+        self._sock.listen(backlog)
+
+    def accept(self):
+        sock, address = self._sock.accept()
+        return socket(_sock=sock), address
+
+    def setsockopt(self, level, optname, value):
+        self._sock.setsockopt(level, optname, value)
+
+    def setblocking(self, flag):
+        self._sock.setblocking(flag)
+
+    def settimeout(self, value):
+        self._sock.settimeout(value)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def send(self, data):
+        return self._sock.send(data)
+
+    def sendall(self, data):
+        self._sock.sendall(data)
+
+    def recv(self, n):
+        return self._sock.recv(n)
+
+    def write(self, buf, length=None):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        if length is not None:
+            buf = memoryview(buf)[:length]
+        try:
+            self._sock.sendall(buf)
+        except BlockingIOError:
+            return None
+        return len(buf)
+
+    def read(self, n=-1):
+        if n < 0:
+            chunks = []
+            while True:
+                chunk = self.read(4096)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        data = bytearray()
+        while len(data) < n:
+            try:
+                chunk = self._sock.recv(n - len(data))
+            except BlockingIOError:
+                # non-blocking: whatever has arrived, or None for nothing
+                return bytes(data) if data else None
+            if not chunk:
+                break
+            data += chunk
+        return bytes(data)
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else nbytes)
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        line = bytearray()
+        while not line.endswith(b'\n'):
+            c = self.read(1)
+            if not c:
+                break
+            line += c
+        return bytes(line)
+
+    def close(self):
+        self._sock.close()
@@ -0,0 +1,2 @@
+# Host-side alias of the MicroPython ustruct module
+from struct import *
@@ -0,0 +1,132 @@
+# Host-side stand-in for the MicroPython utime module.
+#
+# Time is virtual: it only moves when the program sleeps or the simulation
+# calls advance_us(), and by default as fast as the host allows (see
+# set_speed()). ticks_* wrap like on the Pico (30-bit period). Timers
+# from the machine stand-in fire, in deadline order, as the clock passes
+# them. hal.install() also makes this the `time` module, with anything not
+# defined here taken from the host's time module.
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+_epoch = int(_time.time())
+_now_us = 0
+
+# machine.Timer objects that are armed; each has _due_us and _fire()
+_timers = []
+_firing = False
+
+# Simulation hook: when set, sleeping outside timer callbacks calls
+# _sleeper(us) instead of moving the clock, so a scheduler running several
+# programs on one clock can switch to another one (see sim/house.py)
+_sleeper = None
+
+# (host monotonic time, virtual us) when pacing started, or None
+_pace = None
+_speed = 1.0
+
+
+def set_speed(speed=None):
+    # Simulation hook: run virtual time at `speed` times the host clock
+    # (1.0 for real time, e.g. next to a real broker), or None for as fast
+    # as possible
+    global _pace, _speed
+    _pace = None if speed is None else (_time.monotonic(), _now_us)
+    _speed = speed
+
+
+def advance_us(us):
+    global _now_us, _firing
+    end = _now_us + int(us)
+    if _pace is not None:
+        ahead = (end - _pace[1]) / 1000000 / _speed - (_time.monotonic() - _pace[0])
+        if ahead > 0:
+            _time.sleep(ahead)
+    if not _firing:
+        # a callback that sleeps only moves the clock, timers do not nest
+        _firing = True
+        try:
+            while True:
+                timer = _next_timer()
+                if timer is None or timer._due_us > end:
+                    break
+                _now_us = max(_now_us, timer._due_us)
+                timer._fire()
+        finally:
+            _firing = False
+    _now_us = max(_now_us, end)
+
+
+def _next_timer():
+    timer = None
+    for t in _timers:
+        if timer is None or t._due_us < timer._due_us:
+            timer = t
+    return timer
+
+
+def next_due_us():
+    # Simulation hook: virtual time of the next timer callback, or None
+    timer = _next_timer()
+    return None if timer is None else timer._due_us
+
+
+def now_us():
+    # Simulation hook: unwrapped virtual time in microseconds
+    return _now_us
+
+
+def ticks_us():
+    return _now_us & _TICKS_MAX
+
+
+def ticks_ms():
+    return (_now_us // 1000) & _TICKS_MAX
+
+
+ticks_cpu = ticks_us
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def sleep_us(us):
+    if _sleeper is not None and not _firing:
+        _sleeper(int(us))
+    else:
+        advance_us(us)
+
+
+def sleep_ms(ms):
+    sleep_us(ms * 1000)
+
+
+def sleep(seconds):
+    sleep_us(seconds * 1000000)
+
+
+def time():
+    return _epoch + _now_us // 1000000
+
+
+def time_ns():
+    return (_epoch * 1000000 + _now_us) * 1000
+
+
+def localtime(secs=None):
+    return _time.localtime(time() if secs is None else secs)[:8]
+
+
+gmtime = localtime
+
+
+def __getattr__(name):
+    return getattr(_time, name)
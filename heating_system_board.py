@@ -1,9 +1,15 @@
 import network
 import utime
 import json
-from machine import ADC, Pin
 from picozero import LED
 from umqtt.simple import MQTTClient
+from sensors import make_sensor
+from reporter import ChangeReporter
+from telemetry import TelemetryStream
+from fallback import FallbackController, HEAT
+from actuators import make_actuator
+from tracing import Tracer, RECEIVE, CALLBACK, ACTUATE
+from metrics import Registry, counting
 
 # Load configuration from file
 def load_config():
@@ -14,26 +20,84 @@ config = load_config()
 ssid = config['ssid']
 password = config['password']
 broker = config['broker_ip']
+# The master's address when it may host the broker (host_broker 'fallback')
+fallback_broker = config.get('fallback_broker_ip')
 
 client_id = 'heating_system_board'
 topic_control = b'heating_control'
 topic_manual_temp = b'heating_manual_temp'
 topic_mode = b'control_mode'
+topic_master_status = b'master_status'
 
 
-green = LED(15)
+# Boiler relay (see actuators.py). Commands only set its target; the main
+# loop switches it once the lockouts allow. The red LED shows it is off.
+heater = make_actuator(config.get('heating_relay', {
+    'pin': 15, 'min_on_ms': 60000, 'min_off_ms': 60000}))
 red = LED(14)
-potentiometer = ADC(Pin(26))
+
+# Manual setpoint knob and the room sensor used by the local thermostat,
+# both configurable in config.json (see sensors.py)
+setpoint_sensor = make_sensor(config.get('setpoint_sensor', {
+    'type': 'potentiometer', 'pin': 26, 'calibration': config.get('calibration')}))
+room_sensor = make_sensor(config.get('room_sensor', {'type': 'pico_temp'}))
+if 'room_sensor' not in config:
+    # The RP2040 die runs several degrees above the room with Wi-Fi on, so
+    # the fallback thermostat would hold the house below its setpoint
+    print("Warning: no room_sensor configured, the fallback thermostat uses the "
+          "on-chip sensor, which reads above room temperature")
 
 # default mode 
 mode = 'automatic'
 
+# Manual temperature is published when the knob moves by more than the
+# deadband (at most every min_interval_ms), otherwise as a slow heartbeat
+manual_reporter = ChangeReporter(
+    deadband=config.get('manual_temp_deadband', 0.2),
+    min_interval_ms=config.get('manual_temp_min_interval_ms', 150),
+    heartbeat_ms=config.get('manual_temp_heartbeat_ms', 30000))
+
+# Local thermostat on room_sensor while the master is unreachable
+fallback = FallbackController(
+    HEAT,
+    timeout_ms=config.get('fallback_timeout_ms', 60000),
+    hysteresis=config.get('fallback_hysteresis', 0.5))
+reconnect_interval = 5000
+
+# Optional high-rate raw ADC stream (telemetry_rate_hz > 0) for control loop tuning
+topic_telemetry = ('telemetry/' + client_id).encode()
+telemetry_rate_hz = config.get('telemetry_rate_hz', 0)
+telemetry = None
+if telemetry_rate_hz and hasattr(setpoint_sensor, 'adc'):
+    telemetry = TelemetryStream(setpoint_sensor.adc, rate_hz=telemetry_rate_hz,
+                                samples=config.get('telemetry_samples', 128))
+
+# Optional latency tracing of the master's commands (see tracing.py): a
+# ring of trace_size spans, published on trace/<client_id> on request
+topic_trace_dump = b'trace/dump'
+topic_trace = ('trace/' + client_id).encode()
+trace_size = config.get('trace_size', 0)
+tracer = Tracer(trace_size) if trace_size else None
+poll_start = 0
+
+# Runtime metrics (see metrics.py), published every metrics_interval_ms on
+# $metrics/<client_id> (0 turns that off)
+topic_metrics = ('$metrics/' + client_id).encode()
+metrics_interval = config.get('metrics_interval_ms', 60000)
+registry = Registry()
+loop_time = registry.histogram('loop_us')
+publishes = registry.counter('publishes')
+messages = registry.counter('messages')
+connects = registry.counter('connects')
+connect_failures = registry.counter('connect_failures')
+
+# Per-message prints, which cost real time over USB serial
+debug = config.get('debug', False)
+
 def read_potentiometer():
-    adc_value = potentiometer.read_u16()
-    min_adc = 0
-    max_adc = 65535
-    temperature = 15 + (adc_value / max_adc) * 25  # Map ADC value to temperature range (15-40)
-    print(temperature)
+    temperature = setpoint_sensor.read()
+    if temperature is None:
+        return None
     return round(temperature, 2)  # Return the temperature rounded to 2 decimal places
 
 
@@ -47,60 +111,152 @@ def connect_to_wifi():
     print('Connected to Wi-Fi:', wlan.ifconfig())
     return wlan.isconnected()
 
+def set_heating(on):
+    heater.request(on)
+
+def show_heating():
+    red.value = not heater.state
+    print('Heating', 'on' if heater.state else 'off')
+
 def message_callback(topic, msg):
     global mode
+    received = utime.ticks_us()
+    messages.inc()
+    if topic == topic_trace_dump:
+        client.publish(topic_trace, tracer.dump())
+        return
     data = json.loads(msg)
+    if topic == topic_master_status:
+        if data.get('status') == 'offline':
+            fallback.master_lost()
+            print('Master offline, using local thermostat')
+        elif fallback.heard():
+            print('Master is back, handing control back')
+        return
+    if fallback.heard():
+        print('Master is back, handing control back')
     if 'command' in data:
         command = data['command']
+        trace_id = data.get('trace') if tracer is not None else None
+        if trace_id is not None:
+            tracer.record(trace_id, RECEIVE, poll_start, received)
         if command == 'start_heating':
-            print('Received start heating command')
-            red.off()
-            green.on()
+            if debug:
+                print('Received start heating command')
+            fallback.command(True, data.get('target'))
+            set_heating(True)
         elif command == 'stop_heating':
-            print('Received stop heating command')
-            red.on()
-            green.off()
+            if debug:
+                print('Received stop heating command')
+            fallback.command(False, data.get('target'))
+            set_heating(False)
+        if trace_id is not None:
+            tracer.record(trace_id, CALLBACK, received)
+            tracer.begin(trace_id, ACTUATE, received)
+            if not heater.pending:
+                # already in that state, nothing to switch
+                tracer.end(ACTUATE)
     elif 'mode' in data:
         mode = data['mode']
+        # report the knob position right away after a mode change
+        manual_reporter.reset()
         print(f"Mode set to: {mode}")
 
-def publish_manual_temperature(client):
-    temperature = read_potentiometer()
+def publish_manual_temperature(client, temperature=None):
+    if temperature is None:
+        temperature = read_potentiometer()
     client.publish(topic_manual_temp, json.dumps({'manual_temperature': temperature}))
-    print(f"Sent manual temperature: {temperature:.2f} C")
+    if debug:
+        print(f"Sent manual temperature: {temperature:.2f} C")
+
+def connect_to_broker():
+    connects.inc()
+    try:
+        if client.sock is not None:
+            client.sock.close()
+        client.connect()
+        client.subscribe(topic_control)
+        client.subscribe(topic_mode)
+        client.subscribe(topic_master_status)
+        if tracer is not None:
+            client.subscribe(topic_trace_dump)
+        print('Connected to MQTT broker and subscribed to topic')
+        return True
+    except Exception as e:
+        print(f'Failed to connect to MQTT broker: {e}')
+        connect_failures.inc()
+        # try the other broker next time
+        if fallback_broker is not None:
+            client.server = fallback_broker if client.server == broker else broker
+        return False
 
 def main():
+    set_heating(False)
     red.on()
-    green.off()
     
-    global client
+    global client, poll_start
     client = MQTTClient(client_id, broker)
+    client.publish = counting(client.publish, publishes)
     client.set_callback(message_callback)
     
     if not connect_to_wifi():
         return
     
-    try:
-        client.connect()
-        client.subscribe(topic_control)
-        client.subscribe(topic_mode)
-        print('Connected to MQTT broker and subscribed to topic')
-    except Exception as e:
-        print(f'Failed to connect to MQTT broker: {e}')
-        return
+    # Keep running without a broker: the fallback thermostat takes over
+    connected = connect_to_broker()
+    last_connect_time = utime.ticks_ms()
 
-    manual_temp_interval = 5000  # 5 seconds
-    last_manual_temp_time = utime.ticks_ms()
-    
+    setpoint_sensor.start()
+    room_sensor.start()
+    if telemetry is not None:
+        telemetry.start()
+
+    last_metrics_time = utime.ticks_ms()
     while True:
-        client.check_msg()
-        
+        loop_start = utime.ticks_us()
         current_time = utime.ticks_ms()
-        if mode == 'manual' and utime.ticks_diff(current_time, last_manual_temp_time) >= manual_temp_interval:
-            publish_manual_temperature(client)
-            last_manual_temp_time = current_time
-        
-        utime.sleep_ms(100)
+        setpoint_sensor.update(current_time)
+        room_sensor.update(current_time)
+        if connected:
+            try:
+                poll_start = utime.ticks_us()
+                client.check_msg()
+
+                # Full telemetry frames are published straight from their buffer
+                if telemetry is not None and telemetry.ready() is not None:
+                    client.publish(topic_telemetry, telemetry.ready())
+                    telemetry.release()
+
+                if metrics_interval and utime.ticks_diff(current_time, last_metrics_time) >= metrics_interval:
+                    client.publish(topic_metrics, registry.snapshot())
+                    last_metrics_time = current_time
+                if mode == 'manual':
+                    temperature = read_potentiometer()
+                    if temperature is not None and manual_reporter.due(temperature, current_time):
+                        publish_manual_temperature(client, temperature)
+                        manual_reporter.sent(temperature, current_time)
+            except OSError as e:
+                print(f'Lost connection to MQTT broker: {e}')
+                connected = False
+        elif utime.ticks_diff(current_time, last_connect_time) >= reconnect_interval:
+            connected = connect_to_broker()
+            last_connect_time = current_time
+
+        was_active = fallback.active
+        demand = fallback.update(room_sensor.value, current_time)
+        if demand is not None:
+            if not was_active:
+                print('No word from the master, using local thermostat')
+            if demand != heater.target:
+                set_heating(demand)
+
+        if heater.update(current_time):
+            show_heating()
+            if tracer is not None:
+                tracer.end(ACTUATE)
+
+        loop_time.observe(utime.ticks_diff(utime.ticks_us(), loop_start))
+        utime.sleep_ms(50)
 
 if __name__ == "__main__":
     main()
@@ -3,40 +3,56 @@ __package__ = "picozero"
 __version__ = '0.4.2'
 __author__ = "Raspberry Pi Foundation"
 
-from .picozero import (
-    PWMChannelAlreadyInUse,
-    EventFailedScheduleQueueFull,
-
-    pinout,
-
-    DigitalOutputDevice,
-    DigitalLED,
-    Buzzer,
-    PWMOutputDevice,
-    PWMLED,
-    LED,
-    pico_led,
+# Names are loaded on first use from the submodule that defines them, so
+# `from picozero import LED` does not compile or keep Motor, Speaker,
+# DistanceSensor, ... in RAM. picozero.picozero imports everything at once.
+_submodules = {
+    'PWMChannelAlreadyInUse': 'base',
+    'EventFailedScheduleQueueFull': 'base',
+
+    'pinout': 'pins',
+
+    'PWMManager': 'pwm',
+    'PWMGroup': 'pwm',
+    'pwm_manager': 'pwm',
+
+    'DigitalOutputDevice': 'outputs',
+    'DigitalLED': 'outputs',
+    'Buzzer': 'outputs',
+    'PWMOutputDevice': 'outputs',
+    'PWMLED': 'outputs',
+    'LED': 'outputs',
+    'pico_led': 'outputs',
     
-    PWMBuzzer,
-    Speaker,
+    'PWMBuzzer': 'outputs',
+    'Speaker': 'speaker',
 
-    RGBLED,
-    Motor,
-    Robot,
-    Servo,
+    'RGBLED': 'rgbled',
+    'Motor': 'motors',
+    'Robot': 'motors',
+    'Rover': 'motors',
+    'Servo': 'motors',
     
-    DigitalInputDevice,
-    Switch,
-    Button,
+    'DigitalInputDevice': 'inputs',
+    'Switch': 'inputs',
+    'Button': 'inputs',
+
+    'AnalogInputDevice': 'analog',
+    'Potentiometer': 'analog',
+    'Pot': 'analog',
 
-    AnalogInputDevice,
-    Potentiometer,
-    Pot,
+    'TemperatureSensor': 'analog',
+    'pico_temp_sensor': 'analog',
+    'TempSensor': 'analog',
+    'Thermistor': 'analog',
 
-    TemperatureSensor,
-    pico_temp_sensor,
-    TempSensor,
-    Thermistor,
+    'DistanceSensor': 'distance',
+}
 
-    DistanceSensor,
-)
+def __getattr__(name):
+    submodule = _submodules.get(name)
+    if submodule is None:
+        raise AttributeError(name)
+    value = getattr(__import__('picozero.' + submodule, None, None, [name]), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,166 @@
+from machine import ADC
+from .base import PinMixin, InputDevice
+
+###############################################################################
+# ANALOG INPUT DEVICES
+###############################################################################
+
+class AnalogInputDevice(InputDevice, PinMixin):
+    """
+    Represents a generic input device with analogue functionality, e.g. 
+    a potentiometer.
+
+    :param int pin:
+        The pin that the device is connected to.
+        
+    :param active_state:
+        The active state of the device. If :data:`True` (the default),
+        the :class:`AnalogInputDevice` will assume that the device is
+        active when the pin is high and above the threshold. If 
+        ``active_state`` is ``False``, the device will be active when 
+        the pin is low and below the threshold. 
+
+    :param float threshold:
+        The threshold that the device must be above or below to be
+        considered active. The default is 0.5.
+
+    """
+    def __init__(self, pin, active_state=True, threshold=0.5):
+        self._pin_num = pin
+        super().__init__(active_state)
+        self._adc = ADC(pin)
+        self._threshold = float(threshold)
+        
+    def _state_to_value(self, state):
+        return (state if self.active_state else 65535 - state) / 65535
+
+    def _value_to_state(self, value):
+        return int(65535 * (value if self.active_state else 1 - value))
+    
+    def _read(self):
+        return self._state_to_value(self._adc.read_u16())
+        
+    @property
+    def threshold(self):
+        """
+        The threshold that the device must be above or below to be
+        considered active. The default is 0.5.
+        """
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = float(value)
+
+    @property
+    def is_active(self):
+        """
+        Returns :data:`True` if the device is active.
+        """
+        return self.value > self.threshold
+
+    @property
+    def voltage(self):
+        """
+        Returns the voltage of the analogue device.
+        """
+        return self.value * 3.3
+
+    def close(self):
+        self._adc = None
+
+class Potentiometer(AnalogInputDevice):
+    """
+    Represents a potentiometer, which outputs a variable voltage
+    between 0 and 3.3V.
+
+    Alias for :class:`Pot`.
+
+    :param int pin:
+        The pin that the device is connected to.
+        
+    :param active_state:
+        The active state of the device. If :data:`True` (the default),
+        the :class:`AnalogInputDevice` will assume that the device is
+        active when the pin is high and above the threshold. If 
+        ``active_state`` is ``False``, the device will be active when 
+        the pin is low and below the threshold. 
+
+    :param float threshold:
+        The threshold that the device must be above or below to be
+        considered active. The default is 0.5.
+
+    """
+    pass
+
+Pot = Potentiometer
+
+def pico_temp_conversion(voltage):
+    # Formula for calculating temp from voltage for the onboard temperature sensor
+    return 27 - (voltage - 0.706)/0.001721
+
+class TemperatureSensor(AnalogInputDevice):
+    """
+    Represents a TemperatureSensor, which outputs a variable voltage. The voltage 
+    can be converted to a temperature using a `conversion` function passed as a 
+    parameter.
+
+    Alias for :class:`Thermistor` and :class:`TempSensor`.
+
+    :param int pin:
+        The pin that the device is connected to.
+        
+    :param active_state:
+        The active state of the device. If :data:`True` (the default),
+        the :class:`AnalogInputDevice` will assume that the device is
+        active when the pin is high and above the threshold. If 
+        ``active_state`` is ``False``, the device will be active when 
+        the pin is low and below the threshold. 
+
+    :param float threshold:
+        The threshold that the device must be above or below to be
+        considered active. The default is 0.5.
+
+    :param float conversion:
+        A function that takes a voltage and returns a temperature. 
+
+        e.g. The internal temperature sensor has a voltage range of 0.706V to 0.716V 
+        and would use the follow conversion function::
+        
+            def temp_conversion(voltage):
+                return 27 - (voltage - 0.706)/0.001721
+
+            temp_sensor = TemperatureSensor(pin, conversion=temp_conversion)
+
+        If :data:`None` (the default), the ``temp`` property will return :data:`None`.
+
+    """
+    def __init__(self, pin, active_state=True, threshold=0.5, conversion=None):
+         self._conversion = conversion
+         super().__init__(pin, active_state, threshold)
+        
+    @property
+    def temp(self):
+        """
+        Returns the temperature of the device. If the conversion function is not
+        set, this will return :data:`None`.
+        """
+        if self._conversion is not None:
+            return self._conversion(self.voltage)
+        else:
+            return None
+
+    @property
+    def conversion(self):
+        """
+        Sets or returns the conversion function for the device.
+        """
+        return self._conversion
+
+    @conversion.setter
+    def conversion(self, value):
+        self._conversion = value
+       
+pico_temp_sensor = TemperatureSensor(4, True, 0.5, pico_temp_conversion)
+TempSensor = TemperatureSensor
+Thermistor = TemperatureSensor
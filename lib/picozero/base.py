@@ -0,0 +1,582 @@
+from machine import Timer, idle
+from array import array
+from time import ticks_ms, ticks_add, ticks_diff
+
+###############################################################################
+# EXCEPTIONS
+###############################################################################
+
+class PWMChannelAlreadyInUse(Exception):
+    pass
+
+class EventFailedScheduleQueueFull(Exception):
+    pass
+
+###############################################################################
+# SUPPORTING CLASSES
+###############################################################################
+
+def clamp(n, low, high): return max(low, min(n, high))
+
+class PinMixin:
+    """
+    Mixin used by devices that have a single pin number.
+    """
+
+    @property
+    def pin(self):
+        """
+        Returns the pin number used by the device.
+        """
+        return self._pin_num
+
+    def __str__(self):
+        return "{} (pin {})".format(self.__class__.__name__, self._pin_num)
+
+class PinsMixin:
+    """
+    Mixin used by devices that use multiple pins.
+    """
+
+    @property
+    def pins(self):
+        """
+        Returns a tuple of pins used by the device.
+        """
+        return self._pin_nums
+
+    def __str__(self):
+        return "{} (pins - {})".format(self.__class__.__name__, self._pin_nums)
+        
+class TickScheduler:
+    """
+    Internal class that runs the steps of all active :class:`ValueChange`
+    sequences from a single hardware timer. Pending steps are kept in a
+    min-heap ordered by their next deadline, and the timer is armed as a
+    one-shot for the deadline at the front of the heap, so it only wakes
+    up when a step is due and not at all while nothing is scheduled.
+
+    Scheduled objects provide a ``_deadline`` (in ``ticks_ms``), a
+    ``_heap_index`` (-1 when not scheduled) and a ``_fire(now)`` method
+    which returns :data:`True` if it has set a new deadline.
+
+    :param int period_ms:
+        The shortest time in milliseconds the timer is armed for, which
+        is also the timing resolution of every sequence. Defaults to 2.
+    """
+    def __init__(self, period_ms=2):
+        self.period_ms = period_ms
+        self._heap = []
+        self._deferred = []
+        self._timer = None
+        self._running = False
+        self._armed = 0
+        self._locked = 0
+        self._tick_cb = self._tick
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, item):
+        """
+        Schedules `item` at its ``_deadline``.
+        """
+        if self._locked:
+            # called from an interrupt while the main program is changing
+            # the heap; the next tick schedules it
+            self._deferred.append(item)
+            return
+        self._locked += 1
+        if item._heap_index < 0:
+            item._heap_index = len(self._heap)
+            self._heap.append(item)
+            self._sift_up(item._heap_index)
+        if not self._running or ticks_diff(self._heap[0]._deadline, self._armed) < 0:
+            self._arm()
+        self._locked -= 1
+        self._drain()
+
+    def remove(self, item):
+        """
+        Removes `item` from the schedule, if it is scheduled.
+        """
+        self._locked += 1
+        i = item._heap_index
+        if i >= 0:
+            heap = self._heap
+            last = heap.pop()
+            if i < len(heap):
+                heap[i] = last
+                last._heap_index = i
+                self._sift_down(i)
+                self._sift_up(last._heap_index)
+            item._heap_index = -1
+        if not self._heap and not self._deferred:
+            self._stop()
+        self._locked -= 1
+        self._drain()
+
+    def _drain(self):
+        # an interrupt may have deferred an add() while the heap was being
+        # changed; the timer may be stopped or armed for much later, so
+        # schedule it now
+        while self._deferred and not self._locked:
+            self.add(self._deferred.pop())
+
+    def _arm(self, ms=None):
+        # (Re)arms the one-shot timer for the front of the heap
+        if ms is None:
+            ms = ticks_diff(self._heap[0]._deadline, ticks_ms())
+        ms = max(ms, self.period_ms)
+        if self._timer is None:
+            self._timer = Timer()
+        self._timer.init(period=ms, mode=Timer.ONE_SHOT, callback=self._tick_cb)
+        self._armed = ticks_add(ticks_ms(), ms)
+        self._running = True
+
+    def _stop(self):
+        if self._running:
+            self._timer.deinit()
+            self._running = False
+
+    def _tick(self, timer_obj=None):
+        self._running = False
+        # The timer callback can interrupt add() or remove() running in
+        # the main program; try again shortly rather than touch the heap
+        if self._locked:
+            self._arm(self.period_ms)
+            return
+        while self._deferred:
+            self.add(self._deferred.pop())
+        heap = self._heap
+        now = ticks_ms()
+        while heap and ticks_diff(heap[0]._deadline, now) <= 0:
+            item = heap[0]
+            if item._fire(now):
+                if item._heap_index >= 0:
+                    self._sift_down(item._heap_index)
+            else:
+                self.remove(item)
+        if heap:
+            self._arm()
+        else:
+            self._stop()
+
+    def _sift_up(self, i):
+        heap = self._heap
+        item = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            other = heap[parent]
+            if ticks_diff(item._deadline, other._deadline) >= 0:
+                break
+            heap[i] = other
+            other._heap_index = i
+            i = parent
+        heap[i] = item
+        item._heap_index = i
+
+    def _sift_down(self, i):
+        heap = self._heap
+        n = len(heap)
+        item = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and ticks_diff(heap[child + 1]._deadline, heap[child]._deadline) < 0:
+                child += 1
+            other = heap[child]
+            if ticks_diff(other._deadline, item._deadline) >= 0:
+                break
+            heap[i] = other
+            other._heap_index = i
+            i = child
+        heap[i] = item
+        item._heap_index = i
+
+_scheduler = None
+
+def tick_scheduler():
+    """
+    Returns the :class:`TickScheduler` shared by all output devices,
+    creating it on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TickScheduler()
+    return _scheduler
+
+class ValueChange:
+    """
+    Internal class to control the value of an output device. Each step is
+    run by the shared :class:`TickScheduler`, so no timer is allocated per
+    sequence or per step.
+
+    :param OutputDevice output_device:
+        The OutputDevice object you wish to change the value of.
+
+    :param generator:
+        A generator function that yields a 2d list of
+        ((value, seconds), *).
+        
+        The output_device's value will be set for the number of
+        seconds.
+
+    :param int n:
+        The number of times to repeat the sequence. If None, the
+        sequence will repeat forever. 
+    
+    :param bool wait:
+        If True the ValueChange object will block (wait) until
+        the sequence has completed. The processor idles between
+        steps instead of spinning.
+    """
+    def __init__(self, output_device, generator, n, wait):
+        self._output_device = output_device
+        self._generator = generator
+        self._n = n
+
+        self._gen = self._generator()
+        
+        self._start(wait)
+
+    def _start(self, wait):
+        self._scheduler = tick_scheduler()
+        self._heap_index = -1
+        self._running = True
+        self._wait = wait
+        
+        now = ticks_ms()
+        self._deadline = now
+        if self._fire(now):
+            self._scheduler.add(self)
+            if wait:
+                while self._running:
+                    idle()
+
+    def _fire(self, now):
+        ms = self._step()
+        if ms is None:
+            # the sequence has finished, turn the device off
+            self._running = False
+            self._output_device.off()
+            return False
+
+        # steps follow on from the previous deadline so a late tick does
+        # not push the rest of the sequence back; after a long stall the
+        # sequence restarts from now
+        self._deadline = ticks_add(self._deadline, ms)
+        if ticks_diff(self._deadline, now) < 0:
+            self._deadline = ticks_add(now, ms)
+        return True
+
+    def _step(self):
+        # Writes the next value and returns how long to hold it in
+        # milliseconds, or None at the end of the sequence
+        next_seq = self._get_value()
+        if next_seq is None:
+            return None
+        value, seconds = next_seq
+        self._output_device._write(value)
+        return int(seconds * 1000)
+
+    def _get_value(self):
+        try:
+            return next(self._gen)
+            
+        except StopIteration:
+            
+            self._n = self._n - 1 if self._n is not None else None
+            if self._n == 0:
+                # it's the end, return None
+                return None
+            else:
+                # recreate the generator and start again
+                self._gen = self._generator()
+                return next(self._gen)
+        
+    def stop(self):
+        """
+        Stops the ValueChange object running.
+        """
+        self._running = False
+        self._scheduler.remove(self)
+
+class FadeChange(ValueChange):
+    """
+    Internal class that plays precomputed duty cycle tables straight into
+    one or more PWM outputs, moving through them by index so no values
+    are computed or allocated per frame. Each frame is written to all the
+    outputs at once with :meth:`PWMGroup.set`.
+
+    :param OutputDevice output_device:
+        The OutputDevice that owns the PWM outputs; it is turned off when
+        the sequence ends.
+
+    :param PWMGroup group:
+        The PWM outputs to write to.
+
+    :param tuple segments:
+        A tuple of ``(tables, ms)`` pairs. ``tables`` holds one
+        ``array('H')`` of duty cycles per PWM output, all of the same
+        length, and each entry is held for ``ms`` milliseconds.
+
+    :param int n:
+        The number of times to repeat the sequence. If None, the
+        sequence will repeat forever.
+
+    :param bool wait:
+        If True the FadeChange object will block (wait) until
+        the sequence has completed.
+    """
+    def __init__(self, output_device, group, segments, n, wait):
+        self._output_device = output_device
+        self._group = group
+        self._duties = array('H', bytearray(2 * len(group)))
+        self._segments = segments
+        self._n = n
+        self._segment = 0
+        self._index = 0
+
+        self._start(wait)
+
+    def _step(self):
+        segments = self._segments
+        segment = self._segment
+        i = self._index
+        while True:
+            if segment == len(segments):
+                if self._n is not None:
+                    self._n -= 1
+                    if self._n == 0:
+                        return None
+                segment = 0
+            tables, ms = segments[segment]
+            if i < len(tables[0]):
+                break
+            segment += 1
+            i = 0
+
+        duties = self._duties
+        for c in range(len(duties)):
+            duties[c] = tables[c][i]
+        self._group.set(duties)
+
+        self._segment = segment
+        self._index = i + 1
+        return ms
+
+GAMMA = 2.2
+FADE_CACHE_SIZE = 16
+_fade_cache = {}
+
+def fade_table(start, end, duration, fps, curve='linear', active_high=True):
+    """
+    Returns an ``array('H')`` of duty cycles fading from `start` to `end`
+    (0 - 65535) over `duration` seconds at `fps` frames per second. The
+    last entry stops one frame short of `end`. Tables are cached, so
+    devices and repeated calls with the same fade share one table.
+
+    :param str curve:
+        ``'linear'`` (the default) or ``'gamma'``, which applies a gamma
+        of 2.2 so that fades look even to the eye.
+
+    :param bool active_high:
+        The polarity of the output, which tells the gamma curve which end
+        of the duty range is off. Defaults to :data:`True`.
+    """
+    key = (start, end, duration, fps, curve, active_high)
+    table = _fade_cache.get(key)
+    if table is None:
+        if curve not in ('linear', 'gamma'):
+            raise ValueError("curve must be 'linear' or 'gamma'")
+        steps = max(int(fps * duration), 1)
+        table = array('H', bytearray(2 * steps))
+        if curve == 'gamma':
+            # interpolate the perceived brightness of both ends and turn
+            # each step back into a duty cycle for the output's polarity
+            off = 0 if active_high else 65535
+            on = 65535 - off
+            level = ((start - off) / (on - off)) ** (1 / GAMMA)
+            target = ((end - off) / (on - off)) ** (1 / GAMMA)
+        for i in range(steps):
+            t = i / (fps * duration) if duration > 0 else 0
+            if curve == 'gamma':
+                table[i] = int(off + (on - off) * (level + (target - level) * t) ** GAMMA)
+            else:
+                table[i] = int(start + (end - start) * t)
+        if len(_fade_cache) >= FADE_CACHE_SIZE:
+            _fade_cache.clear()
+        _fade_cache[key] = table
+    return table
+
+def hold_table(duty):
+    """
+    Returns a one entry ``array('H')`` holding `duty`, from the same cache
+    as :func:`fade_table`.
+    """
+    return fade_table(duty, duty, 1, 1)
+
+###############################################################################
+# OUTPUT DEVICES
+###############################################################################
+
+class OutputDevice:
+    """
+    Base class for output devices. 
+    """   
+    def __init__(self, active_high=True, initial_value=False):
+        self.active_high = active_high
+        if initial_value is not None:
+            self._write(initial_value)
+        self._value_changer = None
+    
+    @property
+    def active_high(self):
+        """
+        Sets or returns the active_high property. If :data:`True`, the 
+        :meth:`on` method will set the Pin to HIGH. If :data:`False`, 
+        the :meth:`on` method will set the Pin to LOW (the :meth:`off` method 
+        always does the opposite).
+        """
+        return self._active_state
+
+    @active_high.setter
+    def active_high(self, value):
+        self._active_state = True if value else False
+        self._inactive_state = False if value else True
+        
+    @property
+    def value(self):
+        """
+        Sets or returns a value representing the state of the device: 1 is on, 0 is off.
+        """
+        return self._read()
+
+    @value.setter
+    def value(self, value):
+        self._stop_change()
+        self._write(value)
+        
+    def on(self, value=1, t=None, wait=False):
+        """
+        Turns the device on.
+
+        :param float value:
+            The value to set when turning on. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the device should be on. If None is 
+            specified, the device will stay on. The default is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the device will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        if t is None:
+            self.value = value
+        else:
+            self._start_change(lambda : iter([(value, t), ]), 1, wait)
+
+    def off(self):
+        """
+        Turns the device off.
+        """
+        self.value = 0
+            
+    @property
+    def is_active(self):
+        """
+        Returns :data:`True` if the device is on.
+        """
+        return bool(self.value)
+
+    def toggle(self):
+        """
+        If the device is off, turn it on. If it is on, turn it off.
+        """
+        if self.is_active:
+            self.off()
+        else:
+            self.on()
+            
+    def blink(self, on_time=1, off_time=None, n=None, wait=False):
+        """
+        Makes the device turn on and off repeatedly.
+        
+        :param float on_time:
+            The length of time in seconds that the device will be on. Defaults to 1.
+
+        :param float off_time:
+            The length of time in seconds that the device will be off. If `None`, 
+            it will be the same as ``on_time``. Defaults to `None`.
+
+        :param int n:
+            The number of times to repeat the blink operation. If None is 
+            specified, the device will continue blinking forever. The default
+            is None.
+
+        :param bool wait:
+           If True, the method will block until the device stops turning on and off. 
+           If False, the method will return and the device will turn on and off in
+           the background. Defaults to False.        
+        """
+        off_time = on_time if off_time is None else off_time
+        
+        self.off()
+
+        # is there anything to change?
+        if on_time > 0 or off_time > 0:
+            self._start_change(lambda : iter([(1,on_time), (0,off_time)]), n, wait)
+            
+    def _start_change(self, generator, n, wait):
+        self._value_changer = ValueChange(self, generator, n, wait)
+    
+    def _stop_change(self):
+        if self._value_changer is not None:
+            self._value_changer.stop()
+            self._value_changer = None
+
+    def close(self):
+        """
+        Turns the device off.
+        """
+        self.value = 0
+
+###############################################################################
+# INPUT DEVICES
+###############################################################################
+
+class InputDevice:
+    """
+    Base class for input devices.
+    """
+    def __init__(self, active_state=None):
+        self._active_state = active_state
+
+    @property
+    def active_state(self):
+        """
+        Sets or returns the active state of the device. If :data:`None` (the default),
+        the device will return the value that the pin is set to. If
+        :data:`True`, the device will return :data:`True` if the pin is
+        HIGH. If :data:`False`, the device will return :data:`False` if the
+        pin is LOW.
+        """
+        return self._active_state
+
+    @active_state.setter
+    def active_state(self, value):
+        self._active_state = True if value else False
+        self._inactive_state = False if value else True
+        
+    @property
+    def value(self):
+        """
+        Returns the current value of the device. This is either :data:`True` 
+        or :data:`False` depending on the value of :attr:`active_state`.
+        """
+        return self._read()
@@ -0,0 +1,174 @@
+from machine import Pin, idle
+from array import array
+from time import ticks_ms, ticks_us, ticks_add, ticks_diff, sleep_us
+from .base import PinsMixin, tick_scheduler
+
+###############################################################################
+# DISTANCE SENSOR
+###############################################################################
+
+class DistanceSensor(PinsMixin):
+    """
+    Represents a HC-SR04 ultrasonic distance sensor.
+
+    The sensor is pinged in the background from the shared
+    :class:`TickScheduler` and the echo is timed by pin interrupts, so
+    reading :attr:`distance` or :attr:`value` returns the median of the
+    last few measurements straight away instead of waiting for an echo.
+
+    :param int echo:
+        The pin that the ECHO pin is connected to.
+
+    :param int trigger:
+        The pin that the TRIG pin is connected to. 
+
+    :param float max_distance:
+        The :attr:`value` attribute reports a normalized value between 0 (too
+        close to measure) and 1 (maximum distance). This parameter specifies
+        the maximum distance expected in meters. This defaults to 1.
+
+    :param float interval:
+        The time in seconds between pings. An echo that has not ended by
+        the next ping counts as out of range. Defaults to 0.06, the
+        shortest cycle recommended for the HC-SR04.
+
+    :param int samples:
+        The number of measurements the median is taken over (odd).
+        Defaults to 5.
+    """
+    NO_ECHO = 0xFFFF
+
+    def __init__(self, echo, trigger, max_distance=1, interval=0.06, samples=5):
+        if samples < 1 or not samples & 1:
+            raise ValueError("samples must be odd")
+        self._pin_nums = (echo, trigger)
+        self._max_distance = max_distance
+        self._echo = Pin(echo, mode=Pin.IN, pull=Pin.PULL_DOWN)
+        self._trigger = Pin(trigger, mode=Pin.OUT, value=0)
+
+        self._interval_ms = max(int(interval * 1000), 1)
+        self._samples = samples
+        self._ring = array('H', [self.NO_ECHO] * samples)
+        self._sorted = array('H', [self.NO_ECHO] * samples)
+        self._index = 0
+        self._count = 0
+        self._median_us = self.NO_ECHO
+
+        # echo timing, written by the interrupt handler
+        self._echo_on = -1
+        self._echo_us = -1
+        self._pinged = False
+
+        self._scheduler = tick_scheduler()
+        self._heap_index = -1
+        self._deadline = 0
+        self._echo_cb = self._echo_change
+        self._echo.irq(self._echo_cb, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        self.start()
+
+    def _echo_change(self, p):
+        # hard interrupt: only timestamps, no allocation
+        now = ticks_us()
+        if p.value():
+            self._echo_on = now
+        elif self._echo_on >= 0:
+            self._echo_us = ticks_diff(now, self._echo_on)
+            self._echo_on = -1
+
+    def _fire(self, now):
+        # called by the TickScheduler every interval: collect the last
+        # echo, then send the next ping
+        if self._pinged:
+            echo_us = self._echo_us
+            self._store(echo_us if 0 <= echo_us < self.NO_ECHO else self.NO_ECHO)
+
+        self._echo_on = -1
+        self._echo_us = -1
+        self._trigger.off()
+        sleep_us(2)
+        self._trigger.on()
+        sleep_us(10)
+        self._trigger.off()
+        self._pinged = True
+
+        self._deadline = ticks_add(self._deadline, self._interval_ms)
+        if ticks_diff(self._deadline, now) <= 0:
+            self._deadline = ticks_add(now, self._interval_ms)
+        return True
+
+    def _store(self, echo_us):
+        n = self._samples
+        ring = self._ring
+        ring[self._index] = echo_us
+        self._index = (self._index + 1) % n
+        if self._count < n:
+            self._count += 1
+
+        # median of the measurements so far, by insertion sort
+        count = self._count
+        s = self._sorted
+        for i in range(count):
+            v = ring[i]
+            j = i
+            while j > 0 and s[j - 1] > v:
+                s[j] = s[j - 1]
+                j -= 1
+            s[j] = v
+        self._median_us = s[count >> 1]
+
+    def start(self):
+        """
+        Starts pinging in the background. Called when the sensor is created.
+        """
+        if self._heap_index < 0:
+            self._pinged = False
+            self._deadline = ticks_ms()
+            self._scheduler.add(self)
+
+    def stop(self):
+        """
+        Stops pinging. The last measurement stays available.
+        """
+        self._scheduler.remove(self)
+        self._pinged = False
+
+    def close(self):
+        """
+        Stops the sensor and releases its pins.
+        """
+        self.stop()
+        self._echo.irq(handler=None)
+
+    @property
+    def value(self):
+        """
+        Returns a value between 0, indicating the reflector is either touching 
+        the sensor or is sufficiently near that the sensor can’t tell the 
+        difference, and 1, indicating the reflector is at or beyond the 
+        specified max_distance. A return value of None indicates that the
+        echo was not received before the timeout.
+        """
+        distance = self.distance
+        return distance / self._max_distance if distance is not None else None
+    
+    @property
+    def distance(self):
+        """
+        Returns the current distance measured by the sensor in meters. Note 
+        that this property will have a value between 0 and max_distance.
+        Only the first read after the sensor is created waits, for the
+        first measurement.
+        """
+        while self._count == 0 and self._heap_index >= 0:
+            idle()
+        if self._median_us == self.NO_ECHO:
+            return None
+        distance = (self._median_us * 0.000343) / 2
+        return min(distance, self._max_distance)
+
+    @property
+    def max_distance(self):
+        """
+        Returns the maximum distance that the sensor will measure in metres.
+        """
+        return self._max_distance
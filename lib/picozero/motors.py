@@ -0,0 +1,420 @@
+from array import array
+from .base import clamp, PinsMixin
+from .outputs import DigitalOutputDevice, PWMOutputDevice
+from .pwm import pwm_manager
+
+###############################################################################
+# MOTORS AND SERVOS
+###############################################################################
+
+class Motor(PinsMixin):
+    """
+    Represents a motor connected to a motor controller that has a two-pin
+    input. One pin drives the motor "forward", the other drives the motor
+    "backward".
+
+    :type forward: int
+    :param forward:
+        The GP pin that controls the "forward" motion of the motor. 
+    
+    :type backward: int
+    :param backward:
+        The GP pin that controls the "backward" motion of the motor. 
+    
+    :param bool pwm:
+        If :data:`True` (the default), PWM pins are used to drive the motor. 
+        When using PWM pins, values between 0 and 1 can be used to set the 
+        speed.
+    
+    """
+    def __init__(self, forward, backward, pwm=True):
+        self._pin_nums = (forward, backward)
+        self._forward = PWMOutputDevice(forward) if pwm else DigitalOutputDevice(forward)
+        self._backward = PWMOutputDevice(backward) if pwm else DigitalOutputDevice(backward)
+        # with pwm, both inputs of the controller are written together so
+        # the motor never sees a mix of the old and new speed
+        self._group = pwm_manager().group(self._pin_nums) if pwm else None
+        self._duties = array('H', bytearray(4))
+
+    def _fill(self, speed, duties, i):
+        # Stops any timed change and puts the forward and backward duty
+        # cycles for `speed` in duties[i] and duties[i + 1]
+        self._forward._stop_change()
+        self._backward._stop_change()
+        duties[i] = self._forward._value_to_state(speed if speed > 0 else 0)
+        duties[i + 1] = self._backward._value_to_state(-speed if speed < 0 else 0)
+
+    def _drive(self, speed):
+        self._fill(speed, self._duties, 0)
+        self._group.set(self._duties)
+        
+    def on(self, speed=1, t=None, wait=False):
+        """
+        Turns the motor on and makes it turn.
+
+        :param float speed:
+            The speed as a value between -1 and 1: 1 turns the motor at
+            full speed in one direction, -1 turns the motor at full speed in
+            the opposite direction. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the motor should run for. If None is 
+            specified, the motor will stay on. The default is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        if t is None and self._group is not None:
+            self._drive(speed)
+
+        elif speed > 0:
+            self._backward.off()
+            self._forward.on(speed, t, wait)
+            
+        elif speed < 0:
+            self._forward.off()
+            self._backward.on(-speed, t, wait)
+        
+        else:
+            self.off()
+
+    def off(self):
+        """
+        Stops the motor turning.
+        """
+        if self._group is not None:
+            self._drive(0)
+        else:
+            self._backward.off()
+            self._forward.off()
+
+    @property
+    def value(self):
+        """
+        Sets or returns the motor speed as a value between -1 and 1: -1 is full
+        speed "backward", 1 is full speed "forward", 0 is stopped.
+        """
+        return self._forward.value + (-self._backward.value)
+
+    @value.setter
+    def value(self, value):
+        if value != 0:
+            self.on(value)
+        else:
+            self.stop()
+
+    def forward(self, speed=1, t=None, wait=False):
+        """
+        Makes the motor turn "forward".
+
+        :param float speed:
+            The speed as a value between 0 and 1: 1 is full speed, 0 is stop. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the motor should turn for. If None is 
+            specified, the motor will stay on. The default is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        self.on(speed, t, wait)
+
+    def backward(self, speed=1, t=None, wait=False):
+        """
+        Makes the motor turn "backward".
+
+        :param float speed:
+            The speed as a value between 0 and 1: 1 is full speed, 0 is stop. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the motor should turn for. If None is 
+            specified, the motor will stay on. The default is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        self.on(-speed, t, wait)
+
+    def close(self):
+        """
+        Closes the device and releases any resources. Once closed, the device
+        can no longer be used.
+        """
+        self._forward.close()
+        self._backward.close()
+        self._group = None
+
+Motor.start = Motor.on
+Motor.stop = Motor.off
+
+class Robot:
+    """
+    Represents a generic dual-motor robot / rover / buggy.
+
+    Alias for :class:`Rover`.
+
+    This class is constructed with two tuples representing the forward and
+    backward pins of the left and right controllers. For example,
+    if the left motor's controller is connected to pins 12 and 13, while the
+    right motor's controller is connected to pins 14 and 15, then the following
+    example will drive the robot forward::
+
+        from picozero import Robot
+
+        robot = Robot(left=(12, 13), right=(14, 15))
+        robot.forward()
+
+    :param tuple left:
+        A tuple of two pins representing the forward and backward inputs of the 
+        left motor's controller.
+
+    :param tuple right:
+        A tuple of two pins representing the forward and backward inputs of the 
+        right motor's controller.
+
+    :param bool pwm:
+        If :data:`True` (the default), pwm pins will be used, allowing variable 
+        speed control. 
+
+    """
+    def __init__(self, left, right, pwm=True):
+        self._left = Motor(left[0], left[1], pwm)
+        self._right = Motor(right[0], right[1], pwm)
+        # with pwm, all four inputs are written together, so both motors
+        # start, stop and turn at the same moment
+        self._group = pwm_manager().group(
+            self._left._pin_nums + self._right._pin_nums) if pwm else None
+        self._duties = array('H', bytearray(8))
+
+    def _drive(self, left, right):
+        self._left._fill(left, self._duties, 0)
+        self._right._fill(right, self._duties, 2)
+        self._group.set(self._duties)
+
+    @property
+    def left_motor(self):
+        """
+        Returns the left :class:`Motor`.
+        """
+        return self._left
+
+    @property
+    def right_motor(self):
+        """
+        Returns the right :class:`Motor`.
+        """
+        return self._right
+
+    @property
+    def value(self):
+        """
+        Represents the motion of the robot as a tuple of (left_motor_speed,
+        right_motor_speed) with ``(-1, -1)`` representing full speed backwards,
+        ``(1, 1)`` representing full speed forwards, and ``(0, 0)``
+        representing stopped.
+        """
+        return (self._left.value, self._right.value)
+
+    @value.setter
+    def value(self, value):
+        if self._group is not None:
+            self._drive(*value)
+        else:
+            self._left.value, self._right.value = value
+        
+    def forward(self, speed=1, t=None, wait=False):
+        """
+        Makes the robot move "forward".
+
+        :param float speed:
+            The speed as a value between 0 and 1: 1 is full speed, 0 is stop. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the robot should move for. If None is 
+            specified, the robot will continue to move until stopped. The default 
+            is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        if t is None and self._group is not None:
+            self._drive(speed, speed)
+        else:
+            self._left.forward(speed, t, False)
+            self._right.forward(speed, t, wait)
+        
+    def backward(self, speed=1, t=None, wait=False):
+        """
+        Makes the robot move "backward".
+
+        :param float speed:
+            The speed as a value between 0 and 1: 1 is full speed, 0 is stop. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the robot should move for. If None is 
+            specified, the robot will continue to move until stopped. The default 
+            is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        if t is None and self._group is not None:
+            self._drive(-speed, -speed)
+        else:
+            self._left.backward(speed, t, False)
+            self._right.backward(speed, t, wait)
+        
+    def left(self, speed=1, t=None, wait=False):
+        """
+        Makes the robot turn "left" by turning the left motor backward and the 
+        right motor forward.
+
+        :param float speed:
+            The speed as a value between 0 and 1: 1 is full speed, 0 is stop. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the robot should turn for. If None is 
+            specified, the robot will continue to turn until stopped. The default 
+            is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        if t is None and self._group is not None:
+            self._drive(-speed, speed)
+        else:
+            self._left.backward(speed, t, False)
+            self._right.forward(speed, t, wait)
+    
+    def right(self, speed=1, t=None, wait=False):
+        """
+        Makes the robot turn "right" by turning the left motor forward and the 
+        right motor backward.
+
+        :param float speed:
+            The speed as a value between 0 and 1: 1 is full speed, 0 is stop. Defaults to 1.
+
+        :param float t:
+            The time in seconds that the robot should turn for. If None is 
+            specified, the robot will continue to turn until stopped. The default 
+            is None.
+
+        :param bool wait:
+           If True, the method will block until the time `t` has expired. 
+           If False, the method will return and the motor will turn on in
+           the background. Defaults to False. Only effective if `t` is not
+           None.
+        """
+        if t is None and self._group is not None:
+            self._drive(speed, -speed)
+        else:
+            self._left.forward(speed, t, False)
+            self._right.backward(speed, t, wait)
+        
+    def stop(self):
+        """
+        Stops the robot.
+        """
+        if self._group is not None:
+            self._drive(0, 0)
+        else:
+            self._left.stop()
+            self._right.stop()
+
+    def close(self):
+        """
+        Closes the device and releases any resources. Once closed, the device
+        can no longer be used.
+        """
+        self._left.close()
+        self._right.close()
+        self._group = None
+    
+Rover = Robot
+
+class Servo(PWMOutputDevice):
+    """
+    Represents a PWM-controlled servo motor.
+
+    Setting the `value` to 0 will move the servo to its minimum position,
+    1 will move the servo to its maximum position. Setting the `value` to
+    :data:`None` will turn the servo "off" (i.e. no signal is sent).
+
+    :type pin: int
+    :param pin:
+        The pin the servo motor is connected to. 
+
+    :param bool initial_value:
+        If :data:`0`, the servo will be set to its minimum position.  If
+        :data:`1`, the servo will set to its maximum position. If :data:`None`
+        (the default), the position of the servo will not change.
+
+    :param float min_pulse_width:
+        The pulse width corresponding to the servo's minimum position. This
+        defaults to 1ms.
+
+    :param float max_pulse_width:
+        The pulse width corresponding to the servo's maximum position. This
+        defaults to 2ms.
+
+    :param float frame_width:
+        The length of time between servo control pulses measured in seconds.
+        This defaults to 20ms which is a common value for servos.
+
+    :param int duty_factor:
+        The duty factor of the PWM signal. This is a value between 0 and 65535.
+        Defaults to 65535.    
+    """
+    def __init__(self, pin, initial_value=None, min_pulse_width=1/1000, max_pulse_width=2/1000, frame_width=20/1000, duty_factor=65535):
+        self._min_duty = int((min_pulse_width / frame_width) * duty_factor)
+        self._max_duty = int((max_pulse_width / frame_width) * duty_factor)
+        
+        super().__init__(pin, freq=int(1 / frame_width), duty_factor=duty_factor, initial_value=initial_value)
+        
+    def _state_to_value(self, state):
+        return None if state == 0 else clamp((state - self._min_duty) / (self._max_duty - self._min_duty), 0, 1)
+        
+    def _value_to_state(self, value):
+        return 0 if value is None else int(self._min_duty + ((self._max_duty - self._min_duty) * value))
+    
+    def min(self):
+        """
+        Set the servo to its minimum position.
+        """
+        self.value = 0
+    
+    def mid(self):
+        """
+        Set the servo to its mid-point position.
+        """
+        self.value = 0.5
+        
+    def max(self):
+        """
+        Set the servo to its maximum position.
+        """
+        self.value = 1
+
+    def off(self):
+        """
+        Turn the servo "off" by setting the value to `None`.
+        """
+        self.value = None
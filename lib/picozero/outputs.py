@@ -0,0 +1,359 @@
+from machine import Pin
+from .base import PinMixin, OutputDevice, FadeChange, fade_table, hold_table
+from .pwm import pwm_manager
+
+###############################################################################
+# OUTPUT DEVICES
+###############################################################################
+
+class DigitalOutputDevice(OutputDevice, PinMixin):
+    """
+    Represents a device driven by a digital pin.
+
+    :param int pin:
+        The pin that the device is connected to.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the LED will be off initially. If
+        :data:`True`, the LED will be switched on initially.
+    """
+    def __init__(self, pin, active_high=True, initial_value=False):
+        self._pin_num = pin
+        self._pin = Pin(pin, Pin.OUT)
+        super().__init__(active_high, initial_value)
+        
+    def _value_to_state(self, value):
+        return int(self._active_state if value else self._inactive_state)
+    
+    def _state_to_value(self, state):
+        return int(bool(state) == self._active_state)
+    
+    def _read(self):
+        return self._state_to_value(self._pin.value())
+
+    def _write(self, value):
+        self._pin.value(self._value_to_state(value))
+                
+    def close(self):
+        """
+        Closes the device and turns the device off. Once closed, the device
+        can no longer be used.
+        """
+        super().close()
+        self._pin = None
+
+class DigitalLED(DigitalOutputDevice):
+    """
+    Represents a simple LED, which can be switched on and off.
+
+    :param int pin:
+        The pin that the device is connected to.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the LED will be off initially. If
+        :data:`True`, the LED will be switched on initially.
+    """
+    pass
+
+DigitalLED.is_lit = DigitalLED.is_active
+
+class Buzzer(DigitalOutputDevice):
+    """
+    Represents an active or passive buzzer, which can be turned on or off.
+
+    :param int pin:
+        The pin that the device is connected to.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the Buzzer will be off initially. If
+        :data:`True`, the Buzzer will be switched on initially.
+    """
+    pass
+
+Buzzer.beep = Buzzer.blink
+
+class PWMOutputDevice(OutputDevice, PinMixin):
+    """
+    Represents a device driven by a PWM pin.
+
+    :param int pin:
+        The pin that the device is connected to.
+
+    :param int freq:
+        The frequency of the PWM signal in hertz. Defaults to 100.
+
+    :param int duty_factor:
+        The duty factor of the PWM signal. This is a value between 0 and 65535.
+        Defaults to 65535.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the LED will be off initially. If
+        :data:`True`, the LED will be switched on initially.
+    """
+    
+    PIN_TO_PWM_CHANNEL = ["0A","0B","1A","1B","2A","2B","3A","3B","4A","4B","5A","5B","6A","6B","7A","7B","0A","0B","1A","1B","2A","2B","3A","3B","4A","4B","5A","5B","6A","6B"]
+    
+    def __init__(self, pin, freq=100, duty_factor=65535, active_high=True, initial_value=False):
+        # the channel is allocated (or PWMChannelAlreadyInUse raised)
+        # by the shared PWMManager, and given back on close()
+        self._pin_num = pin
+        self._duty_factor = duty_factor
+        self._pwm = pwm_manager().allocate(pin, self, freq)
+        self._group = None
+        super().__init__(active_high, initial_value)
+        
+    def _state_to_value(self, state):
+        return (state if self.active_high else self._duty_factor - state) / self._duty_factor
+
+    def _value_to_state(self, value):
+        return int(self._duty_factor * (value if self.active_high else 1 - value))
+    
+    def _read(self):
+        return self._state_to_value(self._pwm.duty_u16())
+    
+    def _write(self, value):
+        self._pwm.duty_u16(self._value_to_state(value))
+        
+    @property
+    def is_active(self):
+        """
+        Returns :data:`True` if the device is on.
+        """
+        return self.value != 0
+
+    @property
+    def freq(self):
+        """
+        Returns the current frequency of the device.
+        """
+        return self._pwm.freq()
+    
+    @freq.setter
+    def freq(self, freq):
+        """
+        Sets the frequency of the device.
+        """
+        self._pwm.freq(freq)
+
+    def blink(self, on_time=1, off_time=None, n=None, wait=False, fade_in_time=0, fade_out_time=None, fps=25, curve='linear'):
+        """
+        Makes the device turn on and off repeatedly. Fades are played from
+        precomputed duty cycle tables (see :func:`fade_table`).
+        
+        :param float on_time:
+            The length of time in seconds the device will be on. Defaults to 1.
+
+        :param float off_time:
+            The length of time in seconds the device will be off. If `None`, 
+            it will be the same as ``on_time``. Defaults to `None`.
+
+        :param int n:
+            The number of times to repeat the blink operation. If `None`, the 
+            device will continue blinking forever. The default is `None`.
+
+        :param bool wait:
+           If True, the method will block until the LED stops blinking. If False,
+           the method will return and the LED will blink in the background.
+           Defaults to False.
+
+        :param float fade_in_time:
+            The length of time in seconds to spend fading in. Defaults to 0.
+
+        :param float fade_out_time:
+            The length of time in seconds to spend fading out. If `None`,
+            it will be the same as ``fade_in_time``. Defaults to `None`.
+
+        :param int fps:
+           The frames per second that will be used to calculate the number of
+           steps between off/on states when fading. Defaults to 25.
+
+        :param str curve:
+           ``'linear'`` (the default) or ``'gamma'`` for gamma corrected
+           fades that look even to the eye.
+        """
+        self.off()
+        
+        off_time = on_time if off_time is None else off_time
+        fade_out_time = fade_in_time if fade_out_time is None else fade_out_time
+        
+        on = self._value_to_state(1)
+        off = self._value_to_state(0)
+        frame_ms = int(1000 / fps)
+        segments = []
+        if fade_in_time > 0:
+            segments.append(((fade_table(off, on, fade_in_time, fps, curve, self.active_high), ), frame_ms))
+        if on_time > 0:
+            segments.append(((hold_table(on), ), int(on_time * 1000)))
+        if fade_out_time > 0:
+            segments.append(((fade_table(on, off, fade_out_time, fps, curve, self.active_high), ), frame_ms))
+        if off_time > 0:
+            segments.append(((hold_table(off), ), int(off_time * 1000)))
+        
+        # is there anything to change?
+        if segments:
+            if self._group is None:
+                self._group = pwm_manager().group((self._pin_num, ))
+            self._value_changer = FadeChange(self, self._group, tuple(segments), n, wait)
+
+    def pulse(self, fade_in_time=1, fade_out_time=None, n=None, wait=False, fps=25, curve='linear'):
+        """
+        Makes the device pulse on and off repeatedly.
+        
+        :param float fade_in_time:
+            The length of time in seconds that the device will take to turn on.
+            Defaults to 1.
+
+        :param float fade_out_time:
+           The length of time in seconds that the device will take to turn off.
+           Defaults to 1.
+           
+        :param int fps:
+           The frames per second that will be used to calculate the number of
+           steps between off/on states. Defaults to 25.
+           
+        :param int n:
+           The number of times to pulse the LED. If None, the LED will pulse
+           forever. Defaults to None.
+    
+        :param bool wait:
+           If True, the method will block until the LED stops pulsing. If False,
+           the method will return and the LED will pulse in the background.
+           Defaults to False.
+
+        :param str curve:
+           ``'linear'`` (the default) or ``'gamma'`` for gamma corrected
+           fades that look even to the eye.
+        """
+        self.blink(on_time=0, off_time=0, fade_in_time=fade_in_time, fade_out_time=fade_out_time, n=n, wait=wait, fps=fps, curve=curve)
+
+    def close(self):
+        """
+        Closes the device and turns the device off. Once closed, the device
+        can no longer be used.
+        """
+        super().close()
+        pwm_manager().free(self._pin_num)
+        self._pwm = None
+        self._group = None
+    
+class PWMLED(PWMOutputDevice):
+    """
+    Represents an LED driven by a PWM pin; the brightness of the LED can be changed.
+
+    :param int pin:
+        The pin that the device is connected to.
+
+    :param int freq:
+        The frequency of the PWM signal in hertz. Defaults to 100.
+
+    :param int duty_factor:
+        The duty factor of the PWM signal. This is a value between 0 and 65535.
+        Defaults to 65535.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the LED will be off initially. If
+        :data:`True`, the LED will be switched on initially.
+    """
+PWMLED.brightness = PWMLED.value
+
+def LED(pin, pwm=True, active_high=True, initial_value=False):
+    """
+    Returns an instance of :class:`DigitalLED` or :class:`PWMLED` depending on
+    the value of the `pwm` parameter. 
+
+    ::
+
+        from picozero import LED
+
+        my_pwm_led = LED(1)
+
+        my_digital_led = LED(2, pwm=False)
+
+    :param int pin:
+        The pin that the device is connected to.
+
+    :param int pin:
+        If `pwm` is :data:`True` (the default), a :class:`PWMLED` will be
+        returned. If `pwm` is :data:`False`, a :class:`DigitalLED` will be
+        returned. A :class:`PWMLED` can control the brightness of the LED but
+        uses 1 PWM channel.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the device will be off initially. If
+        :data:`True`, the device will be switched on initially.
+    """
+    if pwm:
+        return PWMLED(
+            pin=pin,
+            active_high=active_high,
+            initial_value=initial_value)
+    else:
+        return DigitalLED(
+            pin=pin,
+            active_high=active_high,
+            initial_value=initial_value)
+
+try:
+    pico_led = LED("LED", pwm=False)
+except TypeError:
+    # older version of micropython before "LED" was supported
+    pico_led = LED(25, pwm=False)
+
+class PWMBuzzer(PWMOutputDevice):
+    """
+    Represents a passive buzzer driven by a PWM pin; the volume of the buzzer can be changed.
+
+    :param int pin:
+        The pin that the buzzer is connected to.
+
+    :param int freq:
+        The frequency of the PWM signal in hertz. Defaults to 440.
+
+    :param int duty_factor:
+        The duty factor of the PWM signal. This is a value between 0 and 65535.
+        Defaults to 1023.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+
+    :param bool initial_value:
+        If :data:`False` (the default), the buzzer will be off initially.  If
+        :data:`True`, the buzzer will be switched on initially.
+    """    
+    def __init__(self, pin, freq=440, duty_factor=1023, active_high=True, initial_value=False):
+        super().__init__(pin, freq, duty_factor, active_high, initial_value)
+
+PWMBuzzer.volume = PWMBuzzer.value
+PWMBuzzer.beep = PWMBuzzer.blink
@@ -0,0 +1,179 @@
+from machine import Pin, PWM, disable_irq, enable_irq
+from sys import platform
+from .base import PWMChannelAlreadyInUse
+
+try:
+    from machine import mem32
+except ImportError:
+    mem32 = None
+
+###############################################################################
+# PWM CHANNELS
+###############################################################################
+
+# RP2040 PWM block: 8 slices of 5 registers. CC holds the compare level of
+# channel A in its low half and channel B in its high half; it is double
+# buffered and only takes effect when the slice's counter wraps, so both
+# channels of a slice change together when CC is written in one go.
+PWM_BASE = 0x40050000
+SLICE_STRIDE = 0x14
+CC = 0x0C
+TOP = 0x10
+
+def pwm_channel(pin):
+    """
+    Returns the ``(slice, channel)`` that drives a GP pin, channel 0 being
+    A and 1 being B.
+    """
+    return (pin >> 1) & 7, pin & 1
+
+class PWMManager:
+    """
+    Hands out the PWM slices and channels of the pico to devices, and
+    takes them back when the devices are closed. Use :func:`pwm_manager`
+    to get the shared instance.
+
+    Devices that change several channels at once (:class:`RGBLED`,
+    :class:`Motor`, :class:`Robot`) do so through a :class:`PWMGroup`.
+    """
+    def __init__(self):
+        self._owners = {}
+        self._pwms = {}
+        # groups write the CC registers directly where they can be reached
+        self.registers = mem32 is not None and platform in ('rp2', 'linux')
+
+    def allocate(self, pin, owner, freq=None):
+        """
+        Returns a PWM object for `pin`, owned by `owner` until :meth:`free`
+        is called. Raises :exc:`PWMChannelAlreadyInUse` if another device
+        owns the pin's channel.
+
+        :param int freq:
+            If given, the frequency of the PWM signal in hertz. Both
+            channels of a slice share one frequency.
+        """
+        key = pwm_channel(pin)
+        if key in self._owners:
+            raise PWMChannelAlreadyInUse(
+                "PWM channel {}{} is already in use by {}. Use a different pin".format(
+                    key[0], "AB"[key[1]], str(self._owners[key])
+                    )
+                )
+        pwm = PWM(Pin(pin))
+        if freq is not None:
+            pwm.freq(freq)
+        self._owners[key] = owner
+        self._pwms[pin] = pwm
+        return pwm
+
+    def free(self, pin):
+        """
+        Turns off and releases the channel of `pin`.
+        """
+        pwm = self._pwms.pop(pin, None)
+        if pwm is not None:
+            del self._owners[pwm_channel(pin)]
+            pwm.deinit()
+
+    def owner(self, pin):
+        """
+        Returns the device that owns the channel of `pin`, or None.
+        """
+        return self._owners.get(pwm_channel(pin))
+
+    def group(self, pins):
+        """
+        Returns a :class:`PWMGroup` that sets the duty cycles of the
+        (already allocated) `pins` together.
+        """
+        return PWMGroup(tuple(self._pwms[pin] for pin in pins), pins, self.registers)
+
+_manager = None
+
+def pwm_manager():
+    """
+    Returns the :class:`PWMManager` shared by all PWM devices, creating it
+    on first use.
+    """
+    global _manager
+    if _manager is None:
+        _manager = PWMManager()
+    return _manager
+
+class PWMGroup:
+    """
+    Sets the duty cycles of several PWM channels in one operation. Writes
+    are grouped per slice, so the channels of a slice get a single 32 bit
+    CC write and change in the same PWM period, and interrupts are held
+    off until every slice has been written, so nothing can run between
+    the writes.
+
+    Where the registers cannot be reached, and for a single channel,
+    :meth:`set` falls back to one ``duty_u16`` call per channel.
+
+    :param tuple pwms:
+        The PWM objects, one per pin.
+
+    :param tuple pins:
+        The GP pins of the PWM objects.
+
+    :param bool registers:
+        If :data:`True`, write the CC registers directly.
+    """
+    def __init__(self, pwms, pins, registers=True):
+        self._pwms = pwms
+        self._registers = registers and len(pwms) > 1
+
+        slices = []
+        for i in range(len(pins)):
+            slice, channel = pwm_channel(pins[i])
+            if slice not in slices:
+                slices.append(slice)
+        # per slice: register addresses, the index in `duties` of channels
+        # A and B (-1 if not in the group) and the cached TOP and scale
+        self._cc = [PWM_BASE + SLICE_STRIDE * s + CC for s in slices]
+        self._top = [PWM_BASE + SLICE_STRIDE * s + TOP for s in slices]
+        self._a = [-1] * len(slices)
+        self._b = [-1] * len(slices)
+        for i in range(len(pins)):
+            slice, channel = pwm_channel(pins[i])
+            (self._b if channel else self._a)[slices.index(slice)] = i
+        self._tops = [-1] * len(slices)
+        self._scales = [0] * len(slices)
+
+    def __len__(self):
+        return len(self._pwms)
+
+    def set(self, duties):
+        """
+        Sets the duty cycle (0 - 65535) of every channel, in the order the
+        pins were given.
+        """
+        if not self._registers:
+            pwms = self._pwms
+            for i in range(len(pwms)):
+                pwms[i].duty_u16(duties[i])
+            return
+
+        state = disable_irq()
+        for s in range(len(self._cc)):
+            top = mem32[self._top[s]]
+            if top != self._tops[s]:
+                # the frequency changed; levels are duty * (TOP + 1) / 65535
+                # with 14 fractional bits, which stays a small int and is
+                # within a few counts of duty_u16()
+                self._tops[s] = top
+                self._scales[s] = (((top + 1) << 14) + 32767) // 65535
+            scale = self._scales[s]
+            a = self._a[s]
+            b = self._b[s]
+            if a >= 0 and b >= 0:
+                mem32[self._cc[s]] = (
+                    ((duties[b] * scale + 8192) >> 14) << 16 | (duties[a] * scale + 8192) >> 14)
+            elif a >= 0:
+                # narrow writes are copied to both halves of the register,
+                # so keep the other channel's half with a read-modify-write
+                mem32[self._cc[s]] = mem32[self._cc[s]] & 0xFFFF0000 | (duties[a] * scale + 8192) >> 14
+            else:
+                mem32[self._cc[s]] = mem32[self._cc[s]] & 0xFFFF | ((duties[b] * scale + 8192) >> 14) << 16
+        enable_irq(state)
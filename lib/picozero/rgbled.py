@@ -0,0 +1,315 @@
+from array import array
+from .base import PinsMixin, OutputDevice, FadeChange, fade_table, hold_table
+from .outputs import DigitalLED, PWMLED
+from .pwm import pwm_manager
+
+###############################################################################
+# RGB LED
+###############################################################################
+
+class RGBLED(OutputDevice, PinsMixin):
+    """
+    Extends :class:`OutputDevice` and represents a full colour LED component (composed
+    of red, green, and blue LEDs).
+    Connect the common cathode (longest leg) to a ground pin; connect each of
+    the other legs (representing the red, green, and blue anodes) to any GP
+    pins. You should use three limiting resistors (one per anode).
+    The following code will make the LED yellow::
+
+        from picozero import RGBLED
+        rgb = RGBLED(1, 2, 3)
+        rgb.color = (1, 1, 0)
+
+    0–255 colours are also supported::
+
+        rgb.color = (255, 255, 0)
+
+    :type red: int
+    :param red:
+        The GP pin that controls the red component of the RGB LED. 
+    :type green: int
+    :param green:
+        The GP pin that controls the green component of the RGB LED.
+    :type blue: int
+    :param blue:
+        The GP pin that controls the blue component of the RGB LED.
+    :param bool active_high:
+        Set to :data:`True` (the default) for common cathode RGB LEDs. If you
+        are using a common anode RGB LED, set this to :data:`False`.
+    :type initial_value: ~colorzero.Color or tuple
+    :param initial_value:
+        The initial color for the RGB LED. Defaults to black ``(0, 0, 0)``.
+    :param bool pwm:
+        If :data:`True` (the default), construct :class:`PWMLED` instances for
+        each component of the RGBLED. If :data:`False`, construct 
+        :class:`DigitalLED` instances.
+    
+    """
+    def __init__(self, red=None, green=None, blue=None, active_high=True,
+                 initial_value=(0, 0, 0), pwm=True):
+        self._pin_nums = (red, green, blue)
+        self._leds = ()
+        self._last = initial_value
+        LEDClass = PWMLED if pwm else DigitalLED
+        self._leds = tuple(
+            LEDClass(pin, active_high=active_high)
+            for pin in (red, green, blue))
+        # with pwm, the three channels are always written together
+        self._group = pwm_manager().group(self._pin_nums) if pwm else None
+        self._duties = array('H', bytearray(6))
+        super().__init__(active_high, initial_value)
+        
+    def _write(self, value):
+        if type(value) is not tuple:
+            value = (value, ) * 3       
+        if self._group is None:
+            for led, v in zip(self._leds, value):
+                led.value = v
+            return
+        leds = self._leds
+        duties = self._duties
+        for c in range(3):
+            leds[c]._stop_change()
+            duties[c] = leds[c]._value_to_state(value[c])
+        self._group.set(duties)
+        
+    @property
+    def value(self):
+        """
+        Represents the colour of the LED as an RGB 3-tuple of ``(red, green,
+        blue)`` where each value is between 0 and 1 if *pwm* was :data:`True`
+        when the class was constructed (but only takes values of 0 or 1 otherwise).
+        For example, red would be ``(1, 0, 0)`` and yellow would be ``(1, 1,
+        0)``, whereas orange would be ``(1, 0.5, 0)``.
+        """
+        return tuple(led.value for led in self._leds)
+
+    @value.setter
+    def value(self, value):
+        self._stop_change()
+        self._write(value)
+
+    @property
+    def is_active(self):
+        """
+        Returns :data:`True` if the LED is currently active (not black) and
+        :data:`False` otherwise.
+        """
+        return self.value != (0, 0, 0)
+
+    is_lit = is_active
+
+    def _to_255(self, value):
+        return round(value * 255)
+    
+    def _from_255(self, value):
+        return 0 if value == 0 else value / 255
+    
+    @property
+    def color(self):
+        """
+        Represents the colour of the LED as an RGB 3-tuple of ``(red, green,
+        blue)`` where each value is between 0 and 255 if *pwm* was :data:`True`
+        when the class was constructed (but only takes values of 0 or 255 otherwise).
+        For example, red would be ``(255, 0, 0)`` and yellow would be ``(255, 255,
+        0)``, whereas orange would be ``(255, 127, 0)``.
+        """
+        return tuple(self._to_255(v) for v in self.value)
+
+    @color.setter
+    def color(self, value):
+        self.value = tuple(self._from_255(v) for v in value)
+
+    @property
+    def red(self):
+        """
+        Represents the red component of the LED as a value between 0 and 255 if *pwm* was :data:`True`
+        when the class was constructed (but only takes values of 0 or 255 otherwise).
+        """
+        return self._to_255(self.value[0])
+
+    @red.setter
+    def red(self, value):
+        r, g, b = self.value
+        self.value = self._from_255(value), g, b
+
+    @property
+    def green(self):
+        """
+        Represents the green component of the LED as a value between 0 and 255 if *pwm* was :data:`True`
+        when the class was constructed (but only takes values of 0 or 255 otherwise).
+        """
+        return self._to_255(self.value[1])
+
+    @green.setter
+    def green(self, value):
+        r, g, b = self.value
+        self.value = r, self._from_255(value), b
+
+    @property
+    def blue(self):
+        """
+        Represents the blue component of the LED as a value between 0 and 255 if *pwm* was :data:`True`
+        when the class was constructed (but only takes values of 0 or 255 otherwise).
+        """
+        return self._to_255(self.value[2])
+
+    @blue.setter
+    def blue(self, value):
+        r, g, b = self.value
+        self.value = r, g, self._from_255(value)
+
+    def on(self):
+        """
+        Turns the LED on. This is equivalent to setting the LED color to white, e.g.
+        ``(1, 1, 1)``.
+        """
+        self.value = (1, 1, 1)
+
+    def invert(self):
+        """
+        Inverts the state of the device. If the device is currently off
+        (:attr:`value` is ``(0, 0, 0)``), this changes it to "fully" on
+        (:attr:`value` is ``(1, 1, 1)``). If the device has a specific colour,
+        this method inverts the colour.
+        """
+        r, g, b = self.value
+        self.value = (1 - r, 1 - g, 1 - b)
+        
+    def toggle(self):
+        """
+        Toggles the state of the device. If the device has a specific colour, then that colour is saved and the device is turned off. 
+        If the device is off, it will be changed to the last colour it had when it was on or, if none, to fully on (:attr:`value` is ``(1, 1, 1)``).
+        """
+        if self.value == (0, 0, 0):
+            self.value = self._last or (1, 1, 1)
+        else:
+            self._last = self.value 
+            self.value = (0, 0, 0)
+            
+    def blink(self, on_times=1, fade_times=0, colors=((1, 0, 0), (0, 1, 0), (0, 0, 1)), n=None, wait=False, fps=25, curve='linear'):
+        """
+        Makes the device blink between colours repeatedly. With *pwm*, the
+        colours and fades are played from precomputed duty cycle tables
+        (see :func:`fade_table`).
+
+        :param float on_times:
+            Single value or tuple of numbers of seconds to stay on each colour. Defaults to 1 second. 
+        :param float fade_times:
+            Single value or tuple of times to fade between each colour. Must be 0 if
+            *pwm* was :data:`False` when the class was constructed.
+        :type colors: tuple
+            Tuple of colours to blink between, use ``(0, 0, 0)`` for off.
+        :param colors:
+            The colours to blink between. Defaults to red, green, blue.
+        :type n: int or None
+        :param n:
+            Number of times to blink; :data:`None` (the default) means forever.
+        :param bool wait:
+            If :data:`False` (the default), use a Timer to manage blinking,
+            continue blinking, and return immediately. If :data:`False`, only
+            return when the blinking is finished (warning: the default value of
+            *n* will result in this method never returning).
+        :param str curve:
+            ``'linear'`` (the default) or ``'gamma'`` for gamma corrected fades.
+        """    
+        self.off()
+        
+        if type(on_times) is not tuple:
+            on_times = (on_times, ) * len(colors)
+        if type(fade_times) is not tuple:
+            fade_times = (fade_times, ) * len(colors)
+        # If any value is above zero then treat all as 0-255 values
+        if any(v > 1 for v in sum(colors, ())):
+            colors = tuple(tuple(self._from_255(v) for v in t) for t in colors)
+        
+        if isinstance(self._leds[0], PWMLED):
+            leds = self._leds
+            frame_ms = int(1000 / fps)
+            segments = []
+            for c in range(len(colors)):
+                duties = tuple(led._value_to_state(v) for led, v in zip(leds, colors[c]))
+                if on_times[c] > 0:
+                    segments.append((tuple(hold_table(d) for d in duties), int(on_times[c] * 1000)))
+                if fade_times[c] > 0:
+                    targets = tuple(led._value_to_state(v) for led, v in zip(leds, colors[(c + 1) % len(colors)]))
+                    segments.append((tuple(
+                        fade_table(d, e, fade_times[c], fps, curve, led.active_high)
+                        for led, d, e in zip(leds, duties, targets)), frame_ms))
+            if segments:
+                self._value_changer = FadeChange(self, self._group, tuple(segments), n, wait)
+            return
+
+        def blink_generator():
+        
+            # Define a linear interpolation between
+            # off_color and on_color
+            
+            lerp = lambda t, fade_in, color1, color2: tuple(
+                (1 - t) * off + t * on
+                if fade_in else
+                (1 - t) * on + t * off
+                for off, on in zip(color2, color1)
+                )
+            
+            for c in range(len(colors)):
+                if on_times[c] > 0:
+                    yield (colors[c], on_times[c])
+                    
+                if fade_times[c] > 0:
+                    for i in range(int(fps * fade_times[c])):
+                        v = lerp(i * (1 / fps) / fade_times[c], True, colors[(c + 1) % len(colors)], colors[c])
+                        t = 1 / fps       
+                        yield (v, t)
+    
+        self._start_change(blink_generator, n, wait)
+            
+    def pulse(self, fade_times=1, colors=((0, 0, 0), (1, 0, 0), (0, 0, 0), (0, 1, 0), (0, 0, 0), (0, 0, 1)), n=None, wait=False, fps=25, curve='linear'):
+        """
+        Makes the device fade between colours repeatedly.
+
+        :param float fade_times:
+            Single value or tuple of numbers of seconds to spend fading. Defaults to 1.
+        :param float fade_out_time:
+            Number of seconds to spend fading out. Defaults to 1.
+        :type colors: tuple
+        :param on_color:
+            Tuple of colours to pulse between in order. Defaults to red, off, green, off, blue, off. 
+        :type off_color: ~colorzero.Color or tuple
+        :type n: int or None
+        :param n:
+            Number of times to pulse; :data:`None` (the default) means forever.
+        :param str curve:
+            ``'linear'`` (the default) or ``'gamma'`` for gamma corrected fades.
+        """
+        on_times = 0
+        self.blink(on_times, fade_times, colors, n, wait, fps, curve)
+        
+    def cycle(self, fade_times=1, colors=((1, 0, 0), (0, 1, 0), (0, 0, 1)), n=None, wait=False, fps=25, curve='linear'):
+        """
+        Makes the device fade in and out repeatedly.
+
+        :param float fade_times:
+            Single value or tuple of numbers of seconds to spend fading between colours. Defaults to 1.
+        :param float fade_times:
+            Number of seconds to spend fading out. Defaults to 1.
+        :type colors: tuple
+        :param on_color:
+            Tuple of colours to cycle between. Defaults to red, green, blue. 
+        :type n: int or None
+        :param n:
+            Number of times to cycle; :data:`None` (the default) means forever.
+        :param str curve:
+            ``'linear'`` (the default) or ``'gamma'`` for gamma corrected fades.
+        """
+        on_times = 0
+        self.blink(on_times, fade_times, colors, n, wait, fps, curve)
+
+    def close(self):
+        super().close()
+        for led in self._leds:
+            led.close()
+        self._leds = None
+        self._group = None
+    
+RGBLED.colour = RGBLED.color
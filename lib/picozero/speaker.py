@@ -0,0 +1,218 @@
+from .base import PinMixin, OutputDevice
+from .outputs import PWMBuzzer
+
+###############################################################################
+# SPEAKER
+###############################################################################
+
+class Speaker(OutputDevice, PinMixin):
+    """
+    Represents a speaker driven by a PWM pin.
+
+    :param int pin:
+        The pin that the speaker is connected to.
+
+    :param int initial_freq:
+        The initial frequency of the PWM signal in hertz. Defaults to 440.
+    
+    :param int initial_volume:
+        The initial volume of the PWM signal. This is a value between 0 and
+        1. Defaults to 0.
+
+    :param int duty_factor:
+        The duty factor of the PWM signal. This is a value between 0 and 65535.
+        Defaults to 1023.
+
+    :param bool active_high:
+        If :data:`True` (the default), the :meth:`on` method will set the Pin
+        to HIGH. If :data:`False`, the :meth:`on` method will set the Pin to
+        LOW (the :meth:`off` method always does the opposite).
+    """    
+    NOTES = {
+        'b0': 31, 'c1': 33, 'c#1': 35, 'd1': 37, 'd#1': 39, 'e1': 41, 'f1': 44, 'f#1': 46, 'g1': 49,'g#1': 52, 'a1': 55,
+        'a#1': 58, 'b1': 62, 'c2': 65, 'c#2': 69, 'd2': 73, 'd#2': 78,
+        'e2': 82, 'f2': 87, 'f#2': 93, 'g2': 98, 'g#2': 104, 'a2': 110, 'a#2': 117, 'b2': 123,
+        'c3': 131, 'c#3': 139, 'd3': 147, 'd#3': 156, 'e3': 165, 'f3': 175, 'f#3': 185, 'g3': 196, 'g#3': 208, 'a3': 220, 'a#3': 233, 'b3': 247,
+        'c4': 262, 'c#4': 277, 'd4': 294, 'd#4': 311, 'e4': 330, 'f4': 349, 'f#4': 370, 'g4': 392, 'g#4': 415, 'a4': 440, 'a#4': 466, 'b4': 494,
+        'c5': 523, 'c#5': 554, 'd5': 587, 'd#5': 622, 'e5': 659, 'f5': 698, 'f#5': 740, 'g5': 784, 'g#5': 831, 'a5': 880, 'a#5': 932, 'b5': 988,
+        'c6': 1047, 'c#6': 1109, 'd6': 1175, 'd#6': 1245, 'e6': 1319, 'f6': 1397, 'f#6': 1480, 'g6': 1568, 'g#6': 1661, 'a6': 1760, 'a#6': 1865, 'b6': 1976,
+        'c7': 2093, 'c#7': 2217, 'd7': 2349, 'd#7': 2489,
+        'e7': 2637, 'f7': 2794, 'f#7': 2960, 'g7': 3136, 'g#7': 3322, 'a7': 3520, 'a#7': 3729, 'b7': 3951,
+        'c8': 4186, 'c#8': 4435, 'd8': 4699, 'd#8': 4978 
+        }
+    
+    def __init__(self, pin, initial_freq=440, initial_volume=0, duty_factor=1023, active_high=True):
+        
+        self._pin_num = pin
+        self._pwm_buzzer = PWMBuzzer(
+            pin,
+            freq=initial_freq,
+            duty_factor=duty_factor,
+            active_high=active_high,
+            initial_value=None,
+            )
+        
+        super().__init__(active_high, None)
+        self.volume = initial_volume
+        
+    def on(self, volume=1):
+        self.volume = volume
+        
+    def off(self):
+        self.volume = 0
+
+    @property
+    def value(self):
+        """
+        Sets or returns the value of the speaker. The value is a tuple of (freq, volume).
+        """
+        return tuple(self.freq, self.volume)
+
+    @value.setter
+    def value(self, value):
+        self._stop_change()
+        self._write(value)
+
+    @property
+    def volume(self):
+        """
+        Sets or returns the volume of the speaker: 1 for maximum volume, 0 for off.
+        """
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        self._volume = value
+        self.value = (self.freq, self.volume)
+        
+    @property
+    def freq(self):
+        """
+        Sets or returns the current frequency of the speaker.
+        """
+        return self._pwm_buzzer.freq
+    
+    @freq.setter
+    def freq(self, freq):
+        self.value = (freq, self.volume)
+        
+    def _write(self, value):
+        # set the frequency
+        if value[0] is not None:
+            self._pwm_buzzer.freq = value[0]
+        
+        # write the volume value
+        if value[1] is not None:
+            self._pwm_buzzer.volume = value[1]
+
+    def _to_freq(self, freq):
+        if freq is not None and freq != '' and freq != 0: 
+            if type(freq) is str:
+                return int(self.NOTES[freq])
+            elif freq <= 128 and freq > 0: # MIDI
+                midi_factor = 2**(1/12)
+                return int(440 * midi_factor ** (freq - 69))
+            else:
+                return freq
+        else:
+            return None
+
+    def beep(self, on_time=1, off_time=None, n=None, wait=False, fade_in_time=0, fade_out_time=None, fps=25):
+        """
+        Makes the buzzer turn on and off repeatedly.
+        
+        :param float on_time:
+            The length of time in seconds that the device will be on. Defaults to 1.
+
+        :param float off_time:
+            The length of time in seconds that the device will be off. If `None`, 
+            it will be the same as ``on_time``. Defaults to `None`.
+
+        :param int n:
+            The number of times to repeat the beep operation. If `None`, the 
+            device will continue beeping forever. The default is `None`.
+
+        :param bool wait:
+           If True, the method will block until the buzzer stops beeping. If False,
+           the method will return and the buzzer will beep in the background.
+           Defaults to False.
+
+        :param float fade_in_time:
+            The length of time in seconds to spend fading in. Defaults to 0.
+
+        :param float fade_out_time:
+            The length of time in seconds to spend fading out. If `None`,
+            it will be the same as ``fade_in_time``. Defaults to `None`.
+
+        :param int fps:
+           The frames per second that will be used to calculate the number of
+           steps between off/on states when fading. Defaults to 25.
+        """
+        self._pwm_buzzer.blink(on_time, off_time, n, wait, fade_in_time, fade_out_time, fps)
+
+    def play(self, tune=440, duration=1, volume=1, n=1, wait=True):
+        """
+        Plays a tune for a given duration. 
+
+        :param int tune:
+
+            The tune to play can be specified as:
+
+                + a single "note", represented as:
+                  + a frequency in Hz e.g. `440`
+                  + a midi note e.g. `60`
+                  + a note name as a string e.g. `"E4"`
+                + a list of notes and duration e.g. `[440, 1]` or `["E4", 2]`
+                + a list of two value tuples of (note, duration) e.g. `[(440,1), (60, 2), ("e4", 3)]`
+
+            Defaults to `440`.
+        
+        :param int volume:
+            The volume of the tune; 1 is maximum volume, 0 is mute. Defaults to 1.
+
+        :param float duration:
+            The duration of each note in seconds. Defaults to 1.
+
+        :param int n:
+           The number of times to play the tune. If None, the tune will play
+           forever. Defaults to 1.
+    
+        :param bool wait:
+           If True, the method will block until the tune has finished. If False,
+           the method will return and the tune will play in the background.
+           Defaults to True.
+        """
+
+        self.off()
+
+        # tune isn't a list, so it must be a single frequency or note
+        if not isinstance(tune, (list, tuple)):
+            tune = [(tune, duration)]
+        # if the first element isn't a list, then it must be list of a single note and duration
+        elif not isinstance(tune[0], (list, tuple)):
+            tune = [tune]
+
+        def tune_generator():
+            for note in tune:
+                
+                # note isn't a list or tuple, it must be a single frequency or note
+                if not isinstance(note, (list, tuple)):
+                    # make it into a tuple
+                    note = (note, duration)
+
+                # turn the notes into frequencies
+                freq = self._to_freq(note[0])
+                freq_duration = note[1]
+                freq_volume = volume if freq is not None else 0
+                
+                # if this is a tune of greater than 1 note, add gaps between notes
+                if len(tune) == 1:
+                    yield ((freq, freq_volume), freq_duration)
+                else:
+                    yield ((freq, freq_volume), freq_duration * 0.9)
+                    yield ((freq, 0), freq_duration * 0.1)
+                    
+        self._start_change(tune_generator, n, wait)
+
+    def close(self):
+        self._pwm_buzzer.close()
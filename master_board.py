@@ -1,9 +1,13 @@
 import network
 import utime
 import json
+import ustruct
+from array import array
 from umqtt.simple import MQTTClient
 from machine import Pin
 from mfrc522 import MFRC522
+from tracing import Tracer, TAP, DECIDE, PUBLISH
+from metrics import Registry, counting
 from time import localtime
 
 # Load configuration for Wi-Fi connection 
@@ -23,6 +27,44 @@ topic_heating_control = b'heating_control'
 topic_temperature = b'room_temperature'
 topic_heating_manual_temp = b'heating_manual_temp'
 topic_mode = b'control_mode'
+topic_master_status = b'master_status'
+
+# The actuator boards fall back to local control if the master is silent
+heartbeat_interval = config.get('heartbeat_interval_ms', 5000)
+
+# Deadband around the target: start below target - hysteresis, stop at
+# target + hysteresis and send nothing in between (0 switches at the target)
+control_hysteresis = config.get('control_hysteresis', 0)
+
+# With host_broker the master runs the MQTT broker itself (umqtt/broker.py,
+# polled from the main loop) and the other boards use the master's address
+# as broker_ip; with 'fallback' it only does so if broker_ip does not answer
+host_broker = config.get('host_broker', False)
+broker_poll_ms = config.get('broker_poll_ms', 10)
+local_broker = None
+
+# Optional latency tracing of the commands that follow a card tap (see
+# tracing.py): a ring of trace_size spans, published on trace/<client_id>
+# on request
+topic_trace_dump = b'trace/dump'
+topic_trace = ('trace/' + client_id).encode()
+trace_size = config.get('trace_size', 0)
+tracer = Tracer(trace_size) if trace_size else None
+pending_trace = None    # id of the last tap, until its commands are sent
+trace_tapped = None     # ticks_us at the end of that tap, until the first command
+
+# Runtime metrics (see metrics.py), published every metrics_interval_ms on
+# $metrics/<client_id> (0 turns that off)
+topic_metrics = ('$metrics/' + client_id).encode()
+metrics_interval = config.get('metrics_interval_ms', 60000)
+registry = Registry()
+loop_time = registry.histogram('loop_us')
+rfid_poll_time = registry.histogram('rfid_poll_us', (1000, 2000, 5000, 10000, 20000, 50000, 100000))
+publishes = registry.counter('publishes')
+messages = registry.counter('messages')
+
+# Per-message prints, which cost real time over USB serial
+debug = config.get('debug', False)
 
 # Determine the current season based on the current month
 def get_current_season():
@@ -47,6 +89,82 @@ cs = 17    # GP17 for Chip Select
 rst = 22   # GPIO22 for Reset 
 button_pin = 28  # GP28 for button input
 reader = MFRC522(spi_id=spi_id, sck=sck, mosi=mosi, miso=miso, cs=cs, rst=rst)
+# Compute CRC_A on the Pico instead of the RC522 coprocessor (falls back if they disagree)
+reader.set_crc_mode(reader.CRC_SOFT)
+
+# Optionally keep the preferences on the card itself (MIFARE Classic data
+# block) so that any door reader can identify a user without a local file.
+# The local dictionary is then only a cache, refreshed when the version
+# stamp stored on the card changes.
+card_prefs = config.get('card_prefs', False)
+card_prefs_sector = config.get('card_prefs_sector', 1)
+card_key = config.get('card_key', [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF])
+card_prefs_magic = b'SH'
+card_prefs_format = '<2sBHbb'  # magic, layout, version stamp, winter, summer
+card_prefs_block = bytearray(16)
+
+def read_card_prefs(uid):
+    (stat, block) = reader.readSectorBlock(uid, card_prefs_sector, 0, keyA=card_key)
+    if stat != reader.OK or block is None or len(block) < 16:
+        return None
+    magic, layout, version, winter, summer = ustruct.unpack_from(card_prefs_format, bytes(block[:16]))
+    if magic != card_prefs_magic or layout != 1:
+        return None
+    return {'winter': winter, 'summer': summer, 'version': version}
+
+def prefs_fit(prefs):
+    # winter and summer are stored as signed bytes ('b')
+    return -128 <= prefs['winter'] <= 127 and -128 <= prefs['summer'] <= 127
+
+def write_card_prefs(uid, prefs):
+    if not prefs_fit(prefs):
+        return False
+    ustruct.pack_into(card_prefs_format, card_prefs_block, 0, card_prefs_magic, 1,
+                      prefs['version'], prefs['winter'], prefs['summer'])
+    return reader.writeSectorBlock(uid, card_prefs_sector, 0, card_prefs_block, keyA=card_key) == reader.OK
+
+def reselect_card(uid):
+    # Wake and select the card again after a pause (it may have been
+    # halted or lifted meanwhile); True if the same card answers
+    reader.init()
+    (stat, _) = reader.request(reader.REQALL)
+    if stat != reader.OK:
+        return False
+    (stat, found) = reader.SelectTagSN()
+    return stat == reader.OK and list(found) == list(uid)
+
+def store_card_prefs(uid, prefs):
+    # Writes prefs with a version stamp one above the card's, so other
+    # masters refresh their cache. The local copy only takes the new
+    # stamp once the card has it; until then it stays marked dirty and
+    # the next tap writes it again instead of reverting to the card.
+    current = read_card_prefs(uid)
+    version = ((current or prefs).get('version', 0) + 1) & 0xFFFF
+    stamped = {'winter': prefs['winter'], 'summer': prefs['summer'], 'version': version}
+    if not write_card_prefs(uid, stamped):
+        prefs['dirty'] = True
+        return False
+    prefs['version'] = version
+    prefs.pop('dirty', None)
+    return True
+
+def sync_card_prefs(card, uid):
+    # Refresh the cached preferences if the card carries a newer version,
+    # or write them to the card if they were changed while it could not be
+    cached = users_card_id.get(card)
+    if cached is not None and cached.get('dirty'):
+        if store_card_prefs(uid, cached):
+            print("Preferences stored on the card.")
+            save_users_to_file(users_card_id)
+        reader.stop_crypto1()
+        return
+    prefs = read_card_prefs(uid)
+    reader.stop_crypto1()
+    if prefs is None:
+        return
+    if cached is None or cached.get('version') != prefs['version']:
+        users_card_id[card] = prefs
+        save_users_to_file(users_card_id)
 
 # Load user data from json file in order to not lose them at every run
 def load_users_from_file():
@@ -63,12 +181,30 @@ def load_users_from_file():
         print(f"Failed to decode JSON, starting with an empty dictionary. Error: {e}")
     return {}
 
-def add_new_user(card, users_card_id):
+def add_new_user(card, users_card_id, uid=None):
     response = input("Do you want to add the user? (yes/no): ").strip().lower()
     if response == 'yes':
         winter_temp = int(input("Enter preferred winter temperature: "))
         summer_temp = int(input("Enter preferred summer temperature: "))
-        users_card_id[card] = {'winter': winter_temp, 'summer': summer_temp}
+        prefs = {'winter': winter_temp, 'summer': summer_temp}
+        if not prefs_fit(prefs):
+            print("Temperatures must be between -128 and 127.")
+            return
+        previous = users_card_id.get(card)
+        if previous is not None and 'version' in previous:
+            prefs['version'] = previous['version']
+        users_card_id[card] = prefs
+        if card_prefs and uid is not None:
+            if reselect_card(uid):
+                stored = store_card_prefs(uid, prefs)
+                reader.stop_crypto1()
+            else:
+                prefs['dirty'] = True
+                stored = False
+            if stored:
+                print("Preferences stored on the card.")
+            else:
+                print("Failed to store preferences on the card, they are written on its next tap.")
         save_users_to_file(users_card_id)
         print(f"Added new user {card} with temperatures: Winter {winter_temp}, Summer {summer_temp}")
 
@@ -93,8 +229,60 @@ def save_users_to_file(users_card_id):
     except OSError as e:
         print(f"Failed to save user data to file: {e}")
 
+# Tracks which cards are currently held against the reader so that one
+# physical tap produces exactly one presence event. A card that stays in
+# the field is seen again on every poll; it only counts as a new tap after
+# it has been removed and the re-arm time has passed since its last tap.
+class TapFilter:
+    def __init__(self, size=8, rearm_ms=3000, removal_ms=2500):
+        self.rearm_ms = rearm_ms
+        self.removal_ms = removal_ms
+        self._cards = [None] * size
+        self._last_seen = array('i', [0] * size)
+        self._last_tap = array('i', [0] * size)
+        self._present = bytearray(size)
+
+    def _slot(self, card):
+        # Return the slot of the card, or the least recently seen slot
+        lru = 0
+        for i in range(len(self._cards)):
+            if self._cards[i] == card:
+                return i, True
+            if self._cards[i] is None:
+                return i, False
+            if utime.ticks_diff(self._last_seen[i], self._last_seen[lru]) < 0:
+                lru = i
+        return lru, False
+
+    def seen(self, card, now):
+        # Record a read of the card, return True if it is a new tap
+        i, known = self._slot(card)
+        self._last_seen[i] = now
+        if not known:
+            self._cards[i] = card
+            self._last_tap[i] = now
+            self._present[i] = 1
+            return True
+        if self._present[i]:
+            return False
+        self._present[i] = 1
+        if utime.ticks_diff(now, self._last_tap[i]) >= self.rearm_ms:
+            self._last_tap[i] = now
+            return True
+        return False
+
+    def expire(self, now):
+        # Return one card that has left the field since the last call, or None
+        for i in range(len(self._cards)):
+            if self._present[i] and utime.ticks_diff(now, self._last_seen[i]) > self.removal_ms:
+                self._present[i] = 0
+                return self._cards[i]
+        return None
+
 users_card_id = load_users_from_file()
 at_home_users = set()
+tap_filter = TapFilter(rearm_ms=config.get('tap_rearm_ms', 3000),
+                       removal_ms=config.get('tap_removal_ms', 2500))
 last_interrupt_time = 0
 debounce_time = 200
 button_pressed = False
@@ -113,23 +301,43 @@ def connect_to_wifi():
 # Handle incoming MQTT messages
 def message_callback(topic, msg):
     global current_temperature, manual_temperature
+    messages.inc()
+    if topic == topic_trace_dump:
+        client.publish(topic_trace, tracer.dump())
+        return
     data = json.loads(msg)
     if topic == topic_temperature:
         # Receive room temperature from A/C board
         if 'room_temperature' in data:
             current_temperature = data['room_temperature']
-            print(f"Current room temperature: {current_temperature:.2f} °C")
+            if debug:
+                print(f"Current room temperature: {current_temperature:.2f} °C")
             check_temperature()
     # Receive manual temperature from heating board
     elif topic == topic_heating_manual_temp:
         if 'manual_temperature' in data:
             manual_temperature = data['manual_temperature']
-            print(f"Received manual temperature: {manual_temperature:.2f} °C")
+            if debug:
+                print(f"Received manual temperature: {manual_temperature:.2f} °C")
             check_temperature()
 
+# Publish a command, tagged with the tap that led to it if that is traced
+def send_command(topic, message):
+    global trace_tapped
+    if pending_trace is None:
+        client.publish(topic, json.dumps(message))
+        return
+    message['trace'] = pending_trace
+    start = utime.ticks_us()
+    if trace_tapped is not None:
+        tracer.record(pending_trace, DECIDE, trace_tapped, start)
+        trace_tapped = None
+    client.publish(topic, json.dumps(message))
+    tracer.record(pending_trace, PUBLISH, start)
+
 # Check the temperature and send commands to heating or cooling system
 def check_temperature():
-    global at_home_users, manual_temperature
+    global at_home_users, manual_temperature, pending_trace
     if at_home_users or mode == 'manual':
         if mode == 'manual':
             target_temp = manual_temperature
@@ -137,41 +345,63 @@ def check_temperature():
             user_prefs = next(iter(users_card_id.values()))
             target_temp = user_prefs['summer'] if current_season == 'summer' else user_prefs['winter']
 
-        if current_season == 'summer' and current_temperature > target_temp:
-            client.publish(topic_ac_control, json.dumps({'command': 'start_cooling'}))
-            print('Sent start cooling command')
-        elif current_season == 'winter' and current_temperature < target_temp:
-            client.publish(topic_heating_control, json.dumps({'command': 'start_heating'}))
-            print('Sent start heating command')
-        elif current_season == 'summer' and current_temperature <= target_temp:
-            client.publish(topic_ac_control, json.dumps({'command': 'stop_cooling'}))
-            print('Sent stop cooling command')
-        elif current_season == 'winter' and current_temperature >= target_temp:
-            client.publish(topic_heating_control, json.dumps({'command': 'stop_heating'}))
-            print('Sent stop heating command')
+        if current_season == 'summer' and current_temperature > target_temp + control_hysteresis:
+            send_command(topic_ac_control, {'command': 'start_cooling', 'target': target_temp})
+            if debug:
+                print('Sent start cooling command')
+        elif current_season == 'winter' and current_temperature < target_temp - control_hysteresis:
+            send_command(topic_heating_control, {'command': 'start_heating', 'target': target_temp})
+            if debug:
+                print('Sent start heating command')
+        elif current_season == 'summer' and current_temperature <= target_temp - control_hysteresis:
+            send_command(topic_ac_control, {'command': 'stop_cooling', 'target': target_temp})
+            if debug:
+                print('Sent stop cooling command')
+        elif current_season == 'winter' and current_temperature >= target_temp + control_hysteresis:
+            send_command(topic_heating_control, {'command': 'stop_heating', 'target': target_temp})
+            if debug:
+                print('Sent stop heating command')
+    # a traced tap is followed by one decision at most
+    pending_trace = None
 
 # Scan for RFID cards
 def scan_rfid():
-    global at_home_users
+    global at_home_users, pending_trace, trace_tapped
+    scan_start = utime.ticks_us()
+    now = utime.ticks_ms()
+    card = tap_filter.expire(now)
+    while card is not None:
+        print(f"Card {card} removed.")
+        card = tap_filter.expire(now)
     reader.init()
     (stat, tag_type) = reader.request(reader.REQIDL)
     if stat == reader.OK:
         (stat, uid) = reader.SelectTagSN()
         if stat == reader.OK:
             card = int.from_bytes(bytes(uid), "little")
+            if not tap_filter.seen(card, now):
+                # Same card still held against the reader
+                return
+            if card_prefs:
+                sync_card_prefs(card, uid)
             if card in users_card_id:
+                if tracer is not None:
+                    pending_trace = tracer.new_id()
+                    tracer.record(pending_trace, TAP, scan_start)
+                    trace_tapped = utime.ticks_us()
                 if card in at_home_users:
                     at_home_users.remove(card)
                     print(f"User {card} is leaving.")
                     if not at_home_users:
-                        client.publish(topic_ac_control, json.dumps({'command': 'stop_cooling'}))
-                        client.publish(topic_heating_control, json.dumps({'command': 'stop_heating'}))
+                        send_command(topic_ac_control, {'command': 'stop_cooling'})
+                        send_command(topic_heating_control, {'command': 'stop_heating'})
+                    pending_trace = None
                 else:
                     at_home_users.add(card)
                     print(f"User {card} identified with preferences: {users_card_id[card]}")
             else:
                 print("Unknown user")
-                add_new_user(card, users_card_id)
+                add_new_user(card, users_card_id, uid)
             print("CARD ID: " + str(card))
 
 # Handle button press for mode switching
@@ -193,39 +423,84 @@ def setup_button():
     button = Pin(button_pin, Pin.IN, Pin.PULL_DOWN)
     button.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=button_handler)
 
+def start_broker():
+    # Listens for the other boards and attaches to the broker in-process;
+    # the broker runs on this core, from the main loop (see idle), because
+    # the Wi-Fi stack must not be used from both cores
+    global local_broker
+    from umqtt.broker import Broker, LocalClient
+    local_broker = Broker()
+    local_broker.listen()
+    print('Hosting the MQTT broker')
+    return LocalClient(local_broker, client_id)
+
+def idle(ms):
+    # Sleeps between loop passes, serving the hosted broker meanwhile
+    if local_broker is None:
+        utime.sleep_ms(ms)
+        return
+    deadline = utime.ticks_add(utime.ticks_ms(), ms)
+    while utime.ticks_diff(deadline, utime.ticks_ms()) > 0:
+        local_broker.poll()
+        utime.sleep_ms(broker_poll_ms)
+
+def connect_to_broker(client):
+    client.publish = counting(client.publish, publishes)
+    client.set_callback(message_callback)
+    client.set_last_will(topic_master_status, json.dumps({'status': 'offline'}), retain=True)
+    client.connect()
+    client.subscribe(topic_temperature)
+    client.subscribe(topic_heating_manual_temp)
+    if tracer is not None:
+        client.subscribe(topic_trace_dump)
+    client.publish(topic_master_status, json.dumps({'status': 'online'}), retain=True)
+    print('Connected to MQTT broker and subscribed to topics')
+
 def main():
     global client
     
     if not connect_to_wifi():
         return
     
-    client = MQTTClient(client_id, broker)
-    client.set_callback(message_callback)
-    
+    client = start_broker() if host_broker is True else MQTTClient(client_id, broker)
     try:
-        client.connect()
-        client.subscribe(topic_temperature)
-        client.subscribe(topic_heating_manual_temp)
-        print('Connected to MQTT broker and subscribed to topics')
+        connect_to_broker(client)
     except Exception as e:
         print(f'Failed to connect to MQTT broker: {e}')
-        return
+        if host_broker != 'fallback':
+            return
+        client = start_broker()
+        connect_to_broker(client)
     
     setup_button()
     
     print("Bring TAG closer...")
     last_scan_time = utime.ticks_ms()
+    last_heartbeat_time = last_scan_time
+    last_metrics_time = last_scan_time
     scan_interval = 1000  
     while True:
+        loop_start = utime.ticks_us()
         client.check_msg()
         
         current_time = utime.ticks_ms()
         if utime.ticks_diff(current_time, last_scan_time) >= scan_interval:
+            scan_start = utime.ticks_us()
             scan_rfid()
+            rfid_poll_time.observe(utime.ticks_diff(utime.ticks_us(), scan_start))
             last_scan_time = current_time
+
+        if utime.ticks_diff(current_time, last_heartbeat_time) >= heartbeat_interval:
+            client.publish(topic_master_status, json.dumps({'status': 'online'}), retain=True)
+            last_heartbeat_time = current_time
+
+        if metrics_interval and utime.ticks_diff(current_time, last_metrics_time) >= metrics_interval:
+            client.publish(topic_metrics, registry.snapshot())
+            last_metrics_time = current_time
         
         check_temperature()
-        utime.sleep_ms(500)
+        loop_time.observe(utime.ticks_diff(utime.ticks_us(), loop_start))
+        idle(500)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,116 @@
+# Runtime metrics of a board: counters, gauges and fixed-bucket histograms.
+#
+# Every metric is created once at startup; counting or observing a value
+# only updates preallocated storage, so it allocates nothing and is safe
+# from the main loop and from IRQ handlers. snapshot() renders the whole
+# registry as one small JSON payload, which the boards publish every
+# metrics_interval_ms on $metrics/<client_id>:
+#
+#   {"uptime_ms": 60012,
+#    "counters": {"publishes": 14, "messages": 120},
+#    "gauges": {"mem_free": 151232},
+#    "histograms": {"loop_us": {"le": [250, 500, 1000], "n": [80, 30, 9, 1],
+#                               "sum": 41200, "max": 1730}}}
+#
+# Counters count since boot. Histograms cover the time since the previous
+# snapshot: n[i] counts the values <= le[i] (and above le[i - 1]), the last
+# count those above every bound.
+
+import gc
+import json
+import utime
+from array import array
+
+LOOP_US = (250, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = array('I', [0] * (len(self.bounds) + 1))
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        bounds = self.bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+class Registry:
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        # ticks_diff only spans about 6 days on MicroPython, so uptime is
+        # summed from one snapshot to the next
+        self._uptime_ms = 0
+        self._last = utime.ticks_ms()
+
+    def counter(self, name):
+        if name not in self._counters:
+            self._counters[name] = Counter()
+        return self._counters[name]
+
+    def gauge(self, name):
+        if name not in self._gauges:
+            self._gauges[name] = Gauge()
+        return self._gauges[name]
+
+    def histogram(self, name, bounds=LOOP_US):
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(bounds)
+        return self._histograms[name]
+
+    def snapshot(self):
+        # JSON payload of every metric; starts a new histogram window
+        now = utime.ticks_ms()
+        self._uptime_ms += utime.ticks_diff(now, self._last)
+        self._last = now
+        if hasattr(gc, 'mem_free'):
+            self.gauge('mem_free').set(gc.mem_free())
+        histograms = {}
+        for name, h in self._histograms.items():
+            histograms[name] = {'le': h.bounds, 'n': list(h.counts), 'sum': h.sum, 'max': h.max}
+            h.reset()
+        return json.dumps({
+            'uptime_ms': self._uptime_ms,
+            'counters': {name: c.value for name, c in self._counters.items()},
+            'gauges': {name: g.value for name, g in self._gauges.items()},
+            'histograms': histograms,
+        })
+
+
+def counting(fn, counter):
+    # fn, counting its calls, e.g. client.publish
+    def counted(*args, **kwargs):
+        counter.inc()
+        return fn(*args, **kwargs)
+    return counted
@@ -1,5 +1,23 @@
 from machine import Pin, SPI
 from os import uname
+from array import array
+from collections import OrderedDict
+
+
+def _crc_a_table():
+    # ISO/IEC 14443-3 CRC_A: reflected polynomial x^16 + x^12 + x^5 + 1
+    table = array('H', [0] * 256)
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            if c & 1:
+                c = (c >> 1) ^ 0x8408
+            else:
+                c >>= 1
+        table[i] = c
+    return table
+
+_CRC_A_TABLE = _crc_a_table()
  
  
 class MFRC522:
@@ -17,6 +35,11 @@ class MFRC522:
     PICC_ANTICOLL1 = 0x93
     PICC_ANTICOLL2 = 0x95
     PICC_ANTICOLL3 = 0x97
+
+    CRC_CHIP = 0
+    CRC_SOFT = 1
+
+    KEY_CACHE_SIZE = 8
   
  
     def __init__(self, sck, mosi, miso, rst, cs,baudrate=1000000,spi_id=0):
@@ -29,6 +52,10 @@ class MFRC522:
  
         self.rst.value(0)
         self.cs.value(1)
+        self.crc_mode = self.CRC_CHIP
+        self._keys = OrderedDict()
+        self._auth_uid = None
+        self._auth_sector = -1
         
         board = uname()[0]
  
@@ -38,7 +65,8 @@ class MFRC522:
         elif (board == 'esp8266') or (board == 'esp32'):
             self.spi = SPI(baudrate=100000, polarity=0, phase=0, sck=self.sck, mosi=self.mosi, miso=self.miso)
             self.spi.init()
-        elif board == 'rp2':
+        elif board == 'rp2' or board == 'Linux':
+            # Linux: host-side run against hal/machine.py and sim/rc522.py
             self.spi = SPI(spi_id,baudrate=baudrate,sck=self.sck, mosi= self.mosi, miso= self.miso)
         else:
             raise RuntimeError("Unsupported platform")
@@ -97,7 +125,7 @@ class MFRC522:
         while True:
             n = self._rreg(0x04)
             i -= 1
-            if ~((i != 0) and ~(n & 0x01) and ~(n & wait_irq)):
+            if not ((i != 0) and not (n & 0x01) and not (n & wait_irq)):
                 break
  
         self._cflags(0x0D, 0x80)
@@ -129,6 +157,18 @@ class MFRC522:
         return stat, recv, bits
  
     def _crc(self, data):
+        if self.crc_mode == self.CRC_SOFT:
+            return self._crc_soft(data)
+        return self._crc_chip(data)
+
+    def _crc_soft(self, data):
+        crc = 0x6363
+        table = _CRC_A_TABLE
+        for c in data:
+            crc = (crc >> 8) ^ table[(crc ^ c) & 0xFF]
+        return [crc & 0xFF, crc >> 8]
+
+    def _crc_chip(self, data):
  
         self._cflags(0x05, 0x04)
         self._sflags(0x0A, 0x80)
@@ -147,6 +187,18 @@ class MFRC522:
  
         return [self._rreg(0x22), self._rreg(0x21)]
  
+    def set_crc_mode(self, mode):
+        # Switch between the RC522 coprocessor and the host-side CRC_A.
+        # The software path is only enabled if it agrees with the chip.
+        if mode == self.CRC_SOFT:
+            probe = [self.PICC_ANTICOLL1, 0x70, 0x88, 0x04, 0xA1, 0x5E, 0x73]
+            if self._crc_soft(probe) != self._crc_chip(probe):
+                if self.DEBUG: print("software CRC_A does not match the chip")
+                self.crc_mode = self.CRC_CHIP
+                return False
+        self.crc_mode = mode
+        return True
+
     def init(self):
  
         self.reset()
@@ -159,6 +211,7 @@ class MFRC522:
         self.antenna_on()
  
     def reset(self):
+        self._auth_uid = None
         self._wreg(0x01, 0x0F)
  
     def antenna_on(self, on=True):
@@ -170,6 +223,7 @@ class MFRC522:
  
     def request(self, mode):
  
+        self._auth_uid = None
         self._wreg(0x0D, 0x07)
         (stat, recv, bits) = self._tocard(0x0C, [mode])
  
@@ -279,7 +333,7 @@ class MFRC522:
                 if status != self.OK:
                     return (self.ERR,[])
                 if self.DEBUG: print("Anticol(3) {}".format(uid))
-                if self.MFRC522_PcdSelect(uid,self.PICC_ANTICOLL3) == 0:
+                if self.PcdSelect(uid,self.PICC_ANTICOLL3) == 0:
                     return (self.ERR,[])
                 if self.DEBUG: print("PcdSelect(3) {}".format(uid))
         valid_uid.extend(uid[0:5])
@@ -295,7 +349,11 @@ class MFRC522:
     
  
     def auth(self, mode, addr, sect, ser):
-        return self._tocard(0x0E, [mode, addr] + sect + ser[:4])[0]
+        stat = self._tocard(0x0E, [mode, addr] + sect + ser[:4])[0]
+        # A rejected key only shows up as a timeout: check MFCrypto1On
+        if stat == self.OK and not (self._rreg(0x08) & 0x08):
+            stat = self.ERR
+        return stat
     
     def authKeys(self,uid,addr,keyA=None, keyB=None):
         status = self.ERR
@@ -306,7 +364,43 @@ class MFRC522:
         return status
        
  
+    def _authSector(self, uid, sector, keyA=None, keyB=None):
+        # Authenticate a sector once and reuse the session for its blocks.
+        # Keys passed in are cached per card, later calls may omit them;
+        # the cache drops the card whose keys were stored first when full.
+        card = bytes(uid)
+        if keyA is None and keyB is None:
+            keys = self._keys.get(card)
+            if keys is None:
+                return self.ERR
+            (keyA, keyB) = keys
+        elif self._keys.get(card) != (keyA, keyB):
+            if card in self._keys:
+                # new keys: the session authenticated with the old ones
+                # must not be reused
+                del self._keys[card]
+                if self._auth_uid == card:
+                    self._auth_uid = None
+            elif len(self._keys) >= self.KEY_CACHE_SIZE:
+                del self._keys[next(iter(self._keys))]
+            self._keys[card] = (keyA, keyB)
+        if self._auth_uid == card and self._auth_sector == sector:
+            return self.OK
+        self._auth_uid = None
+        if self.authKeys(uid, sector * 4 + 3, keyA, keyB) == self.ERR:
+            return self.ERR
+        self._auth_uid = card
+        self._auth_sector = sector
+        return self.OK
+
+    def forgetKeys(self, uid=None):
+        if uid is None:
+            self._keys.clear()
+        elif bytes(uid) in self._keys:
+            del self._keys[bytes(uid)]
+
     def stop_crypto1(self):
+        self._auth_uid = None
         self._cflags(0x08, 0x08)
  
     def read(self, addr):
@@ -314,7 +408,20 @@ class MFRC522:
         data = [0x30, addr]
         data += self._crc(data)
         (stat, recv, _) = self._tocard(0x0C, data)
+        if stat != self.OK:
+            self._auth_uid = None
         return stat, recv
+
+    def _readInto(self, uid, absoluteBlock, buf, offset, keyA=None, keyB=None):
+        if self._authSector(uid, absoluteBlock // 4, keyA, keyB) != self.OK:
+            return self.ERR
+        (stat, recv) = self.read(absoluteBlock)
+        if stat != self.OK or len(recv) < 16:
+            self._auth_uid = None
+            return self.ERR
+        for i in range(16):
+            buf[offset + i] = recv[i]
+        return self.OK
  
     def write(self, addr, data):
  
@@ -332,6 +439,8 @@ class MFRC522:
             (stat, recv, bits) = self._tocard(0x0C, buf)
             if not (stat == self.OK) or not (bits == 4) or not ((recv[0] & 0x0F) == 0x0A):
                 stat = self.ERR
+        if stat != self.OK:
+            self._auth_uid = None
         return stat
  
  
@@ -341,7 +450,7 @@ class MFRC522:
             return self.ERR
         if len(data) != 16:
             return self.ERR
-        if self.authKeys(uid,absoluteBlock,keyA,keyB) != self.ERR :
+        if self._authSector(uid,sector,keyA,keyB) != self.ERR :
             return self.write(absoluteBlock, data)
         return self.ERR
  
@@ -349,31 +458,79 @@ class MFRC522:
         absoluteBlock =  sector * 4 + (block % 4)
         if absoluteBlock > 63 :
             return self.ERR, None
-        if self.authKeys(uid,absoluteBlock,keyA,keyB) != self.ERR :
+        if self._authSector(uid,sector,keyA,keyB) != self.ERR :
             return self.read(absoluteBlock)
         return self.ERR, None
+
+    def readSectors(self, uid, start, end=None, keyA=None, keyB=None, buf=None, trailer=False):
+        # Read sectors start..end-1 with one authentication per sector.
+        # Data blocks (and the trailer if asked) are packed 16 bytes each
+        # into buf, which is allocated when not given.
+        end = start + 1 if end is None else end
+        blocks = 4 if trailer else 3
+        if start < 0 or end > 16 or end <= start:
+            return self.ERR, None
+        if buf is None:
+            buf = bytearray((end - start) * blocks * 16)
+        elif len(buf) < (end - start) * blocks * 16:
+            return self.ERR, None
+        offset = 0
+        for sector in range(start, end):
+            for block in range(blocks):
+                if self._readInto(uid, sector * 4 + block, buf, offset, keyA, keyB) != self.OK:
+                    return self.ERR, buf
+                offset += 16
+        return self.OK, buf
+
+    def readSector(self, uid, sector, keyA=None, keyB=None, buf=None, trailer=False):
+        return self.readSectors(uid, sector, sector + 1, keyA, keyB, buf, trailer)
+
+    def writeSectors(self, uid, start, data, keyA=None, keyB=None):
+        # Write the data blocks of consecutive sectors from start, 48 bytes
+        # per sector. Sector 0 (manufacturer block) and trailers are never
+        # written.
+        if start < 1 or len(data) == 0 or len(data) % 48:
+            return self.ERR
+        end = start + len(data) // 48
+        if end > 16:
+            return self.ERR
+        mv = memoryview(data)
+        offset = 0
+        for sector in range(start, end):
+            for block in range(3):
+                if self._authSector(uid, sector, keyA, keyB) != self.OK:
+                    return self.ERR
+                if self.write(sector * 4 + block, mv[offset:offset + 16]) != self.OK:
+                    return self.ERR
+                offset += 16
+        return self.OK
+
+    def writeSector(self, uid, sector, data, keyA=None, keyB=None):
+        return self.writeSectors(uid, sector, data, keyA, keyB)
  
     def MFRC522_DumpClassic1K(self,uid, Start=0, End=64, keyA=None, keyB=None):
+        # Read everything first (one authentication per sector), then print
+        buf = bytearray((End - Start) * 16)
+        status = self.OK
+        count = 0
         for absoluteBlock in range(Start,End):
-            status = self.authKeys(uid,absoluteBlock,keyA,keyB)
-            # Check if authenticated
+            status = self._readInto(uid, absoluteBlock, buf, count * 16, keyA, keyB)
+            if status != self.OK:
+                break
+            count += 1
+        for n in range(count):
+            absoluteBlock = Start + n
+            block = buf[n * 16:n * 16 + 16]
             print("{:02d} S{:02d} B{:1d}: ".format(absoluteBlock, absoluteBlock//4 , absoluteBlock % 4),end="")
-            if status == self.OK:                    
-                status, block = self.read(absoluteBlock)
-                if status == self.ERR:
-                    break
+            for value in block:
+                print("{:02X} ".format(value),end="")
+            print("  ",end="")
+            for value in block:
+                if (value > 0x20) and (value < 0x7f):
+                    print(chr(value),end="")
                 else:
-                    for value in block:
-                        print("{:02X} ".format(value),end="")
-                    print("  ",end="")
-                    for value in block:
-                        if (value > 0x20) and (value < 0x7f):
-                            print(chr(value),end="")
-                        else:
-                            print('.',end="")
-                    print("")
-            else:
-                break
+                    print('.',end="")
+            print("")
         if status == self.ERR:
             print("Authentication error")
             return self.ERR
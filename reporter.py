@@ -0,0 +1,37 @@
+# Decides when a slowly changing reading is worth publishing.
+#
+# A new value is reported as soon as it moves by at least `deadband` from
+# the last reported one, but never more often than every `min_interval_ms`.
+# While the value is steady it is re-sent every `heartbeat_ms` so the
+# receiver knows the sender is alive.
+
+import utime
+
+
+class ChangeReporter:
+    def __init__(self, deadband=0.2, min_interval_ms=150, heartbeat_ms=30000):
+        self.deadband = deadband
+        self.min_interval_ms = min_interval_ms
+        self.heartbeat_ms = heartbeat_ms
+        self.reset()
+
+    def reset(self):
+        # Forget the last report so the next value is sent immediately
+        self._last_value = None
+        self._last_time = 0
+
+    def due(self, value, now=None):
+        if self._last_value is None:
+            return True
+        if now is None:
+            now = utime.ticks_ms()
+        elapsed = utime.ticks_diff(now, self._last_time)
+        if elapsed < self.min_interval_ms:
+            return False
+        if abs(value - self._last_value) >= self.deadband:
+            return True
+        return elapsed >= self.heartbeat_ms
+
+    def sent(self, value, now=None):
+        self._last_value = value
+        self._last_time = utime.ticks_ms() if now is None else now
@@ -0,0 +1,279 @@
+# Temperature sensor backends behind one interface.
+#
+# Every backend samples at its own cadence, filters the result and caches
+# the latest temperature, so reading `value` never waits on the hardware:
+#
+#   start()    begin sampling (timers for the analog backends)
+#   update()   advance polled backends; call it once per main loop pass
+#   value      latest temperature in °C, or None before the first sample
+#   read()     update() and return value, forcing a first sample if needed
+#   stop()
+#
+# Sensors are described in config.json and built with make_sensor():
+#
+#   {"type": "potentiometer", "pin": 26}                 knob, 15-40 °C
+#   {"type": "thermistor", "pin": 27, "calibration": {...}}
+#   {"type": "pico_temp"}                                on-chip sensor
+#   {"type": "ds18x20", "pin": 22}                       1-Wire
+#   {"type": "lm75", "sda": 4, "scl": 5, "address": 72}  I2C (also "tmp102")
+#   {"type": "replay", "trace": "trace.csv"}             recorded trace
+#
+# Analog specs accept "rate_hz", "extra_bits", "filter" ({"median": 3,
+# "average": 10, "alpha": 0.3}) and "calibration" (see calibration.py);
+# polled specs accept "interval_ms" and "alpha" (float EMA, 1 = none).
+
+import utime
+from machine import ADC, Pin
+from filters import Pipeline, Median, MovingAverage, EMA
+from acquire import TimedSampler
+import calibration
+
+# The built-in curves are steep in ADC units (the on-chip sensor moves
+# about 0.03 °C per read_u16 count), so their tables get one entry per
+# 12-bit ADC step (8 KB) instead of the default 10 bits, whose 1.9 °C
+# steps would be coarser than the fallback thermostat's hysteresis.
+THERMISTOR = {'type': 'steinhart_hart', 'a': 1.009249522e-3, 'b': 2.378405444e-4,
+              'c': 2.019202697e-7, 'r_fixed': 10000, 'bits': 12}
+PICO_TEMP = {'type': 'pico_temp', 'bits': 12}
+
+
+def make_pipeline(spec=None):
+    spec = spec or {}
+    stages = []
+    if spec.get('median', 3) > 1:
+        stages.append(Median(spec.get('median', 3)))
+    if spec.get('average', 10) > 1:
+        stages.append(MovingAverage(spec.get('average', 10)))
+    if spec.get('alpha', 0.3) < 1:
+        stages.append(EMA(spec.get('alpha', 0.3)))
+    return Pipeline(*stages)
+
+
+class AnalogSensor:
+    # ADC channel sampled in timer-paced oversampled bursts, filtered in
+    # raw units and converted through a calibration table on read
+    def __init__(self, pin, curve=None, rate_hz=20, extra_bits=1, pipeline=None):
+        self.adc = ADC(pin)
+        self.pipeline = pipeline if pipeline is not None else make_pipeline()
+        self.sampler = TimedSampler(self.adc, rate_hz=rate_hz, extra_bits=extra_bits,
+                                    pipeline=self.pipeline)
+        self.calibration = calibration.from_config(curve)
+
+    def start(self):
+        self.sampler.start()
+
+    def stop(self):
+        self.sampler.stop()
+
+    def update(self, now=None):
+        pass
+
+    @property
+    def raw(self):
+        return self.pipeline.value
+
+    @property
+    def value(self):
+        raw = self.pipeline.value
+        if raw is None:
+            return None
+        return self.calibration.temperature(raw)
+
+    def read(self):
+        if self.pipeline.value is None:
+            self.sampler.sample()
+        return self.value
+
+
+class PolledSensor:
+    # Base for backends read from the main loop every interval_ms.
+    # Subclasses implement _sample(now) returning a temperature or None
+    # (nothing new yet) and must not block for more than a bus transfer.
+    def __init__(self, interval_ms=1000, alpha=1.0):
+        self.interval_ms = interval_ms
+        self.alpha = alpha
+        self.value = None
+        self.errors = 0
+        self._next = utime.ticks_ms()
+
+    def start(self):
+        self._next = utime.ticks_ms()
+
+    def stop(self):
+        pass
+
+    def update(self, now=None):
+        if now is None:
+            now = utime.ticks_ms()
+        if utime.ticks_diff(now, self._next) < 0:
+            return
+        self._next = utime.ticks_add(self._next, self.interval_ms)
+        if utime.ticks_diff(now, self._next) >= 0:
+            # fell behind (e.g. a long reconnect), do not try to catch up
+            self._next = utime.ticks_add(now, self.interval_ms)
+        try:
+            t = self._sample(now)
+        except OSError:
+            self.errors += 1
+            return
+        if t is not None:
+            self._store(t)
+
+    def _store(self, t):
+        if self.value is None or self.alpha >= 1:
+            self.value = t
+        else:
+            self.value += self.alpha * (t - self.value)
+
+    def read(self):
+        if self.value is None:
+            # take the first sample straight away
+            self._next = utime.ticks_ms()
+        self.update()
+        return self.value
+
+    def _sample(self, now):
+        raise NotImplementedError
+
+
+class DS18X20Sensor(PolledSensor):
+    # 1-Wire sensor. A conversion takes up to 750 ms, so it is started on
+    # one pass and the result collected on a later one.
+    CONVERSION_MS = 750
+
+    def __init__(self, pin, interval_ms=2000, alpha=1.0, rom=None):
+        import onewire
+        import ds18x20
+        super().__init__(max(interval_ms, self.CONVERSION_MS), alpha)
+        self._ds = ds18x20.DS18X20(onewire.OneWire(Pin(pin)))
+        if rom is None:
+            roms = self._ds.scan()
+            if not roms:
+                raise OSError("no DS18X20 found on pin {}".format(pin))
+            rom = roms[0]
+        self._rom = rom
+        self._started = None
+
+    def update(self, now=None):
+        if now is None:
+            now = utime.ticks_ms()
+        if self._started is not None and utime.ticks_diff(now, self._started) >= self.CONVERSION_MS:
+            self._started = None
+            try:
+                self._store(self._ds.read_temp(self._rom))
+            except Exception:
+                self.errors += 1
+        super().update(now)
+
+    def read(self):
+        if self.value is None and self._started is None:
+            # blocking first conversion so callers get a value at boot
+            self._ds.convert_temp()
+            utime.sleep_ms(self.CONVERSION_MS)
+            self.value = self._ds.read_temp(self._rom)
+        self.update()
+        return self.value
+
+    def _sample(self, now):
+        if self._started is None:
+            self._ds.convert_temp()
+            self._started = now
+        return None
+
+
+class I2CSensor(PolledSensor):
+    # LM75 / TMP102 style sensor: a left-aligned two's complement
+    # temperature in register 0. `bits` is the resolution of the part.
+    PARTS = {'lm75': 9, 'lm75a': 11, 'tmp102': 12}
+
+    def __init__(self, i2c, address=0x48, bits=9, interval_ms=1000, alpha=1.0):
+        super().__init__(interval_ms, alpha)
+        self._i2c = i2c
+        self._address = address
+        self._shift = 16 - bits
+        self._scale = 1 / (1 << (bits - 8))
+        self._buf = bytearray(2)
+
+    def _sample(self, now):
+        self._i2c.readfrom_mem_into(self._address, 0, self._buf)
+        raw = (self._buf[0] << 8) | self._buf[1]
+        if raw & 0x8000:
+            raw -= 0x10000
+        return (raw >> self._shift) * self._scale
+
+
+class ReplaySensor(PolledSensor):
+    # Plays back a recorded trace of (ms since start, °C) pairs, e.g. for
+    # running the boards against the same data on the host. A trace file
+    # has one "ms,temperature" pair per line.
+    def __init__(self, trace, interval_ms=100, alpha=1.0, loop=True):
+        super().__init__(interval_ms, alpha)
+        if isinstance(trace, str):
+            trace = load_trace(trace)
+        if not trace:
+            raise ValueError("empty trace")
+        self._trace = trace
+        self._loop = loop
+        self._index = 0
+        self._t0 = None
+
+    def start(self):
+        super().start()
+        self._t0 = utime.ticks_ms()
+        self._index = 0
+
+    def _sample(self, now):
+        if self._t0 is None:
+            self._t0 = now
+        elapsed = utime.ticks_diff(now, self._t0)
+        trace = self._trace
+        end = trace[-1][0]
+        if elapsed > end and self._loop and end > 0:
+            elapsed %= end
+            self._t0 = utime.ticks_add(now, -elapsed)
+            self._index = 0
+        i = self._index
+        while i + 1 < len(trace) and trace[i + 1][0] <= elapsed:
+            i += 1
+        self._index = i
+        return trace[i][1]
+
+
+def load_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            (t, value) = line.split(',')
+            trace.append((int(t), float(value)))
+    return trace
+
+
+def make_sensor(spec):
+    kind = spec.get('type', 'potentiometer')
+    if kind in ('potentiometer', 'thermistor', 'pico_temp'):
+        if kind == 'pico_temp':
+            (pin, curve) = (4, PICO_TEMP)
+        elif kind == 'thermistor':
+            (pin, curve) = (spec.get('pin', 27), THERMISTOR)
+        else:
+            (pin, curve) = (spec.get('pin', 26), None)
+        return AnalogSensor(
+            pin, spec.get('calibration', curve),
+            rate_hz=spec.get('rate_hz', 20), extra_bits=spec.get('extra_bits', 1),
+            pipeline=make_pipeline(spec.get('filter')))
+    if kind == 'ds18x20':
+        return DS18X20Sensor(spec.get('pin', 22), spec.get('interval_ms', 2000),
+                             spec.get('alpha', 1.0))
+    if kind in I2CSensor.PARTS:
+        from machine import I2C
+        i2c = I2C(spec.get('bus', 0), sda=Pin(spec.get('sda', 4)), scl=Pin(spec.get('scl', 5)),
+                  freq=spec.get('freq', 100000))
+        return I2CSensor(i2c, spec.get('address', 0x48), spec.get('bits', I2CSensor.PARTS[kind]),
+                         spec.get('interval_ms', 1000), spec.get('alpha', 1.0))
+    if kind == 'replay':
+        return ReplaySensor(spec['trace'], spec.get('interval_ms', 100), spec.get('alpha', 1.0),
+                            spec.get('loop', True))
+    raise ValueError("unknown sensor type: {}".format(kind))
@@ -0,0 +1,4 @@
+"""
+Host-side simulators of the smart home hardware. They plug into the
+stand-ins from :mod:`hal` and run on CPython only.
+"""
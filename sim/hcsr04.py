@@ -0,0 +1,69 @@
+"""
+Simulator of the HC-SR04 ultrasonic distance sensor on the host-side
+machine module. It watches the trigger pin and answers every trigger
+pulse with an echo pulse on the echo pin, timed on the virtual clock::
+
+    import hal
+    hal.install()
+
+    from sim.hcsr04 import HCSR04
+
+    sensor = HCSR04(trigger=3, echo=2)
+    sensor.distance = 0.5            # metres, or a callable returning it
+
+A distance of None (or beyond max_range) produces no echo. ``outliers``
+is the fraction of pings answered with a random spurious echo.
+"""
+import random
+
+from machine import Pin, Timer
+
+SPEED_OF_SOUND = 343.0
+# time from the end of the trigger pulse to the start of the echo
+# (8 cycles of 40 kHz burst plus the module's own delay)
+ECHO_DELAY_US = 450
+
+
+class HCSR04:
+    def __init__(self, trigger, echo, distance=1.0, max_range=4.0, outliers=0.0, seed=1):
+        self.echo = echo
+        self.distance = distance
+        self.max_range = max_range
+        self.outliers = outliers
+        self.pings = 0
+        self._random = random.Random(seed)
+        self._busy = False
+        self._start = Timer()
+        self._end = Timer()
+        self._trigger = trigger
+        Pin.watch(trigger, self._trigger_change)
+
+    def close(self):
+        Pin._watchers[self._trigger].remove(self._trigger_change)
+        self._start.deinit()
+        self._end.deinit()
+
+    def _current(self):
+        d = self.distance
+        return d() if callable(d) else d
+
+    def _trigger_change(self, level):
+        if level or self._busy:
+            return
+        # falling edge of the trigger pulse: send a burst
+        self.pings += 1
+        d = self._current()
+        if self.outliers and self._random.random() < self.outliers:
+            d = self._random.uniform(0.02, self.max_range)
+        if d is None or d > self.max_range:
+            return
+        width_us = int(2 * d / SPEED_OF_SOUND * 1000000)
+        self._busy = True
+        self._start.init(mode=Timer.ONE_SHOT, period=ECHO_DELAY_US, tick_hz=1000000,
+                         callback=lambda t: Pin._set_level(self.echo, 1))
+        self._end.init(mode=Timer.ONE_SHOT, period=ECHO_DELAY_US + width_us, tick_hz=1000000,
+                       callback=self._echo_end)
+
+    def _echo_end(self, timer):
+        Pin._set_level(self.echo, 0)
+        self._busy = False
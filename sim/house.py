@@ -0,0 +1,586 @@
+"""
+Discrete-event simulation of the whole house: the three unmodified board
+scripts on one virtual clock, talking MQTT through umqtt.broker in-process,
+with a thermal model of the room behind their ADCs and a resident tapping
+an RFID card at the master's reader::
+
+    python -m sim.house --days 2 --policy original --policy hysteresis
+
+Each board is imported with private copies of every project module
+(picozero, sensors, umqtt, the hal/ stand-ins for machine, network, ...),
+so their pins, timers and singletons do not mix; only utime, and so the
+clock, is shared. Every board runs its main() in a thread of its own, but
+only one thread runs at a time: a board that sleeps hands over to the
+kernel, which moves the clock to the next event (a board waking up, a
+machine.Timer, a packet arriving, a thermal step or a card tap).
+
+A policy is a set of config.json overrides, e.g. the master's
+control_hysteresis or the relays' lockouts (see POLICIES). For each
+policy the report gives the end-to-end command latency (from the master's
+command reaching the broker to the relay switching), MQTT message counts,
+relay cycles, energy and how far the room strayed from the resident's
+preferred temperature while they were home.
+
+--stretch N makes every board sleep N times longer than it asks for. The
+boards then poll less often, which trades latency fidelity for speed.
+"""
+import argparse
+import collections
+import heapq
+import importlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+
+import hal
+hal.install()
+
+import utime
+import umqtt.broker as mqtt
+from sim.rc522 import RC522, VirtualCard
+from sim.thermal import DAY, Outdoor, Room
+from tools import trace_report
+
+SEASONS = {
+    # local midnight of the first simulated day, outdoor climate
+    'winter': ((2024, 1, 15), Outdoor(mean=2.0, swing=4.0)),
+    'summer': ((2024, 7, 15), Outdoor(mean=27.0, swing=6.0)),
+}
+
+CONFIG = {
+    'ssid': 'house',
+    'password': 'house',
+    'broker_ip': 'broker',
+}
+
+POLICIES = {
+    # the master switching at the target and relays without lockouts,
+    # as the boards worked before actuators.py
+    'original': {'control_hysteresis': 0, 'heating_relay': {'pin': 15}, 'ac_relay': {'pin': 15}},
+    # relay lockouts from the boards' defaults
+    'lockouts': {'control_hysteresis': 0},
+    # lockouts and a 0.5 °C deadband in the master
+    'hysteresis': {'control_hysteresis': 0.5},
+}
+
+CARD_UID = b'\x12\x34\x56\x78'
+RELAY_PIN = 15
+RFID_CS = 17
+TAP_MS = 1500
+
+
+class Stop(BaseException):
+    # Unwinds a board thread at the end of a run
+    pass
+
+
+###############################################################################
+# KERNEL
+###############################################################################
+
+class Board:
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+        self.machine = None
+        self.lock = threading.Lock()
+        self.lock.acquire()
+        self.done = False
+        self.error = None
+        self.relay = []     # (time_us, level) of the relay pin
+
+
+class Kernel:
+    def __init__(self, stretch=1):
+        self.stretch = stretch
+        self.events = []
+        self.current = None
+        self.stopping = False
+        self.boards = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._lock.acquire()
+
+    def at(self, t_us, fn, *args):
+        self._seq += 1
+        heapq.heappush(self.events, (t_us, self._seq, fn, args))
+
+    def sleep(self, us):
+        # utime._sleeper: a board asked to sleep
+        self.wait(us * self.stretch)
+
+    def wait(self, us):
+        # Suspends the calling board thread for `us` of virtual time
+        if self.stopping:
+            raise Stop
+        board = self.current
+        self.at(utime._now_us + max(us, 1), self._resume, board)
+        self.current = None
+        self._lock.release()
+        board.lock.acquire()
+        if self.stopping:
+            raise Stop
+
+    def _resume(self, board):
+        if board.done:
+            return
+        self.current = board
+        board.lock.release()
+        self._lock.acquire()
+
+    def _main(self, board):
+        board.lock.acquire()
+        try:
+            if not self.stopping:
+                board.module.main()
+        except Stop:
+            pass
+        except BaseException:
+            board.error = traceback.format_exc()
+        finally:
+            board.done = True
+            self.current = None
+            self._lock.release()
+
+    def start(self, board):
+        self.boards.append(board)
+        threading.Thread(target=self._main, args=(board, ), daemon=True).start()
+        self.at(utime._now_us, self._resume, board)
+
+    def run(self, end_us):
+        while True:
+            timer = utime._next_timer()
+            event = self.events[0][0] if self.events else None
+            if timer is not None and (event is None or timer._due_us <= event):
+                if timer._due_us > end_us:
+                    break
+                utime._now_us = max(utime._now_us, timer._due_us)
+                # timer callbacks run here, as interrupts would
+                utime._firing = True
+                try:
+                    timer._fire()
+                finally:
+                    utime._firing = False
+                continue
+            if event is None or event > end_us:
+                break
+            t, _, fn, args = heapq.heappop(self.events)
+            utime._now_us = max(utime._now_us, t)
+            fn(*args)
+        utime._now_us = max(utime._now_us, end_us)
+
+    def stop(self):
+        self.stopping = True
+        for board in self.boards:
+            if not board.done:
+                self._resume(board)
+
+
+###############################################################################
+# NETWORK
+###############################################################################
+
+class Connection(mqtt.Connection):
+    # One board's connection to the broker; what the broker sends reaches
+    # the board latency_us later
+    def __init__(self, latency_us):
+        super().__init__()
+        self.latency_us = latency_us
+        self.rx = collections.deque()   # (arrival_us, bytes) for the board
+        self.buffer = b''
+        self.open = True
+
+    def send(self, data):
+        if self.open:
+            self.rx.append((utime._now_us + self.latency_us, bytes(data)))
+
+    def close(self):
+        self.open = False
+
+    def take(self, n, now):
+        out = bytearray()
+        while len(out) < n:
+            if not self.buffer:
+                if not self.rx or self.rx[0][0] > now:
+                    break
+                self.buffer = self.rx.popleft()[1]
+            k = n - len(out)
+            out += self.buffer[:k]
+            self.buffer = self.buffer[k:]
+        return bytes(out)
+
+    def next_arrival(self):
+        return self.rx[0][0] if self.rx else None
+
+
+class Broker(mqtt.Broker):
+    # umqtt.broker, logging every message published through it
+    def __init__(self, latency_us=2000):
+        super().__init__()
+        self.latency_us = latency_us
+        self.history = []       # (time_us, topic, payload)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.history.append((utime._now_us, bytes(topic), bytes(payload)))
+        super().publish(topic, payload, qos, retain)
+
+    def arrived(self, conn, data):
+        if not self.received(conn, data):
+            conn.close()
+
+    def closed(self, conn):
+        self.disconnected(conn)
+        conn.close()
+
+
+def socket_module(kernel, broker):
+    # A usocket module whose sockets connect to `broker`, whatever the
+    # address
+    module = types.ModuleType('usocket')
+    module.AF_INET = 2
+    module.SOCK_STREAM = 1
+
+    def getaddrinfo(host, port, *args):
+        return [(module.AF_INET, module.SOCK_STREAM, 0, '', (host, port))]
+
+    class socket:
+        def __init__(self, *args):
+            self._conn = None
+            self._blocking = True
+
+        def connect(self, address):
+            self._conn = Connection(broker.latency_us)
+
+        def setblocking(self, flag):
+            self._blocking = bool(flag)
+
+        def settimeout(self, value):
+            self._blocking = value is None or value > 0
+
+        def write(self, buf, length=None):
+            if isinstance(buf, str):
+                buf = buf.encode()
+            data = bytes(buf if length is None else memoryview(buf)[:length])
+            if not self._conn.open:
+                raise OSError(104)
+            kernel.at(utime._now_us + broker.latency_us, broker.arrived, self._conn, data)
+            return len(data)
+
+        def read(self, n):
+            conn = self._conn
+            data = conn.take(n, utime._now_us)
+            if not self._blocking:
+                return data or None
+            while len(data) < n and conn.open:
+                arrival = conn.next_arrival()
+                kernel.wait(1000 if arrival is None else arrival - utime._now_us)
+                data += conn.take(n - len(data), utime._now_us)
+            return data
+
+        def close(self):
+            if self._conn is not None:
+                kernel.at(utime._now_us + broker.latency_us, broker.closed, self._conn)
+
+    module.socket = socket
+    module.getaddrinfo = getaddrinfo
+    return module
+
+
+###############################################################################
+# BOARDS
+###############################################################################
+
+def _private(name, module):
+    # Modules every board gets its own copy of: the project's, lib/ and the
+    # hal/ stand-ins except utime
+    if name in ('utime', 'time', 'hal', 'usocket') or name.startswith(('hal.', 'sim')):
+        return name == 'usocket'
+    path = getattr(module, '__file__', None) or ''
+    return os.path.abspath(path).startswith(hal.ROOT + os.sep)
+
+
+def load_board(name, usocket, setup=None):
+    # Imports board script `name` with private modules; setup(board) runs
+    # first, with board.machine already imported
+    board = Board(name)
+    saved = {n: m for n, m in sys.modules.items() if _private(n, m)}
+    for n in saved:
+        del sys.modules[n]
+    sys.modules['usocket'] = usocket
+    try:
+        board.machine = importlib.import_module('machine')
+        if setup is not None:
+            setup(board)
+        board.module = importlib.import_module(name)
+    finally:
+        for n, m in list(sys.modules.items()):
+            if _private(n, m):
+                del sys.modules[n]
+        sys.modules.update(saved)
+    return board
+
+
+def _watch_relay(board):
+    board.machine.Pin.watch(RELAY_PIN, lambda level: board.relay.append((utime._now_us, level)))
+
+
+def _relay_at(board):
+    return bool(board.relay and board.relay[-1][1])
+
+
+def _adc_linear(t, low=15.0, high=40.0):
+    # The potentiometer calibration (calibration.DEFAULT) backwards
+    return (t - low) / (high - low) * 65535
+
+
+def _adc_pico_temp(t):
+    # picozero.pico_temp_conversion backwards, 3.3 V reference
+    return (0.706 - (t - 27) * 0.001721) / 3.3 * 65535
+
+
+###############################################################################
+# SIMULATION
+###############################################################################
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def _command_latencies(broker, boards):
+    # From the first command asking for a new relay state to the relay
+    # reaching it, per actuator board
+    topics = {b'heating_control': boards['heating'], b'ac_control': boards['ac']}
+    latencies = []
+    for topic, board in topics.items():
+        commands = [(t, json.loads(p).get('command', '').startswith('start'))
+                    for t, top, p in broker.history if top == topic]
+        asked = None
+        wanted = None
+        relay = collections.deque(board.relay)
+        for t, on in commands + [(None, None)]:
+            while relay and asked is not None and (t is None or relay[0][0] <= t):
+                switched, level = relay.popleft()
+                if switched >= asked and bool(level) == wanted:
+                    latencies.append((switched - asked) / 1000)
+                    asked = None
+            if t is not None and on != wanted:
+                wanted = on
+                asked = t
+    return latencies
+
+
+def simulate(policy=None, days=1.0, season='winter', stretch=1, latency_ms=2.0,
+             preferences=(21, 24), taps=((8, 0), (17, 30)), heater_w=5000.0,
+             cooler_w=3500.0, cooler_cop=3.0, room=None, step_s=10, seed=1, quiet=True,
+             trace_size=0):
+    """
+    Runs the house for `days` of virtual time under `policy` (config.json
+    overrides) and returns a report dict. The resident taps the card 10 s
+    in (arriving home) and then at each (hour, minute) of `taps` every day.
+    With trace_size the boards trace the taps (see tracing.py) and the
+    report holds the per-hop latencies of every chain (trace_report.chains).
+    """
+    config = dict(CONFIG)
+    config.update(policy or {})
+    if trace_size:
+        config['trace_size'] = trace_size
+    if stretch > 1:
+        # the master's tap filter windows have to outlast its stretched loop
+        config.setdefault('tap_rearm_ms', 3000 * stretch)
+        config.setdefault('tap_removal_ms', 2500 * stretch)
+    date, outdoor = SEASONS[season]
+    room = room or Room(temperature=preferences[0 if season == 'winter' else 1] - 3, outdoor=outdoor)
+    # sensor noise, drawn up front: the ADCs are read tens of times a second
+    rng = random.Random(seed)
+    noise = [rng.gauss(0, 0.05) for _ in range(4093)]
+    draws = [0]
+    card = int.from_bytes(CARD_UID, 'little')
+    target = preferences[0 if season == 'winter' else 1]
+
+    utime._now_us = 0
+    del utime._timers[:]
+    utime._epoch = int(time.mktime(date + (0, 0, 0, 0, 0, -1)))
+    utime._pace = None
+
+    kernel = Kernel(stretch)
+    broker = Broker(int(latency_ms * 1000))
+    usocket = socket_module(kernel, broker)
+    rc522 = RC522()
+    tag = VirtualCard(CARD_UID)
+
+    def reading(convert):
+        def read():
+            draws[0] += 1
+            return convert(room.temperature + noise[draws[0] % len(noise)])
+        return read
+
+    def setup_master(board):
+        board.machine.SPI.attach(0, rc522, cs=RFID_CS)
+
+    def setup_heating(board):
+        _watch_relay(board)
+        board.machine.ADC.feed(0, _adc_linear(target))     # manual setpoint knob
+        board.machine.ADC.feed(4, reading(_adc_pico_temp))
+
+    def setup_ac(board):
+        _watch_relay(board)
+        board.machine.ADC.feed(0, reading(_adc_linear))
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.path.join(scratch, 'config.json'), 'w') as f:
+            json.dump(config, f)
+        with open(os.path.join(scratch, 'users_card_id.json'), 'w') as f:
+            json.dump({str(card): {'winter': preferences[0], 'summer': preferences[1]}}, f)
+        os.chdir(scratch)
+        if quiet:
+            sys.stdout = io.StringIO()
+        try:
+            boards = {
+                'master': load_board('master_board', usocket, setup_master),
+                'heating': load_board('heating_system_board', usocket, setup_heating),
+                'ac': load_board('air_conditioner_board', usocket, setup_ac),
+            }
+            for board in boards.values():
+                kernel.start(board)
+
+            state = {'home': False, 'comfort': 0.0, 'home_s': 0.0, 'heat_j': 0.0, 'cool_j': 0.0}
+
+            def tap():
+                # held long enough for the master's (stretched) loop to see it
+                rc522.place(tag)
+                kernel.at(utime._now_us + TAP_MS * stretch * 1000, rc522.remove, tag)
+                state['home'] = not state['home']
+
+            def step():
+                heating = _relay_at(boards['heating'])
+                cooling = _relay_at(boards['ac'])
+                power = (heater_w if heating else 0.0) - (cooler_w if cooling else 0.0)
+                if state['home']:
+                    state['comfort'] += abs(room.temperature - target) * step_s
+                    state['home_s'] += step_s
+                room.step(step_s, power)
+                state['heat_j'] += (heater_w if heating else 0.0) * step_s
+                state['cool_j'] += (cooler_w / cooler_cop if cooling else 0.0) * step_s
+                kernel.at(utime._now_us + step_s * 1000000, step)
+
+            kernel.at(0, step)
+            kernel.at(10 * 1000000, tap)    # the resident is at home
+            for day in range(int(days) + 1):
+                for hour, minute in taps:
+                    t = (day * DAY + hour * 3600 + minute * 60) * 1000000
+                    kernel.at(t, tap)
+
+            end_us = int(days * DAY * 1000000)
+            utime._sleeper = kernel.sleep
+            started = time.perf_counter()
+            try:
+                kernel.run(end_us)
+            finally:
+                host_s = time.perf_counter() - started
+                utime._sleeper = None
+                kernel.stop()
+        finally:
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+    latencies = _command_latencies(broker, boards)
+    chains = None
+    if trace_size:
+        # one shared clock: every ring arrives the moment it is published
+        chains = trace_report.chains({name: (bytes(board.module.tracer.dump()), utime.ticks_us())
+                                      for name, board in boards.items()})
+    topics = collections.Counter(topic.decode() for _, topic, _ in broker.history)
+    return {
+        'days': days,
+        'season': season,
+        'stretch': stretch,
+        'host_s': round(host_s, 2),
+        'speedup': round(days * DAY / host_s),
+        'messages': len(broker.history),
+        'delivered': broker.delivered,
+        'topics': dict(topics),
+        'commands': topics['heating_control'] + topics['ac_control'],
+        'latency_ms': {
+            'n': len(latencies),
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'max': max(latencies) if latencies else None,
+        },
+        'cycles': {
+            'heating': sum(1 for _, level in boards['heating'].relay if level),
+            'cooling': sum(1 for _, level in boards['ac'].relay if level),
+        },
+        'energy_kwh': {
+            'heating': round(state['heat_j'] / 3.6e6, 2),
+            'cooling': round(state['cool_j'] / 3.6e6, 2),
+        },
+        'comfort_error_c': round(state['comfort'] / state['home_s'], 3) if state['home_s'] else None,
+        'errors': {name: board.error for name, board in boards.items() if board.error},
+        'trace': chains,
+    }
+
+
+def _format(name, report):
+    latency = report['latency_ms']
+    ms = lambda v: '-' if v is None else '{:.0f}'.format(v)
+    return "{:<12} {:>8} {:>9} {:>8} {:>7} {:>7} {:>7} {:>7} {:>8} {:>8} {:>7} {:>8}".format(
+        name, report['messages'], report['commands'], latency['n'], ms(latency['p50']),
+        ms(latency['p95']), ms(latency['max']),
+        report['cycles']['heating'] + report['cycles']['cooling'],
+        report['energy_kwh']['heating'] + report['energy_kwh']['cooling'],
+        report['comfort_error_c'], report['host_s'], report['speedup'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--policy', action='append', metavar='NAME[=JSON]',
+                        help="a policy from POLICIES, or NAME={...config overrides...}; repeatable")
+    parser.add_argument('--days', type=float, default=1.0)
+    parser.add_argument('--season', choices=sorted(SEASONS), default='winter')
+    parser.add_argument('--stretch', type=int, default=1, help="board sleeps last N times longer")
+    parser.add_argument('--latency-ms', type=float, default=2.0, help="network latency each way")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trace', type=int, default=0, metavar='SPANS',
+                        help="trace the taps with rings of SPANS spans and report the hops")
+    parser.add_argument('--json', action='store_true', help="print the reports as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the boards' output")
+    args = parser.parse_args(argv)
+
+    policies = []
+    for spec in args.policy or sorted(POLICIES):
+        name, _, overrides = spec.partition('=')
+        policies.append((name, json.loads(overrides) if overrides else POLICIES[name]))
+
+    reports = {}
+    if not args.json:
+        print("{:<12} {:>8} {:>9} {:>8} {:>7} {:>7} {:>7} {:>7} {:>8} {:>8} {:>7} {:>8}".format(
+            "policy", "messages", "commands", "switches", "p50 ms", "p95 ms", "max ms",
+            "cycles", "kWh", "comfort", "host s", "speedup"))
+    for name, policy in policies:
+        report = simulate(policy, args.days, args.season, args.stretch, args.latency_ms,
+                          seed=args.seed, quiet=not args.verbose, trace_size=args.trace)
+        reports[name] = report
+        if not args.json:
+            print(_format(name, report))
+            for board, error in report['errors'].items():
+                print("  {} failed:\n{}".format(board, error))
+            if report['trace'] is not None:
+                trace_report.report(report['trace'])
+    if args.json:
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
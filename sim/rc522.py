@@ -0,0 +1,402 @@
+"""
+Register-level simulator of the NXP MFRC522 (RC522) reader with virtual
+ISO/IEC 14443A cards (MIFARE Classic 1K memory layout).
+
+The simulator is an SPI device for the host-side machine module. Attach it
+before the driver is created::
+
+    import hal
+    hal.install()
+
+    from machine import SPI
+    from sim.rc522 import RC522, VirtualCard
+
+    rc522 = RC522()
+    SPI.attach(0, rc522, cs=17)
+    rc522.place(VirtualCard(b'\\x12\\x34\\x56\\x78'))
+
+It models the register file, the 64-byte FIFO, the CRC coprocessor, the
+Transceive and MFAuthent commands and the RF field (cards reset whenever
+the antenna is switched off). Crypto1 encryption is not modelled: an
+authenticated sector is simply readable and writable.
+"""
+
+# Registers
+CommandReg = 0x01
+ComIEnReg = 0x02
+ComIrqReg = 0x04
+DivIrqReg = 0x05
+ErrorReg = 0x06
+Status2Reg = 0x08
+FIFODataReg = 0x09
+FIFOLevelReg = 0x0A
+ControlReg = 0x0C
+BitFramingReg = 0x0D
+ModeReg = 0x11
+TxControlReg = 0x14
+TxASKReg = 0x15
+CRCResultRegH = 0x21
+CRCResultRegL = 0x22
+VersionReg = 0x37
+
+# Commands
+IDLE_CMD = 0x00
+CALC_CRC = 0x03
+TRANSCEIVE = 0x0C
+MF_AUTHENT = 0x0E
+SOFT_RESET = 0x0F
+
+# ComIrqReg bits
+TIMER_IRQ = 0x01
+IDLE_IRQ = 0x10
+RX_IRQ = 0x20
+TX_IRQ = 0x40
+
+# ErrorReg bits
+PROTOCOL_ERR = 0x01
+COLL_ERR = 0x08
+
+FIFO_SIZE = 64
+
+# Card states
+IDLE, READY, ACTIVE, HALT = range(4)
+
+SEL = (0x93, 0x95, 0x97)
+ACK = 0x0A
+NAK = 0x04
+
+
+def crc_a(data):
+    # ISO/IEC 14443-3 CRC_A, computed bit by bit (independent of the
+    # driver's table so the two can be checked against each other)
+    crc = 0x6363
+    for b in data:
+        b ^= crc & 0xFF
+        b = (b ^ (b << 4)) & 0xFF
+        crc = (crc >> 8) ^ (b << 8) ^ (b << 3) ^ (b >> 4)
+    return crc
+
+
+def with_crc(data):
+    crc = crc_a(data)
+    return bytes(data) + bytes((crc & 0xFF, crc >> 8))
+
+
+def crc_ok(frame):
+    return len(frame) > 2 and with_crc(frame[:-2]) == bytes(frame)
+
+
+def bcc(data):
+    x = 0
+    for b in data:
+        x ^= b
+    return x
+
+
+class VirtualCard:
+    """
+    An ISO/IEC 14443A card. 4, 7 and 10 byte UIDs are supported and the
+    memory is laid out as a MIFARE Classic 1K (16 sectors of 4 blocks).
+    """
+
+    def __init__(self, uid, atqa=None, sak=0x08, key_a=b'\xff' * 6, key_b=b'\xff' * 6):
+        if len(uid) not in (4, 7, 10):
+            raise ValueError("UID must be 4, 7 or 10 bytes")
+        self.uid = bytes(uid)
+        self.sak = sak
+        if atqa is None:
+            atqa = {4: b'\x04\x00', 7: b'\x44\x00', 10: b'\x84\x00'}[len(uid)]
+        self.atqa = bytes(atqa)
+        self.memory = bytearray(1024)
+        if len(uid) == 4:
+            self.memory[0:8] = self.uid + bytes((bcc(self.uid), sak)) + self.atqa[::-1]
+        else:
+            self.memory[0:len(uid)] = self.uid
+        for sector in range(16):
+            self.memory[sector * 64 + 48:sector * 64 + 64] = (
+                bytes(key_a) + b'\xff\x07\x80\x69' + bytes(key_b))
+        self.power_off()
+
+    def power_off(self):
+        self.state = IDLE
+        self.level = 0
+        self.auth_sector = -1
+        self._write_block = None
+
+    def block(self, addr):
+        return bytes(self.memory[addr * 16:addr * 16 + 16])
+
+    def _cascade(self, level):
+        uid = self.uid
+        levels = len(uid) // 3
+        if level + 1 < levels:
+            return bytes((0x88,)) + uid[level * 3:level * 3 + 3]
+        return uid[level * 3:level * 3 + 4]
+
+    def _last_level(self):
+        return self.level + 1 == len(self.uid) // 3
+
+    def authenticate(self, key_type, addr, key):
+        if self.state != ACTIVE:
+            return False
+        trailer = (addr // 4) * 64 + 48
+        if key_type == 0x60:
+            expected = self.memory[trailer:trailer + 6]
+        else:
+            expected = self.memory[trailer + 10:trailer + 16]
+        if bytes(key) != bytes(expected):
+            self.state = IDLE
+            return False
+        self.auth_sector = addr // 4
+        return True
+
+    def respond(self, frame, last_bits):
+        # Return (response, valid bits in the last byte) or None for silence
+        if last_bits == 7 and len(frame) == 1:
+            if (frame[0] == 0x26 and self.state == IDLE) or \
+               (frame[0] == 0x52 and self.state in (IDLE, HALT)):
+                self.state = READY
+                self.level = 0
+                return self.atqa, 0
+            return None
+
+        if self.state == READY:
+            if len(frame) == 2 and frame[0] == SEL[self.level] and frame[1] == 0x20:
+                part = self._cascade(self.level)
+                return part + bytes((bcc(part),)), 0
+            if len(frame) == 9 and frame[0] == SEL[self.level] and frame[1] == 0x70 and crc_ok(frame):
+                part = self._cascade(self.level)
+                if bytes(frame[2:6]) != part or frame[6] != bcc(part):
+                    self.state = IDLE
+                    return None
+                if self._last_level():
+                    self.state = ACTIVE
+                    sak = self.sak
+                else:
+                    self.level += 1
+                    sak = 0x04
+                return with_crc(bytes((sak,))), 0
+            self.state = IDLE
+            return None
+
+        if self.state == ACTIVE:
+            if self._write_block is not None:
+                addr = self._write_block
+                self._write_block = None
+                if len(frame) != 18 or not crc_ok(frame):
+                    return bytes((NAK,)), 4
+                self.memory[addr * 16:addr * 16 + 16] = frame[:16]
+                return bytes((ACK,)), 4
+            if not crc_ok(frame):
+                return None
+            cmd = frame[0]
+            if cmd == 0x50 and len(frame) == 4:
+                self.state = HALT
+                return None
+            if cmd == 0x30 and len(frame) == 4:
+                addr = frame[1]
+                if addr > 63 or addr // 4 != self.auth_sector:
+                    return bytes((NAK,)), 4
+                data = bytearray(self.block(addr))
+                if addr % 4 == 3:
+                    data[0:6] = bytes(6)  # key A is never readable
+                return with_crc(data), 0
+            if cmd == 0xA0 and len(frame) == 4:
+                addr = frame[1]
+                if addr == 0 or addr > 63 or addr // 4 != self.auth_sector:
+                    return bytes((NAK,)), 4
+                self._write_block = addr
+                return bytes((ACK,)), 4
+        return None
+
+
+class RC522:
+    """
+    The reader chip. Cards are put into and taken out of the RF field with
+    :meth:`place` and :meth:`remove`. SPI activity is counted in
+    ``spi_transactions`` (chip select assertions) and ``spi_bytes``, RF
+    exchanges in ``rf_frames``.
+    """
+
+    def __init__(self, baudrate=1000000):
+        self.baudrate = baudrate
+        self.cards = []
+        self.spi_transactions = 0
+        self.spi_bytes = 0
+        self.rf_frames = 0
+        self._addr = None
+        self._reading = False
+        self._reset()
+
+    # RF field
+
+    def place(self, card):
+        card.power_off()
+        self.cards.append(card)
+
+    def remove(self, card):
+        if card in self.cards:
+            self.cards.remove(card)
+            card.power_off()
+
+    def clear(self):
+        for card in self.cards:
+            card.power_off()
+        self.cards = []
+
+    def antenna_on(self):
+        return self.regs[TxControlReg] & 0x03 != 0
+
+    def bus_time_us(self):
+        # Time spent clocking bytes over SPI at the configured baud rate
+        return self.spi_bytes * 8 * 1000000 // self.baudrate
+
+    def reset_counters(self):
+        self.spi_transactions = 0
+        self.spi_bytes = 0
+        self.rf_frames = 0
+
+    # SPI side
+
+    def spi_select(self, active):
+        if active:
+            self.spi_transactions += 1
+        self._addr = None
+
+    def spi_write(self, data):
+        self.spi_bytes += len(data)
+        for b in data:
+            if self._addr is None:
+                self._addr = (b >> 1) & 0x3F
+                self._reading = bool(b & 0x80)
+            elif not self._reading:
+                self._write_reg(self._addr, b)
+
+    def spi_read(self, n):
+        self.spi_bytes += n
+        if self._addr is None:
+            return bytes(n)
+        return bytes(self._read_reg(self._addr) for _ in range(n))
+
+    # Register file
+
+    def _reset(self):
+        self.regs = bytearray(64)
+        self.regs[CommandReg] = 0x20
+        self.regs[ComIEnReg] = 0x80
+        self.regs[ModeReg] = 0x3F
+        self.regs[TxControlReg] = 0x80
+        self.regs[VersionReg] = 0x92
+        self.fifo = bytearray()
+        for card in self.cards:
+            card.power_off()
+
+    def _read_reg(self, addr):
+        if addr == FIFODataReg:
+            if not self.fifo:
+                return 0
+            value = self.fifo[0]
+            del self.fifo[0]
+            return value
+        if addr == FIFOLevelReg:
+            return len(self.fifo)
+        return self.regs[addr]
+
+    def _write_reg(self, addr, value):
+        if addr == FIFODataReg:
+            if len(self.fifo) < FIFO_SIZE:
+                self.fifo.append(value)
+        elif addr == FIFOLevelReg:
+            if value & 0x80:
+                self.fifo = bytearray()
+        elif addr == ComIrqReg:
+            if value & 0x80:
+                self.regs[addr] |= value & 0x7F
+            else:
+                self.regs[addr] &= ~value & 0x7F
+        elif addr == DivIrqReg:
+            if value & 0x80:
+                self.regs[addr] |= value & 0x14
+            else:
+                self.regs[addr] &= ~value & 0x14
+        elif addr == CommandReg:
+            self.regs[addr] = (self.regs[addr] & 0xF0) | (value & 0x3F)
+            self._command(value & 0x0F)
+        elif addr == BitFramingReg:
+            self.regs[addr] = value
+            if value & 0x80 and self.regs[CommandReg] & 0x0F == TRANSCEIVE:
+                self._transceive()
+        elif addr == TxControlReg:
+            was_on = self.antenna_on()
+            self.regs[addr] = value
+            if was_on != self.antenna_on():
+                for card in self.cards:
+                    card.power_off()
+        elif addr in (ErrorReg, CRCResultRegH, CRCResultRegL, VersionReg):
+            pass
+        else:
+            self.regs[addr] = value
+
+    # Commands
+
+    def _command(self, cmd):
+        if cmd == SOFT_RESET:
+            self._reset()
+        elif cmd == CALC_CRC:
+            crc = crc_a(self.fifo)
+            self.fifo = bytearray()
+            self.regs[CRCResultRegL] = crc & 0xFF
+            self.regs[CRCResultRegH] = crc >> 8
+            self.regs[DivIrqReg] |= 0x04
+        elif cmd == MF_AUTHENT:
+            self._authenticate()
+
+    def _active_card(self):
+        if not self.antenna_on():
+            return None
+        for card in self.cards:
+            if card.state == ACTIVE:
+                return card
+        return None
+
+    def _authenticate(self):
+        frame = bytes(self.fifo)
+        self.fifo = bytearray()
+        self.regs[ErrorReg] = 0
+        self.regs[Status2Reg] &= ~0x08 & 0xFF
+        self.rf_frames += 1
+        card = self._active_card()
+        if len(frame) == 12 and card is not None and frame[0] in (0x60, 0x61) \
+                and card.authenticate(frame[0], frame[1], frame[2:8]):
+            self.regs[Status2Reg] |= 0x08
+            self.regs[ComIrqReg] |= IDLE_IRQ
+            self.regs[CommandReg] &= 0xF0
+        else:
+            # the card stays silent and the timer runs out
+            self.regs[ComIrqReg] |= TIMER_IRQ
+
+    def _transceive(self):
+        frame = bytes(self.fifo)
+        self.fifo = bytearray()
+        last_bits = self.regs[BitFramingReg] & 0x07
+        self.regs[ErrorReg] = 0
+        self.rf_frames += 1
+        responses = []
+        if self.antenna_on():
+            for card in self.cards:
+                response = card.respond(frame, last_bits)
+                if response is not None:
+                    responses.append(response)
+        self.regs[ComIrqReg] |= TX_IRQ
+        if not responses:
+            self.regs[ComIrqReg] |= TIMER_IRQ
+            return
+        (data, bits) = responses[0]
+        for (other, _) in responses[1:]:
+            if other != data:
+                # overlapping answers: the reader sees the wired OR
+                self.regs[ErrorReg] |= COLL_ERR
+                data = bytes(a | b for (a, b) in zip(data, other))
+        self.fifo = bytearray(data[:FIFO_SIZE])
+        self.regs[ControlReg] = (self.regs[ControlReg] & 0xF8) | bits
+        self.regs[ComIrqReg] |= RX_IRQ
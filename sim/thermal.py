@@ -0,0 +1,43 @@
+"""
+Single-zone thermal model of the house for the whole-house simulator::
+
+    room = Room(temperature=18.0, outdoor=Outdoor(mean=2.0, swing=4.0))
+    room.step(60, heat_w=5000)       # 60 s with the boiler on
+
+The room is one lumped heat capacity (air, walls and furniture) losing
+heat to the outdoor air through a single conductance (UA). Heating and
+cooling enter as thermal power in watts, positive for heating.
+"""
+import math
+
+DAY = 86400
+
+
+class Outdoor:
+    # Daily sinusoid around `mean`, coldest at `coldest_hour`
+    def __init__(self, mean=2.0, swing=4.0, coldest_hour=5):
+        self.mean = mean
+        self.swing = swing
+        self.coldest_hour = coldest_hour
+
+    def temperature(self, seconds):
+        phase = 2 * math.pi * ((seconds / 3600 - self.coldest_hour) / 24)
+        return self.mean - self.swing * math.cos(phase)
+
+
+class Room:
+    def __init__(self, temperature=18.0, outdoor=None, ua=200.0, capacity=5e6):
+        self.temperature = temperature
+        self.outdoor = outdoor if outdoor is not None else Outdoor()
+        self.ua = ua                # W/K
+        self.capacity = capacity    # J/K
+        self.seconds = 0.0
+
+    def step(self, dt, heat_w=0.0):
+        # Exact solution over dt for constant outdoor temperature and power
+        outside = self.outdoor.temperature(self.seconds)
+        equilibrium = outside + heat_w / self.ua
+        decay = math.exp(-dt * self.ua / self.capacity)
+        self.temperature = equilibrium + (self.temperature - equilibrium) * decay
+        self.seconds += dt
+        return self.temperature
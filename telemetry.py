@@ -0,0 +1,120 @@
+# High-rate raw ADC streaming for control loop tuning.
+#
+# A periodic timer samples the ADC straight into one of two preallocated
+# frames; when a frame is full the buffers swap and the main loop publishes
+# the full frame as the MQTT payload as is. Nothing is allocated per
+# sample or per frame. Frame layout (little endian):
+#
+#   0  2s  magic b'TS'
+#   2  B   format version (1)
+#   3  B   channel
+#   4  H   sequence number
+#   6  H   number of samples n
+#   8  I   ticks_us of the first sample
+#  12  H   first sample value
+#  14  H   reserved
+#  16  n - 1 pairs of H: microseconds since the previous sample and the
+#          value difference to it modulo 2**16
+#
+# A gap of 2**16 us or more between samples (a stall of the timer behind
+# Wi-Fi or the GC) does not fit a delta: the frame is closed early, with n
+# set to the samples it holds, and the late sample starts the next frame
+# with an absolute ticks_us. Frames are always sent whole, so the bytes
+# after the n-th sample are left over from earlier frames.
+#
+# tools/telemetry_decode.py decodes frames into NumPy arrays on the host.
+
+import ustruct
+import utime
+from machine import Timer
+
+MAGIC = b'TS'
+VERSION = 1
+HEADER = '<2sBBHHIHH'
+HEADER_SIZE = 16
+
+
+def frame_size(samples):
+    return HEADER_SIZE + 4 * (samples - 1)
+
+
+class TelemetryStream:
+    def __init__(self, adc, rate_hz=500, samples=128, channel=0):
+        if rate_hz <= 0 or 1000000 / rate_hz > 0xFFFF:
+            raise ValueError("telemetry rate must be above 15.3 Hz, the sample period has to fit 16 bits")
+        self._read = adc.read_u16
+        self._rate_hz = rate_hz
+        self._samples = samples
+        self._channel = channel
+        self._frames = (bytearray(frame_size(samples)), bytearray(frame_size(samples)))
+        self._fill = 0        # index of the frame being filled
+        self._ready = -1      # index of the frame waiting to be published
+        self._n = 0
+        self._seq = 0
+        self._last_t = 0
+        self._last_v = 0
+        self._timer = None
+        self._tick_cb = self._tick
+        self.dropped = 0
+
+    def start(self):
+        if self._timer is None:
+            self._timer = Timer()
+        self._timer.init(freq=self._rate_hz, mode=Timer.PERIODIC, callback=self._tick_cb)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def _tick(self, timer=None):
+        t = utime.ticks_us()
+        v = self._read()
+        n = self._n
+        if n and utime.ticks_diff(t, self._last_t) > 0xFFFF:
+            # too late for a 16-bit delta: close the frame at n samples and
+            # start the next one with this sample
+            frame = self._frames[self._fill]
+            frame[6] = n & 0xFF
+            frame[7] = n >> 8
+            self._complete()
+            n = 0
+        frame = self._frames[self._fill]
+        if n == 0:
+            ustruct.pack_into(HEADER, frame, 0, MAGIC, VERSION, self._channel,
+                              self._seq, self._samples, t, v, 0)
+        else:
+            dt = utime.ticks_diff(t, self._last_t)
+            dv = (v - self._last_v) & 0xFFFF
+            o = HEADER_SIZE + 4 * (n - 1)
+            frame[o] = dt & 0xFF
+            frame[o + 1] = dt >> 8
+            frame[o + 2] = dv & 0xFF
+            frame[o + 3] = dv >> 8
+        self._last_t = t
+        self._last_v = v
+        n += 1
+        if n < self._samples:
+            self._n = n
+            return
+        self._complete()
+
+    def _complete(self):
+        # frame complete: hand it over unless the previous one is still pending
+        self._n = 0
+        self._seq = (self._seq + 1) & 0xFFFF
+        if self._ready < 0:
+            self._ready = self._fill
+            self._fill ^= 1
+        else:
+            self.dropped += 1
+
+    def ready(self):
+        # The next complete frame to publish, or None
+        if self._ready < 0:
+            return None
+        return self._frames[self._ready]
+
+    def release(self):
+        # Called once the frame returned by ready() has been sent
+        self._ready = -1
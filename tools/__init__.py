@@ -0,0 +1,3 @@
+"""
+Host-side analysis tools for data produced by the boards (CPython only).
+"""
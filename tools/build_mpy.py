@@ -0,0 +1,66 @@
+"""
+Precompile the libraries copied to the boards into MicroPython bytecode
+(.mpy), so the boards do not compile them at every boot::
+
+    pip install mpy-cross
+    python -m tools.build_mpy            # writes build/lib/...
+
+Copy the contents of build/ to the board in place of the .py files. The
+mpy-cross version must match the firmware's .mpy format (MicroPython
+1.19 and later use format 6). To freeze the libraries into a custom
+firmware instead, add ``package("picozero", base_path="lib")`` to the
+port's manifest.py.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = ['lib/picozero', 'umqtt']
+
+
+def mpy_cross():
+    exe = shutil.which('mpy-cross')
+    if exe is not None:
+        return [exe]
+    try:
+        import mpy_cross
+    except ImportError:
+        sys.exit("mpy-cross not found: pip install mpy-cross")
+    return [sys.executable, '-m', 'mpy_cross']
+
+
+def build(sources, out, march='armv6m'):
+    compiler = mpy_cross()
+    built = []
+    for source in sources:
+        base = os.path.join(ROOT, source)
+        if not os.path.isdir(base):
+            continue
+        for name in sorted(os.listdir(base)):
+            if not name.endswith('.py'):
+                continue
+            src = os.path.join(base, name)
+            rel = os.path.relpath(src, ROOT)
+            dest = os.path.join(out, rel[:-3] + '.mpy')
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            # keep source paths short in tracebacks, as on the board
+            subprocess.run(compiler + ['-march=' + march, '-s', name, '-o', dest, src], check=True)
+            built.append((rel, os.path.getsize(src), os.path.getsize(dest)))
+    return built
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sources', nargs='*', default=SOURCES)
+    parser.add_argument('--out', default=os.path.join(ROOT, 'build'))
+    parser.add_argument('--march', default='armv6m')
+    args = parser.parse_args(argv)
+    for rel, py, mpy in build(args.sources, args.out, args.march):
+        print("{:<36} {:>7} -> {:>7} bytes".format(rel, py, mpy))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Host check of the actuator switching schedules in actuators.py, on the
+virtual clock from hal/::
+
+    python -m tools.check_actuators
+
+Each scenario sends a list of ``(ms after start, on/off)`` requests to
+actuators that are updated every 50 ms, as from a board's main loop, and
+compares the transitions they made with the expected ones as
+``(ms after start, state)``. A transition may lag by up to one loop pass.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+import utime
+from actuators import Actuator, StaggerGate
+from picozero import DigitalOutputDevice, PWMOutputDevice
+
+LOOP_MS = 50
+
+
+def run(name, actuators, requests, expected, duration_ms, check=None):
+    start = utime.ticks_ms()
+    requests = sorted(requests)
+    samples = []
+    t = 0
+    while t <= duration_ms:
+        while requests and requests[0][0] <= t:
+            _, index, on = requests.pop(0)
+            actuators[index].request(on)
+        for actuator in actuators:
+            actuator.update()
+        if check is not None:
+            samples.append((t, check()))
+        utime.sleep_ms(LOOP_MS)
+        t += LOOP_MS
+
+    got = [[(utime.ticks_diff(applied, start), state) for applied, _, state in a.transitions()]
+           for a in actuators]
+    ok = len(got) == len(expected) and all(
+        len(g) == len(e) and all(s == es and 0 <= at - et <= LOOP_MS for (at, s), (et, es) in zip(g, e))
+        for g, e in zip(got, expected))
+    if check is not None:
+        ok = ok and check(samples)
+    coalesced = sum(a.coalesced for a in actuators)
+    print("{:<44} {:<5} {:>3} coalesced  {}".format(name, "ok" if ok else "FAIL", coalesced, got))
+    for actuator in actuators:
+        actuator.close()
+    return ok
+
+
+def relay(pin, **kwargs):
+    return Actuator(DigitalOutputDevice(pin), **kwargs)
+
+
+def ramp(actuator):
+    # check(): samples the PWM value, then checks it rose steadily to 1
+    def check(samples=None):
+        if samples is None:
+            return actuator.device.value
+        values = [v for _, v in samples]
+        rising = values[values.index(next(v for v in values if v > 0)):]
+        return all(b >= a for a, b in zip(rising, rising[1:])) and rising[-1] == 1 and len(rising) > 10
+    return check
+
+
+def main():
+    results = [
+        run("plain switching",
+            [relay(15)],
+            [(100, 0, True), (1000, 0, False)],
+            [[(100, True), (1000, False)]], 2000),
+        run("min off from boot delays the first start",
+            [relay(15, min_off_ms=3000)],
+            [(100, 0, True)],
+            [[(3000, True)]], 4000),
+        run("min on holds a quick off",
+            [relay(15, min_on_ms=2000)],
+            [(0, 0, True), (500, 0, False)],
+            [[(0, True), (2000, False)]], 3000),
+        run("flips during lockout collapse into the last",
+            [relay(15, min_off_ms=1000)],
+            [(100, 0, True), (200, 0, False), (300, 0, True), (400, 0, False), (500, 0, True)],
+            [[(1000, True)]], 2000),
+        run("flip back during lockout cancels",
+            [relay(15, min_off_ms=1000)],
+            [(100, 0, True), (300, 0, False)],
+            [[]], 2000),
+        run("start delay",
+            [relay(15, start_delay_ms=5000)],
+            [(0, 0, True)],
+            [[(5000, True)]], 6000),
+    ]
+
+    gate = StaggerGate(spacing_ms=2000)
+    results.append(run("two relays sharing a 2 s stagger gate",
+                       [relay(15, gate=gate), relay(16, gate=gate)],
+                       [(100, 0, True), (100, 1, True)],
+                       [[(100, True)], [(2100, True)]], 3000))
+
+    fan = Actuator(PWMOutputDevice(17), soft_start_ms=2000)
+    results.append(run("PWM soft start over 2 s",
+                       [fan],
+                       [(100, 0, True)],
+                       [[(100, True)]], 3000, check=ramp(fan)))
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Accuracy check for the calibration lookup tables (see calibration.py).
+
+Every table entry is compared with its exact curve over all 65536 ADC
+readings. A table is accepted when its largest error stays within an
+absolute ``limit`` in °C, set per curve (the sensors' built-in tables must
+resolve the fallback thermostat's 0.5 °C hysteresis) or with ``--limit``
+for a config file. The spread, how far the curve moves inside one bucket
+plus the 0.005 °C rounding to hundredths, is printed alongside: it is the
+error a table of that size cannot avoid, so a table over its limit needs
+more ``bits``::
+
+    python -m tools.check_calibration            # built-in curves
+    python -m tools.check_calibration config.json --limit 0.1
+
+Readings whose exact temperature falls outside ``--range`` (default
+-40..125 °C, where thermistor curves run off to infinity) are skipped.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hal
+hal.install()
+
+from calibration import ADC_MAX, DEFAULT, Calibration, curve_from_spec
+from sensors import PICO_TEMP, THERMISTOR
+
+ROUNDING = 0.005
+LIMIT = 0.25
+
+CURVES = {
+    'default 15-40 linear': dict(DEFAULT, limit=0.1),
+    'linear, 3 points': {'type': 'linear', 'points': [[0, 10], [30000, 22], [65535, 45]],
+                         'limit': 0.1},
+    'polynomial, quadratic': {'type': 'polynomial', 'coefficients': [12.5, 30, -4], 'limit': 0.1},
+    'steinhart_hart, 10k NTC, 14 bits': dict(THERMISTOR, bits=14, limit=0.1),
+    'steinhart_hart, 10k NTC (sensors)': dict(THERMISTOR, limit=0.25),
+    'pico_temp (sensors)': dict(PICO_TEMP, limit=0.25),
+}
+
+
+def exact_values(curve, low, high):
+    values = {}
+    for adc in range(ADC_MAX + 1):
+        try:
+            t = curve(adc)
+        except (ValueError, ZeroDivisionError):
+            continue
+        if low <= t <= high:
+            values[adc] = t
+    return values
+
+
+def check(spec, low=-40, high=125):
+    """
+    Return ``(max_error, spread)`` for one calibration spec over the
+    readings whose exact temperature lies in ``low..high``.
+    """
+    curve = curve_from_spec(spec)
+    table = Calibration(curve, spec.get('bits', 10))
+    exact = exact_values(curve, low, high)
+    shift = 16 - table.bits
+    worst = 0.0
+    spread = {}
+    for adc, t in exact.items():
+        worst = max(worst, abs(table.temperature(adc) - t))
+        bucket = adc >> shift
+        lo, hi = spread.get(bucket, (t, t))
+        spread[bucket] = (min(lo, t), max(hi, t))
+    return worst, max((hi - lo for lo, hi in spread.values()), default=0.0) + ROUNDING
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('config', nargs='?', help="config.json with a 'calibration' entry")
+    parser.add_argument('--range', nargs=2, type=float, default=(-40, 125),
+                        metavar=('LOW', 'HIGH'))
+    parser.add_argument('--limit', type=float, default=LIMIT,
+                        help="largest error accepted for a config file's curve, in °C")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        with open(args.config) as f:
+            curves = {args.config: dict(json.load(f).get('calibration', DEFAULT), limit=args.limit)}
+    else:
+        curves = CURVES
+
+    failed = 0
+    for name, spec in curves.items():
+        worst, spread = check(spec, *args.range)
+        limit = spec['limit']
+        ok = worst <= limit
+        failed += not ok
+        print("{:<36} max error {:.4f} °C  limit {:.2f} °C  spread {:.4f} °C  {}".format(
+            name, worst, limit, spread, "ok" if ok else "FAIL"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
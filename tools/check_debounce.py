@@ -0,0 +1,137 @@
+"""
+Host check of picozero's timer-based debounce against simulated bounce
+patterns, on the virtual clock and Pin interrupts from hal/::
+
+    python -m tools.check_debounce
+
+Each pattern drives a pulled-up Button (20 ms bounce time) through a list
+of ``(microseconds to wait, pin level)`` steps and compares the callbacks
+that ran with the expected presses and releases. It also reports the
+longest time spent in the pin interrupt handler, which no longer depends
+on the bounce time.
+
+A last case presses the button from inside TickScheduler.remove(), right
+after it stopped the timer, as an interrupt could on the board; the press
+must still be debounced and reported.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+import utime
+from machine import Pin
+from picozero import Button
+from picozero.base import tick_scheduler
+
+PIN = 10
+
+
+def bounce(level, edges, spacing_us):
+    # `edges` alternating transitions ending on `level`
+    steps = []
+    for i in range(edges):
+        steps.append((spacing_us, level if (edges - i) % 2 else 1 - level))
+    return steps
+
+
+# Button is pulled up: pressed = 0, released = 1
+PATTERNS = [
+    ("clean press and release",
+     [(0, 0), (200000, 1)], ['pressed', 'released']),
+    ("press and release with 5 bounces over 2 ms",
+     bounce(0, 9, 250) + [(300000, 1)] + bounce(1, 9, 250), ['pressed', 'released']),
+    ("1 ms glitch",
+     [(0, 0), (1000, 1)], []),
+    ("chatter every 15 ms for 100 ms, then held",
+     bounce(0, 7, 15000) + [(100000, 0)], ['pressed']),
+    ("two quick presses 60 ms apart",
+     bounce(0, 5, 300) + [(30000, 1)] + [(30000, 0)] + bounce(0, 3, 300), ['pressed', 'released', 'pressed']),
+    ("bounce ends back where it started",
+     bounce(1, 6, 500), []),
+]
+
+
+def run(name, steps, expected):
+    Pin._levels[PIN] = 1
+    button = Button(PIN)
+    events = []
+    button.when_pressed = lambda: events.append('pressed')
+    button.when_released = lambda: events.append('released')
+
+    handler = Pin._irqs[PIN][0]
+    worst_ns = [0]
+
+    def timed(p):
+        t0 = time.perf_counter_ns()
+        handler(p)
+        worst_ns[0] = max(worst_ns[0], time.perf_counter_ns() - t0)
+    Pin._irqs[PIN] = (timed, ) + Pin._irqs[PIN][1:]
+
+    for wait_us, level in steps:
+        utime.sleep_us(wait_us)
+        Pin._set_level(PIN, level)
+    utime.sleep_ms(100)
+    button.close()
+    if Pin._levels[PIN] == 0:
+        # leave the pin released for the next pattern without an event
+        Pin._levels[PIN] = 1
+
+    ok = events == expected
+    print("{:<46} {:<5} {:>8.1f} us  {}".format(
+        name, "ok" if ok else "FAIL", worst_ns[0] / 1000, events))
+    return ok
+
+
+class Idle:
+    # Something else on the shared scheduler, due in a long time
+    def __init__(self):
+        self._heap_index = -1
+        self._deadline = utime.ticks_add(utime.ticks_ms(), 60000)
+
+    def _fire(self, now):
+        return False
+
+
+def run_irq_in_remove():
+    name = "press while remove() stops the timer"
+    Pin._levels[PIN] = 1
+    button = Button(PIN)
+    events = []
+    button.when_pressed = lambda: events.append('pressed')
+    button.when_released = lambda: events.append('released')
+    scheduler = tick_scheduler()
+    other = Idle()
+    scheduler.add(other)
+
+    stop = scheduler._stop
+    def stop_then_press():
+        stop()
+        Pin._set_level(PIN, 0)
+    scheduler._stop = stop_then_press
+    scheduler.remove(other)
+    del scheduler._stop
+
+    utime.sleep_ms(100)
+    Pin._set_level(PIN, 1)
+    utime.sleep_ms(100)
+    button.close()
+
+    ok = events == ['pressed', 'released']
+    print("{:<46} {:<5} {:>11}  {}".format(name, "ok" if ok else "FAIL", "", events))
+    return ok
+
+
+def main():
+    failed = 0
+    for name, steps, expected in PATTERNS:
+        failed += not run(name, steps, expected)
+    failed += not run_irq_in_remove()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Host check of picozero's gamma-corrected fade tables (fade_table in
+picozero/base.py)::
+
+    python -m tools.check_fades
+
+A gamma fade interpolates perceived brightness, so fading out must step
+through the same duty cycles as fading in, in reverse, and an active-low
+output must mirror an active-high one. A linear table is checked against
+the plain interpolation for comparison.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import hal
+hal.install()
+
+from picozero.base import fade_table
+
+FPS = 25
+DURATION = 1
+STEPS = FPS * DURATION
+
+
+def mirrored(a, b, tolerance=1):
+    # a[i] against b[-i]: a fade-out against the fade-in it should retrace
+    return all(abs(a[i] - b[STEPS - i]) <= tolerance for i in range(1, STEPS)) and a[0] == 65535
+
+
+def main():
+    fade_in = fade_table(0, 65535, DURATION, FPS, 'gamma')
+    fade_out = fade_table(65535, 0, DURATION, FPS, 'gamma')
+    low_in = fade_table(65535, 0, DURATION, FPS, 'gamma', active_high=False)
+    low_out = fade_table(0, 65535, DURATION, FPS, 'gamma', active_high=False)
+    half = fade_table(65535, 32768, DURATION, FPS, 'gamma')
+    linear = fade_table(65535, 0, DURATION, FPS)
+
+    checks = [
+        ("gamma fade-out retraces the fade-in", mirrored(fade_out, fade_in)),
+        ("gamma fade-out starts dimming at once", fade_out[1] < 60000),
+        ("active-low fade-in mirrors active-high",
+         all(abs(low_in[i] + fade_in[i] - 65535) <= 1 for i in range(STEPS))),
+        ("active-low fade-out retraces its fade-in",
+         all(abs(low_out[i] + fade_out[i] - 65535) <= 1 for i in range(STEPS))),
+        ("gamma fade ends one frame short of its target", 32768 < half[-1] < half[-2]),
+        ("linear fade-out is a straight line",
+         all(linear[i] == int(65535 - 65535 * i / STEPS) for i in range(STEPS))),
+    ]
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print("{:<46} {}".format(name, "ok" if ok else "FAIL"))
+    print("gamma fade-out:", list(fade_out[:6]), "...", fade_out[-1])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
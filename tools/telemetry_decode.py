@@ -0,0 +1,104 @@
+"""
+Decoder for the raw ADC telemetry frames published by the sensor boards
+(see telemetry.py for the frame layout)::
+
+    from tools.telemetry_decode import decode, concat
+
+    t_us, values = decode(payload)
+
+Frames can also be decoded from files holding one payload each::
+
+    python -m tools.telemetry_decode frame1.bin frame2.bin ...
+"""
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'TS'
+VERSION = 1
+HEADER = '<2sBBHHIHH'
+HEADER_SIZE = struct.calcsize(HEADER)
+TICKS_PERIOD = 1 << 30
+
+
+class FrameError(ValueError):
+    pass
+
+
+def header(frame):
+    (magic, version, channel, seq, count, t0, v0, _) = struct.unpack_from(HEADER, frame)
+    if magic != MAGIC or version != VERSION:
+        raise FrameError("not a telemetry frame")
+    if len(frame) < HEADER_SIZE + 4 * (count - 1):
+        raise FrameError("truncated frame")
+    return {'channel': channel, 'seq': seq, 'count': count, 't0': t0, 'v0': v0}
+
+
+def decode(frame):
+    """
+    Return ``(t_us, values)`` as NumPy arrays. ``t_us`` is relative to the
+    board's ticks_us clock (int64, not wrapped), ``values`` are the raw
+    read_u16 samples (uint16).
+    """
+    h = header(frame)
+    count = h['count']
+    deltas = np.frombuffer(frame, dtype='<u2', count=2 * (count - 1), offset=HEADER_SIZE)
+    deltas = deltas.reshape(-1, 2)
+    t = np.empty(count, dtype=np.int64)
+    t[0] = h['t0']
+    t[1:] = h['t0'] + np.cumsum(deltas[:, 0], dtype=np.int64)
+    v = np.empty(count, dtype=np.uint16)
+    v[0] = h['v0']
+    # value deltas are modulo 2**16, so the running sum wraps back into range
+    v[1:] = (h['v0'] + np.cumsum(deltas[:, 1], dtype=np.int64)) & 0xFFFF
+    return t, v
+
+
+def concat(frames):
+    """
+    Decode consecutive frames into one ``(t_us, values)`` pair, unwrapping
+    the 30-bit ticks_us counter. Returns the number of frames missing
+    according to the sequence numbers as a third element.
+    """
+    times = []
+    values = []
+    missing = 0
+    offset = 0
+    last_t = None
+    last_seq = None
+    for frame in frames:
+        h = header(frame)
+        if last_seq is not None:
+            missing += (h['seq'] - last_seq - 1) & 0xFFFF
+        last_seq = h['seq']
+        t, v = decode(frame)
+        t = t + offset
+        if last_t is not None and t[0] < last_t:
+            offset += TICKS_PERIOD
+            t = t + TICKS_PERIOD
+        last_t = t[-1]
+        times.append(t)
+        values.append(v)
+    if not times:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint16), 0
+    return np.concatenate(times), np.concatenate(values), missing
+
+
+def main(paths):
+    frames = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            frames.append(f.read())
+    t, v, missing = concat(frames)
+    if len(t) > 1:
+        rate = (len(t) - 1) * 1e6 / (t[-1] - t[0])
+    else:
+        rate = 0
+    print("{} samples, {:.1f} samples/s, {} frames missing".format(len(t), rate, missing))
+    if len(v):
+        print("min {} max {} mean {:.1f}".format(v.min(), v.max(), v.mean()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,215 @@
+"""
+Per-hop latency report from the trace rings of the boards (see tracing.py
+for the ring layout)::
+
+    python -m tools.trace_report --broker 192.168.1.10 --save rings.json
+    python -m tools.trace_report --load rings.json
+
+The first form publishes on trace/dump, collects the rings the boards
+send back on trace/<client_id> for a few seconds (and optionally saves
+them); the second reports on saved rings. Every board stamps its spans
+with its own ticks_us, so each ring is placed on the host's clock by the
+time it arrived: a span that started d us before the ring was published
+is taken to have started d us before it arrived. The error of that is
+the ring's transit time, a few ms on a home network.
+
+Spans with the same trace id are one chain, from a card tap on the master
+to the relay switching on an actuator board. The hops reported are:
+
+    tap        card read and identified
+    decide     end of the tap to the command being published
+    publish    client.publish on the master
+    deliver    end of the publish to the actuator's check_msg that got it
+               (broker, network and the actuator's loop period)
+    check_msg  that check_msg up to message_callback
+    callback   message_callback
+    actuate    command to the relay and LED switching (lockouts included)
+    total      start of the tap to the relay switching
+"""
+import argparse
+import binascii
+import json
+import os
+import struct
+import sys
+import time
+
+MAGIC = b'TR'
+VERSION = 1
+HEADER = '<2sBBIHH'
+HEADER_SIZE = struct.calcsize(HEADER)
+SPAN = '<IIIH'
+SPAN_SIZE = struct.calcsize(SPAN)
+TICKS_PERIOD = 1 << 30
+
+TAP, DECIDE, PUBLISH, RECEIVE, CALLBACK, ACTUATE = range(1, 7)
+HOPS = ['tap', 'decide', 'publish', 'deliver', 'check_msg', 'callback', 'actuate', 'total']
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 60000]
+
+
+class RingError(ValueError):
+    pass
+
+
+def decode(ring):
+    """
+    Return ``(now_us, spans)`` for a published ring, with spans as
+    ``(trace_id, stage, start_us, end_us)`` on the board's ticks_us clock.
+    """
+    magic, version, _, now_us, count, _ = struct.unpack_from(HEADER, ring)
+    if magic != MAGIC or version != VERSION:
+        raise RingError("not a trace ring")
+    if len(ring) < HEADER_SIZE + SPAN_SIZE * count:
+        raise RingError("truncated ring")
+    spans = []
+    for i in range(count):
+        trace_id, start, end, stage = struct.unpack_from(SPAN, ring, HEADER_SIZE + SPAN_SIZE * i)
+        spans.append((trace_id, stage, start, end))
+    return now_us, spans
+
+
+def align(ring, received_us):
+    """
+    Spans of `ring` as ``(trace_id, stage, start, end)`` in host
+    microseconds, given the host time the ring arrived at.
+    """
+    now_us, spans = decode(ring)
+    def host(t):
+        return received_us - ((now_us - t) % TICKS_PERIOD)
+    return [(trace_id, stage, host(start), host(end)) for trace_id, stage, start, end in spans]
+
+
+def chains(rings):
+    """
+    Hop latencies (ms) per chain from ``{board: (ring, received_us)}``:
+    a list of dicts with the hops present in each chain.
+    """
+    by_id = {}
+    for board, (ring, received_us) in rings.items():
+        for trace_id, stage, start, end in align(ring, received_us):
+            by_id.setdefault(trace_id, {}).setdefault(board, []).append((stage, start, end))
+
+    result = []
+    for trace_id, boards in sorted(by_id.items()):
+        master = [s for spans in boards.values() for s in spans if s[0] <= PUBLISH]
+        first = {}
+        for stage, start, end in sorted(master, key=lambda s: s[1]):
+            first.setdefault(stage, (start, end))
+        publishes = sorted((start, end) for stage, start, end in master if stage == PUBLISH)
+        for board, spans in boards.items():
+            stages = {stage: (start, end) for stage, start, end in spans}
+            if RECEIVE not in stages:
+                continue
+            hops = {'trace': trace_id, 'board': board}
+            for name, stage in (('tap', TAP), ('decide', DECIDE)):
+                if stage in first:
+                    hops[name] = (first[stage][1] - first[stage][0]) / 1000
+            # the publish that reached this board: the last one before its callback
+            before = [p for p in publishes if p[1] <= stages[RECEIVE][1]]
+            if before:
+                hops['publish'] = (before[-1][1] - before[-1][0]) / 1000
+                hops['deliver'] = (stages[RECEIVE][0] - before[-1][1]) / 1000
+            for name, stage in (('check_msg', RECEIVE), ('callback', CALLBACK), ('actuate', ACTUATE)):
+                if stage in stages:
+                    hops[name] = (stages[stage][1] - stages[stage][0]) / 1000
+            if TAP in first and ACTUATE in stages:
+                hops['total'] = (stages[ACTUATE][1] - first[TAP][0]) / 1000
+            result.append(hops)
+    return result
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def histogram(values):
+    # Counts per bucket of BUCKETS_MS (upper bounds), plus one above
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for v in values:
+        i = 0
+        while i < len(BUCKETS_MS) and v >= BUCKETS_MS[i]:
+            i += 1
+        counts[i] += 1
+    return counts
+
+
+def report(hops_list, out=sys.stdout):
+    boards = sorted({h['board'] for h in hops_list})
+    print("{} chains to {}".format(len(hops_list), ", ".join(boards) or "no board"), file=out)
+    for hop in HOPS:
+        values = [h[hop] for h in hops_list if hop in h]
+        if not values:
+            continue
+        print("\n{:<10} n={:<5} p50 {:>9.2f} ms  p95 {:>9.2f} ms  max {:>9.2f} ms".format(
+            hop, len(values), percentile(values, 50), percentile(values, 95), max(values)), file=out)
+        counts = histogram(values)
+        top = max(counts)
+        for i, count in enumerate(counts):
+            if not count:
+                continue
+            label = "< {} ms".format(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else ">= {} ms".format(BUCKETS_MS[-1])
+            print("  {:>11} {:>5} {}".format(label, count, "#" * max(1, round(40 * count / top))), file=out)
+
+
+def collect(broker, port=1883, wait_s=3.0):
+    """
+    Asks the boards for their rings over MQTT; ``{board: (ring,
+    received_us)}`` with host monotonic microseconds.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import hal
+    hal.install()
+    from umqtt.simple import MQTTClient
+
+    rings = {}
+    def on_message(topic, msg):
+        if topic != b'trace/dump':
+            rings[topic.decode().split('/', 1)[1]] = (bytes(msg), time.monotonic_ns() // 1000)
+
+    client = MQTTClient('trace_report', broker, port)
+    client.set_callback(on_message)
+    client.connect()
+    client.subscribe(b'trace/+')
+    client.publish(b'trace/dump', b'')
+    deadline = time.monotonic() + wait_s
+    while time.monotonic() < deadline:
+        if client.check_msg() is None:
+            time.sleep(0.01)
+    client.disconnect()
+    return rings
+
+
+def save(rings, path):
+    with open(path, 'w') as f:
+        json.dump({board: {'ring': binascii.hexlify(ring).decode(), 'received_us': received}
+                   for board, (ring, received) in rings.items()}, f, indent=1)
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return {board: (binascii.unhexlify(r['ring']), r['received_us']) for board, r in data.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--broker', help="collect the rings through this broker")
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--wait', type=float, default=3.0, help="seconds to wait for the rings")
+    parser.add_argument('--save', help="save the collected rings to this file")
+    parser.add_argument('--load', help="report on rings saved with --save")
+    args = parser.parse_args(argv)
+    if args.load:
+        rings = load(args.load)
+    elif args.broker:
+        rings = collect(args.broker, args.port, args.wait)
+        if args.save:
+            save(rings, args.save)
+    else:
+        parser.error("--broker or --load is required")
+    report(chains(rings))
+
+
+if __name__ == "__main__":
+    main()
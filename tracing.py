@@ -0,0 +1,81 @@
+# Latency tracing of commands across the boards.
+#
+# The master gives a command chain started by a card tap a correlation id
+# and sends it along in the command payload ('trace'); every stage on
+# every board records a span (trace id, stage, ticks_us at start and end)
+# into a fixed-size ring in RAM. Recording packs the span straight into a
+# preallocated buffer, so it allocates nothing and costs a few
+# microseconds. On a message on trace/dump a board publishes its ring as
+# is on trace/<client_id>; tools/trace_report.py collects the rings of all
+# boards and reconstructs per-hop latency histograms. Ring layout (little
+# endian):
+#
+#   0  2s  magic b'TR'
+#   2  B   format version (1)
+#   3  B   reserved
+#   4  I   ticks_us when the ring was published
+#   8  H   number of spans n
+#  10  H   reserved
+#  12  n spans of 14 bytes, in ring order:
+#      I trace id, I ticks_us at start, I ticks_us at end, H stage
+
+import ustruct
+import utime
+
+MAGIC = b'TR'
+VERSION = 1
+HEADER = '<2sBBIHH'
+HEADER_SIZE = 12
+SPAN = '<IIIH'
+SPAN_SIZE = 14
+
+# Stages, in chain order
+TAP = 1         # master: card read and identified
+DECIDE = 2      # master: from the tap to the command decision
+PUBLISH = 3     # master: client.publish of the command
+RECEIVE = 4     # actuator: check_msg call to message_callback
+CALLBACK = 5    # actuator: message_callback
+ACTUATE = 6     # actuator: command to the relay and LED switching
+
+
+class Tracer:
+    def __init__(self, size=64):
+        self._size = size
+        self._ring = bytearray(HEADER_SIZE + SPAN_SIZE * size)
+        self._next = 0
+        self._count = 0
+        self._counter = 0
+        # ids from different boots of the master should not collide; a
+        # 14-bit prefix keeps every id below 2**30, a small int in
+        # MicroPython, so neither the master nor the boards that parse it
+        # from JSON allocate for it
+        self._prefix = (utime.ticks_us() & 0x3FFF) << 16
+        self._open = {}
+
+    def new_id(self):
+        self._counter = (self._counter + 1) & 0xFFFF
+        return self._prefix | self._counter
+
+    def record(self, trace_id, stage, start_us, end_us=None):
+        if end_us is None:
+            end_us = utime.ticks_us()
+        ustruct.pack_into(SPAN, self._ring, HEADER_SIZE + SPAN_SIZE * self._next,
+                          trace_id, start_us, end_us, stage)
+        self._next = (self._next + 1) % self._size
+        if self._count < self._size:
+            self._count += 1
+
+    def begin(self, trace_id, stage, start_us=None):
+        # Opens a span that end(stage) records later, e.g. in the main loop
+        self._open[stage] = (trace_id, utime.ticks_us() if start_us is None else start_us)
+
+    def end(self, stage):
+        span = self._open.pop(stage, None)
+        if span is not None:
+            self.record(span[0], stage, span[1])
+
+    def dump(self):
+        # The ring, ready to publish; valid until the next record()
+        ustruct.pack_into(HEADER, self._ring, 0, MAGIC, VERSION, 0,
+                          utime.ticks_us(), self._count, 0)
+        return memoryview(self._ring)[:HEADER_SIZE + SPAN_SIZE * self._count]
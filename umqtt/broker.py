@@ -0,0 +1,589 @@
+# Small MQTT 3.1.1 broker, for CPython and MicroPython.
+#
+#     broker = Broker()
+#     broker.run("0.0.0.0", 1883)
+#
+# or, from a main loop that has other work to do:
+#
+#     broker.listen("0.0.0.0", 1883)
+#     while True:
+#         broker.poll()
+#         ...
+#
+# Supports QoS 0 and 1 (QoS 2 is refused), retained messages, last wills,
+# the + and # wildcards (which do not match $-topics), keepalive and
+# persistent sessions. The protocol is handled by Broker whatever carries
+# the bytes: a transport hands received bytes to received(), and the
+# broker answers through the Connection's send(). serve() is the asyncio
+# transport and listen()/poll() a non-blocking socket one, polled from the
+# caller's loop; LocalClient attaches a client in-process, e.g. the master
+# board to the broker it hosts in its own main loop. Everything runs on the
+# caller's thread: the Pico W network stack is not safe to use from both
+# cores, so the broker never starts a thread of its own.
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+EAGAIN = 11
+
+CONNECT = 1
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+UNSUBSCRIBE = 10
+PINGREQ = 12
+DISCONNECT = 14
+
+
+def packet(first, body):
+    header = bytearray((first,))
+    n = len(body)
+    while True:
+        header.append(n & 0x7F | (0x80 if n > 0x7F else 0))
+        n >>= 7
+        if not n:
+            break
+    return bytes(header) + bytes(body)
+
+
+def publish_packet(topic, payload, qos=0, retain=False, pid=0, dup=False):
+    body = bytearray(len(topic).to_bytes(2, "big"))
+    body += topic
+    if qos:
+        body += pid.to_bytes(2, "big")
+    body += payload
+    return packet(0x30 | dup << 3 | qos << 1 | retain, body)
+
+
+def valid_filter(levels):
+    for i, level in enumerate(levels):
+        if ("#" in level and (level != "#" or i != len(levels) - 1)) or ("+" in level and level != "+"):
+            return False
+    return True
+
+
+def matches(levels, topic):
+    # levels: a wildcard filter split on "/"; topic: the topic's levels
+    if topic[0].startswith("$") and levels[0] in ("+", "#"):
+        return False
+    for i, level in enumerate(levels):
+        if level == "#":
+            return True
+        if i >= len(topic) or (level != "+" and level != topic[i]):
+            return False
+    return len(levels) == len(topic)
+
+
+def _string(buf, i):
+    n = buf[i] << 8 | buf[i + 1]
+    return bytes(buf[i + 2:i + 2 + n]), i + 2 + n
+
+
+class Connection:
+    # One client connection; the transport implements send() and close()
+    encoded = True      # takes PUBLISH packets through send()
+
+    def __init__(self):
+        self.inbox = bytearray()
+        self.session = None
+        self.keepalive = 0
+
+    def send(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def deliver(self, broker, topic, payload, qos, retain, pid, dup=False):
+        self.send(publish_packet(topic, payload, qos, retain, pid, dup))
+
+
+class Session:
+    # A client's subscriptions and unacknowledged QoS 1 messages, kept
+    # between connections unless it connects with a clean session
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.subscriptions = {}     # filter -> qos
+        self.inflight = {}          # pid -> (topic, payload, retain)
+        self.queued = []            # QoS 1 messages while disconnected
+        self.pid = 0
+        self.will = None
+        self.clean = True
+        self.conn = None
+
+
+class Broker:
+    MAX_QUEUED = 32
+    DEBUG = False
+
+    def __init__(self):
+        self.sessions = {}          # client_id -> Session
+        self.exact = {}             # topic -> {Session: qos}
+        self.wildcards = {}         # filter -> (levels, {Session: qos})
+        self.retained = {}          # topic -> payload
+        self.published = 0
+        self.delivered = 0
+        self._server = None
+        self._conns = []
+
+    def log(self, *args):
+        if self.DEBUG:
+            print("broker:", *args)
+
+    # Transport side
+
+    def received(self, conn, data):
+        # Returns False when the connection has to be closed
+        buf = conn.inbox
+        buf += data
+        while len(buf) >= 2:
+            n = 0
+            shift = 0
+            i = 1
+            while True:
+                if i >= len(buf):
+                    return True
+                b = buf[i]
+                n |= (b & 0x7F) << shift
+                shift += 7
+                i += 1
+                if not b & 0x80:
+                    break
+            if len(buf) < i + n:
+                return True
+            first = buf[0]
+            body = bytes(buf[i:i + n])
+            del buf[:i + n]
+            try:
+                ok = self._handle(conn, first >> 4, first & 0x0F, body)
+            except (IndexError, ValueError) as e:
+                self.log("malformed packet", e)
+                ok = False
+            if not ok:
+                self.disconnected(conn)
+                return False
+        return True
+
+    def disconnected(self, conn):
+        session = conn.session
+        if session is None or session.conn is not conn:
+            return
+        session.conn = None
+        if session.will is not None:
+            topic, payload, qos, retain = session.will
+            session.will = None
+            self.publish(topic, payload, qos, retain)
+        if session.clean:
+            self._drop(session)
+        self.log("disconnected", session.client_id)
+
+    # Protocol
+
+    def _handle(self, conn, kind, flags, body):
+        session = conn.session
+        if kind == CONNECT:
+            return session is None and self._connect(conn, body)
+        if session is None:
+            return False
+        if kind == PUBLISH:
+            qos = flags >> 1 & 3
+            topic, i = _string(body, 0)
+            if qos == 1:
+                conn.send(b"\x40\x02" + body[i:i + 2])
+                i += 2
+            elif qos:
+                return False
+            self.publish(topic, body[i:], qos, flags & 1)
+        elif kind == PUBACK:
+            session.inflight.pop(body[0] << 8 | body[1], None)
+        elif kind == SUBSCRIBE:
+            granted = bytearray()
+            topics = []
+            i = 2
+            while i < len(body):
+                topic, i = _string(body, i)
+                granted.append(self.subscribe(session, topic, body[i]))
+                topics.append(topic)
+                i += 1
+            conn.send(packet(0x90, body[:2] + granted))
+            for topic, qos in zip(topics, granted):
+                self.send_retained(session, topic, qos)
+        elif kind == UNSUBSCRIBE:
+            i = 2
+            while i < len(body):
+                topic, i = _string(body, i)
+                self.unsubscribe(session, topic)
+            conn.send(b"\xb0\x02" + body[:2])
+        elif kind == PINGREQ:
+            conn.send(b"\xd0\x00")
+        elif kind == DISCONNECT:
+            session.will = None
+            return False
+        return True
+
+    def _connect(self, conn, body):
+        name, i = _string(body, 0)
+        level = body[i]
+        flags = body[i + 1]
+        conn.keepalive = body[i + 2] << 8 | body[i + 3]
+        client_id, i = _string(body, i + 4)
+        if name != b"MQTT" or level != 4:
+            conn.send(b"\x20\x02\x00\x01")
+            return False
+        will = None
+        if flags & 0x04:
+            topic, i = _string(body, i)
+            payload, i = _string(body, i)
+            will = (topic, payload, min(flags >> 3 & 3, 1), bool(flags & 0x20))
+        client_id = client_id.decode() or "anon-%x" % id(conn)
+        return self.attach(conn, client_id, bool(flags & 0x02), will)
+
+    def attach(self, conn, client_id, clean=True, will=None):
+        session = self.sessions.get(client_id)
+        if session is not None and session.conn is not None:
+            # a client connecting again takes over its session
+            old = session.conn
+            self.disconnected(old)
+            old.close()
+            session = self.sessions.get(client_id)
+        present = session is not None and not clean
+        if session is not None and clean:
+            self._drop(session)
+        if not present:
+            session = self.sessions[client_id] = Session(client_id)
+        session.clean = clean
+        session.will = will
+        session.conn = conn
+        conn.session = session
+        conn.send(b"\x20\x02" + bytes((present, 0)))
+        for pid, (topic, payload, retain) in session.inflight.items():
+            conn.deliver(self, topic, payload, 1, retain, pid, True)
+        queued, session.queued = session.queued, []
+        for topic, payload, retain in queued:
+            self._send(session, topic, payload, 1, retain)
+        self.log("connected", client_id)
+        return True
+
+    def _drop(self, session):
+        for topic in list(session.subscriptions):
+            self.unsubscribe(session, topic)
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+
+    def subscribe(self, session, topic, qos=0):
+        # Returns the granted QoS, or 0x80 for an invalid filter
+        levels = topic.decode().split("/")
+        if qos > 2 or not topic or not valid_filter(levels):
+            return 0x80
+        qos = min(qos, 1)
+        session.subscriptions[topic] = qos
+        if "+" in levels or "#" in levels:
+            self.wildcards.setdefault(topic, (levels, {}))[1][session] = qos
+        else:
+            self.exact.setdefault(topic, {})[session] = qos
+        return qos
+
+    def unsubscribe(self, session, topic):
+        session.subscriptions.pop(topic, None)
+        for table in (self.exact, self.wildcards):
+            entry = table.get(topic)
+            if entry is not None:
+                subscribers = entry if table is self.exact else entry[1]
+                subscribers.pop(session, None)
+                if not subscribers:
+                    del table[topic]
+
+    def send_retained(self, session, topic, qos):
+        # After a subscription to `topic` was granted `qos`
+        if qos == 0x80:
+            return
+        if topic not in self.wildcards:
+            if topic in self.retained:
+                self._send(session, topic, self.retained[topic], qos, True)
+            return
+        levels = self.wildcards[topic][0]
+        for name, payload in self.retained.items():
+            if matches(levels, name.decode().split("/")):
+                self._send(session, name, payload, qos, True)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        # Delivers to every matching subscription, at most once per session
+        topic = bytes(topic)
+        payload = bytes(payload)
+        self.published += 1
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        targets = self.exact.get(topic)
+        if self.wildcards:
+            targets = dict(targets) if targets else {}
+            levels = topic.decode().split("/")
+            for filter_levels, subscribers in self.wildcards.values():
+                if matches(filter_levels, levels):
+                    for session, sub_qos in subscribers.items():
+                        if sub_qos > targets.get(session, -1):
+                            targets[session] = sub_qos
+        if not targets:
+            return
+        plain = None
+        for session, sub_qos in targets.items():
+            conn = session.conn
+            if min(qos, sub_qos):
+                self._send(session, topic, payload, 1, False)
+            elif conn is not None and conn.encoded:
+                # encoded once for all the QoS 0 subscribers
+                if plain is None:
+                    plain = publish_packet(topic, payload)
+                conn.send(plain)
+                self.delivered += 1
+            else:
+                self._send(session, topic, payload, 0, False)
+
+    def _send(self, session, topic, payload, qos, retain):
+        if qos == 0:
+            if session.conn is not None:
+                session.conn.deliver(self, topic, payload, 0, retain, 0)
+                self.delivered += 1
+            return
+        if session.conn is None:
+            if len(session.queued) < self.MAX_QUEUED:
+                session.queued.append((topic, payload, retain))
+            return
+        session.pid = session.pid % 65535 + 1
+        session.inflight[session.pid] = (topic, payload, retain)
+        session.conn.deliver(self, topic, payload, 1, retain, session.pid)
+        self.delivered += 1
+
+    # Polled socket transport
+
+    def listen(self, host="0.0.0.0", port=1883):
+        addr = socket.getaddrinfo(host, port)[0][-1]
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(addr)
+        server.listen(4)
+        server.setblocking(False)
+        self._server = server
+        self.log("listening on", host, port)
+
+    def poll(self):
+        # Accepts, reads and flushes whatever is ready without blocking;
+        # call it often (every few ms) from the loop that owns the broker
+        while self._server is not None:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                break
+            sock.setblocking(False)
+            self._conns.append(SocketConnection(sock))
+        now = ticks_ms()
+        for conn in self._conns:
+            while not conn.closed:
+                try:
+                    data = conn.sock.recv(512)
+                except OSError as e:
+                    if e.args[0] != EAGAIN:
+                        self.log("connection lost", e)
+                        conn.close()
+                    break
+                if not data or not self.received(conn, data):
+                    conn.close()
+                    break
+                conn.last = now
+            if conn.keepalive and ticks_diff(now, conn.last) > conn.keepalive * 1500:
+                self.log("keepalive expired")
+                conn.close()
+            conn.flush()
+        if any(conn.closed for conn in self._conns):
+            # also the ones send() gave up on, or a session takeover closed
+            closed = [conn for conn in self._conns if conn.closed]
+            self._conns = [conn for conn in self._conns if not conn.closed]
+            for conn in closed:
+                self.disconnected(conn)
+
+    # asyncio transport
+
+    async def serve(self, host="0.0.0.0", port=1883):
+        await asyncio.start_server(self._client, host, port)
+        self.log("listening on", host, port)
+        while True:
+            await asyncio.sleep(1)
+
+    def run(self, host="0.0.0.0", port=1883):
+        asyncio.run(self.serve(host, port))
+
+    async def _client(self, reader, writer):
+        conn = StreamConnection(writer)
+        flusher = asyncio.create_task(conn.flush())
+        try:
+            while True:
+                timeout = conn.keepalive * 1.5 if conn.keepalive else None
+                if timeout:
+                    data = await asyncio.wait_for(reader.read(1024), timeout)
+                else:
+                    data = await reader.read(1024)
+                if not data or not self.received(conn, data):
+                    break
+        except (OSError, asyncio.TimeoutError) as e:
+            self.log("connection lost", e)
+        self.disconnected(conn)
+        flusher.cancel()
+        conn.close()
+
+
+class SocketConnection(Connection):
+    # A non-blocking socket of Broker.poll(); what the socket does not take
+    # at once waits in `out` for the next flush
+    MAX_BUFFERED = 8192
+
+    def __init__(self, sock):
+        super().__init__()
+        self.sock = sock
+        self.out = bytearray()
+        self.closed = False
+        self.last = ticks_ms()
+
+    def send(self, data):
+        if self.closed:
+            return
+        if len(self.out) + len(data) > self.MAX_BUFFERED:
+            # a client this far behind is dropped rather than buffered
+            self.close()
+            return
+        self.out += data
+        self.flush()
+
+    def flush(self):
+        while self.out and not self.closed:
+            try:
+                n = self.sock.send(self.out)
+            except OSError as e:
+                if e.args[0] != EAGAIN:
+                    self.close()
+                return
+            if not n:
+                return
+            del self.out[:n]
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+
+class StreamConnection(Connection):
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+        self.dirty = asyncio.Event()
+        self.closed = False
+
+    def send(self, data):
+        if not self.closed:
+            self.writer.write(data)
+            self.dirty.set()
+
+    async def flush(self):
+        while True:
+            await self.dirty.wait()
+            self.dirty.clear()
+            try:
+                await self.writer.drain()
+            except OSError:
+                return
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+class LocalConnection(Connection):
+    # The broker's side of a LocalClient: messages are handed over as
+    # (topic, payload) without encoding, and acknowledged on the spot
+    encoded = False
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def send(self, data):
+        pass
+
+    def deliver(self, broker, topic, payload, qos, retain, pid, dup=False):
+        if qos:
+            self.session.inflight.pop(pid, None)
+        self.client._post(topic, payload)
+
+
+class LocalClient:
+    # In-process client with the interface of umqtt.simple.MQTTClient
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+        self.cb = None
+        self.will = None
+        self.conn = LocalConnection(self)
+        self._inbox = []
+
+    def _post(self, topic, payload):
+        self._inbox.append((topic, payload))
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.will = (_bytes(topic), _bytes(msg), min(qos, 1), retain)
+
+    def connect(self, clean_session=True):
+        self.broker.attach(self.conn, self.client_id, clean_session, self.will)
+        return 0
+
+    def disconnect(self):
+        if self.conn.session is not None:
+            self.conn.session.will = None
+        self.broker.disconnected(self.conn)
+
+    def ping(self):
+        pass
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self.broker.publish(_bytes(topic), _bytes(msg), min(qos, 1), retain)
+
+    def subscribe(self, topic, qos=0):
+        assert self.cb is not None, "Subscribe callback is not set"
+        topic = _bytes(topic)
+        session = self.conn.session
+        self.broker.send_retained(session, topic, self.broker.subscribe(session, topic, qos))
+
+    def check_msg(self):
+        if not self._inbox:
+            return None
+        inbox, self._inbox = self._inbox, []
+        for topic, payload in inbox:
+            self.cb(topic, payload)
+        return 0x30
+
+    def wait_msg(self):
+        return self.check_msg()
+
+
+def _bytes(s):
+    return s.encode() if isinstance(s, str) else bytes(s)